@@ -0,0 +1,348 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, redirect, url_for, session, flash
+
+from models import db, WasteBin, BinHistory, Collector, Admin, validate_password_policy
+from live_state import live_bins, collector_feed
+from responses import conditional_json, cached_page
+from bin_updates import log_event, bins_changed, bin_removed, listen
+from events import broker
+from dispatch import dispatcher
+from spatial import bin_index, parse_position
+from presence import presence
+from trails import trails, parse_time, track_distance_km
+from retention import RESOLUTIONS, fill_series, downsample, history_page, delete_bin_rollups
+from priority import priority_engine
+from analytics import zone_report, collector_report, response_report, overflow_report
+
+# Landing page, admin dashboard and the fleet-wide APIs behind it
+admin_bp = Blueprint('admin', __name__)
+
+
+@admin_bp.record_once
+def start_services(state):
+    app = state.app
+    presence.start(app)
+    dispatcher.configure(capacity=app.config['COLLECTOR_CAPACITY'], time_budget=app.config['DISPATCH_TIME_BUDGET'])
+    listen(dispatcher)
+    listen(priority_engine)
+    broker.configure(max_subscribers=app.config['STREAM_MAX_SUBSCRIBERS'])
+
+
+def history_cursor(log):
+    """Opaque `before` value for the page after `log`: '<ISO timestamp>_<id>'"""
+    return f"{log.timestamp.isoformat()}_{log.id}"
+
+
+def parse_history_cursor(value):
+    timestamp, _, row_id = value.rpartition('_')
+    return parse_time(timestamp), int(row_id)
+
+
+def history_events(bin_id, before, limit):
+    """A page of events plus the cursor of the next one (None after the oldest event)"""
+    logs = history_page(bin_id, before, limit)
+    return logs, history_cursor(logs[-1]) if len(logs) == limit else None
+
+# --- Web Routes ---
+@admin_bp.route('/')
+def home():
+    return render_template('home.html')
+
+@admin_bp.route('/admin_login', methods=['GET', 'POST'])
+def admin_login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        admin = Admin.query.filter_by(username=username).first()
+        if admin and admin.check_password(password):
+            session['admin_id'] = admin.id
+            session['admin_username'] = admin.username
+            return redirect(url_for('.admin_dashboard'))
+        else:
+            flash('The password is not right.', 'error')
+
+    return render_template('admin_login.html')
+
+@admin_bp.route('/admin_logout')
+def admin_logout():
+    session.pop('admin_id', None)
+    session.pop('admin_username', None)
+    return redirect(url_for('.home'))
+
+@admin_bp.route('/admin')
+def admin_dashboard():
+    if 'admin_id' not in session:
+        return redirect(url_for('.admin_login'))
+
+    def render():
+        bins = priority_engine.ranked(live_bins.all)
+        # Fetch active collectors for the new UI
+        active_collectors = presence.active()
+        all_collectors = presence.all()
+        return render_template('admin.html', bins=bins, active_collectors=active_collectors, all_collectors=all_collectors)
+
+    return cached_page('admin', (live_bins.version, collector_feed.version), render)
+
+@admin_bp.route('/history/<bin_id>')
+def bin_history(bin_id):
+    def render():
+        # The first page renders with the page; older events and the chart load from the APIs below
+        logs, next_before = history_events(bin_id, None, 50)
+        return render_template('history.html', logs=logs, bin_id=bin_id, next_before=next_before)
+
+    # Every logged event comes with a bin write, which bumps live_bins.version
+    return cached_page(('history', bin_id), (live_bins.version,), render)
+
+@admin_bp.route('/admin/register_collector', methods=['POST'])
+def register_collector():
+    if 'admin_id' not in session:
+        return redirect(url_for('.admin_login'))
+
+    name = request.form.get('name')
+    username = request.form.get('username')
+    password = request.form.get('password')
+
+    if name and username and password:
+        existing = Collector.query.filter_by(username=username).first()
+        if not existing:
+            is_valid, msg = validate_password_policy(password)
+            if not is_valid:
+                flash(f'Password policy error: {msg}', 'error')
+            else:
+                new_collector = Collector(name=name, username=username)
+                new_collector.set_password(password)
+                db.session.add(new_collector)
+                db.session.commit()
+                presence.register(new_collector)
+                collector_feed.bump()
+                flash(f'Collector {name} registered successfully!', 'success')
+        else:
+            flash('Username already exists.', 'error')
+
+    return redirect(url_for('.admin_dashboard'))
+
+# --- Data Management Routes ---
+@admin_bp.route('/add_bin', methods=['POST'])
+def add_bin():
+    if 'admin_id' not in session:
+        return redirect(url_for('.admin_login'))
+
+    bin_id = request.form.get('bin_id')
+    lat = request.form.get('lat')
+    lon = request.form.get('lon')
+    deadband = request.form.get('deadband', type=int)  # Optional; blank uses READING_DEADBAND
+    if bin_id and lat and lon:
+        try:
+            lat, lon = parse_position(lat, lon)
+        except ValueError as e:
+            flash(f'Bin not added: {e}', 'error')
+            return redirect(url_for('.admin_dashboard'))
+        if not WasteBin.query.filter_by(bin_id=bin_id).first():
+            new_bin = WasteBin(bin_id=bin_id, location_lat=lat, location_lon=lon, deadband=deadband)
+            db.session.add(new_bin)
+            log_event(bin_id, "System", "Bin initialized")
+            db.session.commit()
+            bin_index.invalidate()
+            bins_changed(new_bin.to_dict())
+    return redirect(url_for('.admin_dashboard'))
+
+@admin_bp.route('/delete_bin/<bin_id>', methods=['POST'])
+def delete_bin(bin_id):
+    if 'admin_id' not in session:
+        return redirect(url_for('.admin_login'))
+
+    bin_obj = WasteBin.query.filter_by(bin_id=bin_id).first()
+    if bin_obj:
+        BinHistory.query.filter_by(bin_id=bin_id).delete()
+        delete_bin_rollups(bin_id)
+        db.session.delete(bin_obj)
+        db.session.commit()
+        bin_removed(bin_id)
+    return redirect(url_for('.admin_dashboard'))
+
+@admin_bp.route('/api/bins/<bin_id>/deadband', methods=['POST'])
+def set_deadband(bin_id):
+    """Per-bin jitter deadband in level points, as {"deadband": N}; null restores the default"""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    data = request.get_json(silent=True) or {}
+    deadband = data.get('deadband')
+    if deadband is not None and (isinstance(deadband, bool) or not isinstance(deadband, int) or deadband < 0):
+        return jsonify({"error": "deadband must be a non-negative integer or null"}), 400
+
+    bin_obj = WasteBin.query.filter_by(bin_id=bin_id).first()
+    if not bin_obj:
+        return jsonify({"error": "Bin not found"}), 404
+    bin_obj.deadband = deadband
+    db.session.commit()
+    return jsonify({"bin_id": bin_id, "deadband": deadband})
+
+# --- Dashboard APIs ---
+@admin_bp.route('/api/history/<bin_id>')
+def history_events_page(bin_id):
+    """Events newest first, ?limit= (max 500) at a time; pass the returned next_before as ?before= for older ones"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    before = None
+    if request.args.get('before'):
+        try:
+            before = parse_history_cursor(request.args['before'])
+        except ValueError:
+            return jsonify({"error": "before must be a next_before value from this API"}), 400
+
+    logs, next_before = history_events(bin_id, before, limit)
+    return jsonify({
+        "bin_id": bin_id,
+        "events": [{"id": log.id, "timestamp": log.timestamp.isoformat(), "event_type": log.event_type,
+                    "description": log.description, "collector_name": log.collector_name,
+                    "fill_level": log.fill_level} for log in logs],
+        "next_before": next_before
+    })
+
+@admin_bp.route('/api/history/<bin_id>/series')
+def history_series(bin_id):
+    """Fill-level series for charts; ?from=&to= are ISO times, ?resolution=raw|hour|day (default: by range),
+    ?points= (default and at most SERIES_MAX_POINTS) caps the series by LTTB downsampling, see retention.downsample"""
+    try:
+        end = parse_time(request.args['to']) if request.args.get('to') else datetime.utcnow()
+        start = parse_time(request.args['from']) if request.args.get('from') else end - timedelta(days=7)
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO 8601 times"}), 400
+    resolution = request.args.get('resolution')
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+
+    points = fill_series(bin_id, start, end, resolution)
+    cap = current_app.config['SERIES_MAX_POINTS']
+    points = downsample(points, min(max(request.args.get('points', cap, type=int), 3), cap))
+    return jsonify({
+        "bin_id": bin_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "points": [{"t": t.isoformat(), "min": low, "max": high, "avg": round(avg, 1),
+                    "samples": samples, "collections": collections}
+                   for t, low, high, avg, samples, collections in points]
+    })
+
+@admin_bp.route('/api/collector/<username>/track')
+def collector_track(username):
+    """GPS trail for route replay; ?from=&to= are ISO times, defaulting to the last 12 hours"""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    if not presence.get(username):
+        return jsonify({"error": "Collector not found"}), 404
+    try:
+        end = parse_time(request.args['to']) if request.args.get('to') else datetime.utcnow()
+        start = parse_time(request.args['from']) if request.args.get('from') else end - timedelta(hours=12)
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO 8601 times"}), 400
+    if start > end:
+        return jsonify({"error": "from must be before to"}), 400
+
+    # Optional extra simplification (metres) for drawing long shifts
+    points = trails.track(username, start, end, request.args.get('tolerance', type=float))
+    return jsonify({
+        "username": username,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "distance_km": round(track_distance_km(points), 3),
+        "points": [{"t": t.isoformat(), "lat": lat, "lon": lon} for t, lat, lon in points]
+    })
+
+@admin_bp.route('/api/get_collectors')
+def get_collectors():
+    """Sends list of active collectors to Admin Map"""
+    def build():
+        # Only show collectors active in the last 5 minutes
+        return [c.to_dict() for c in presence.active()]
+
+    etag, payload = collector_feed.get(build)
+    return conditional_json(payload, etag)
+
+@admin_bp.route('/api/dispatch')
+def fleet_dispatch():
+    """Assignment of Critical and Warning bins across all active collectors"""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    return jsonify(dispatcher.plan(live_bins.all))
+
+@admin_bp.route('/api/priority')
+def priority_queue():
+    """Bins by composite collection priority (see priority.py), paged with ?offset=&limit="""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    return jsonify(priority_engine.queue(live_bins.all, offset, limit))
+
+@admin_bp.route('/api/forecast')
+def bin_forecast():
+    """Bins predicted to turn Critical within ?hours= (default 24) and bins already Critical, most urgent first"""
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    hours = request.args.get('hours', 24, type=float)
+    now = datetime.utcnow()
+
+    def hours_until(value):
+        return max((datetime.fromisoformat(value) - now).total_seconds() / 3600, 0.0) if value else None
+
+    bins = []
+    for b in live_bins.all():
+        to_critical = 0.0 if b['status'] == 'Critical' else hours_until(b['predicted_critical_at'])
+        if to_critical is None or to_critical > hours:
+            continue
+        to_full = hours_until(b['predicted_full_at'])
+        bins.append(dict(b, hours_to_critical=round(to_critical, 2),
+                         hours_to_full=round(to_full, 2) if to_full is not None else None))
+    bins.sort(key=lambda b: (b['hours_to_critical'], b['hours_to_full'] if b['hours_to_full'] is not None else hours))
+    return jsonify({"generated_at": now.isoformat(), "hours": hours, "bins": bins})
+
+# --- Analytics (served from the daily aggregate tables) ---
+
+def analytics_days():
+    return min(max(request.args.get('days', 7, type=int), 1), current_app.config['ANALYTICS_MAX_DAYS'])
+
+@admin_bp.route('/api/analytics/zones')
+def analytics_zones():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    return jsonify(zone_report(analytics_days(), live_bins.all()))
+
+@admin_bp.route('/api/analytics/collectors')
+def analytics_collectors():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    return jsonify(collector_report(analytics_days()))
+
+@admin_bp.route('/api/analytics/response_times')
+def analytics_response_times():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    return jsonify(response_report(analytics_days()))
+
+@admin_bp.route('/api/analytics/overflow')
+def analytics_overflow():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Admin login required"}), 401
+    open_since = [since for (since,) in db.session.query(WasteBin.overflow_since)
+                  .filter(WasteBin.overflow_since.isnot(None))]
+    return jsonify(overflow_report(analytics_days(), open_since))
+
+@admin_bp.route('/api/stream')
+def event_stream():
+    """Server-Sent Events feed of bin changes and collector positions for the dashboards"""
+    # Both dashboards listen, so a collector session is enough
+    if 'admin_id' not in session and 'collector_id' not in session:
+        return jsonify({"error": "Login required"}), 401
+    sub = broker.subscribe()
+    if sub is None:
+        # Every stream pins a worker thread; past the cap the pages poll /api/get_all_bins instead
+        response = jsonify({"error": "Too many live streams; poll /api/get_all_bins"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    response = Response(broker.stream(sub), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Keep reverse proxies from buffering the stream
+    return response
@@ -0,0 +1,214 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from models import db, ZoneDailyStats, CollectorDailyStats
+
+ZONE_DEG = 0.01  # Zones are square grid cells of about 1 km
+OVERFLOW_LEVEL = 100
+
+ZONE_COUNTERS = ('readings', 'fill_gain', 'collections', 'critical_events', 'responses', 'response_seconds',
+                 'overflows', 'overflow_seconds')
+COLLECTOR_COUNTERS = ('collections', 'responses', 'response_seconds')
+
+
+def zone_of(lat, lon):
+    return f"{int(math.floor(lat / ZONE_DEG))}:{int(math.floor(lon / ZONE_DEG))}"
+
+
+def zone_bounds(zone):
+    row, col = (int(v) for v in zone.split(':'))
+    return {"south": round(row * ZONE_DEG, 6), "west": round(col * ZONE_DEG, 6),
+            "north": round((row + 1) * ZONE_DEG, 6), "east": round((col + 1) * ZONE_DEG, 6)}
+
+
+def _increment(model, keys, rows):
+    """Adds counter rows to an aggregate table, creating missing (keys) rows, in one statement.
+
+    Uses INSERT .. ON CONFLICT DO UPDATE so concurrent requests never race on
+    creating a row or lose an increment.
+    """
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        for row in rows:
+            record = model.query.filter_by(**{k: row[k] for k in keys}).first()
+            if record is None:
+                db.session.add(model(**row))
+            else:
+                for column, value in row.items():
+                    if column not in keys:
+                        setattr(record, column, getattr(record, column) + value)
+        return
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={c: getattr(model, c) + stmt.excluded[c] for c in rows[0] if c not in keys})
+    db.session.execute(stmt, rows)
+
+
+class StatsBatch:
+    """Aggregate deltas for one request, written with the request's own commit.
+
+    Call reading/collection before the bin's fill_level is overwritten; they
+    also open and close the bin's Critical and overflow episodes. apply() then
+    folds everything into ZoneDailyStats and CollectorDailyStats.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.utcnow()
+        self.day = self.now.date()
+        self._zones = defaultdict(lambda: dict.fromkeys(ZONE_COUNTERS, 0))
+        self._collectors = defaultdict(lambda: dict.fromkeys(COLLECTOR_COUNTERS, 0))
+
+    def _zone(self, bin_obj):
+        return self._zones[zone_of(bin_obj.location_lat, bin_obj.location_lon)]
+
+    def _close_overflow(self, bin_obj, zone, when):
+        if bin_obj.overflow_since is not None:
+            zone['overflows'] += 1
+            zone['overflow_seconds'] += max((when - bin_obj.overflow_since).total_seconds(), 0.0)
+            bin_obj.overflow_since = None
+
+    def reading(self, bin_obj, new_level, new_status, when=None):
+        """Counts one reading taken at `when` (default: now); backdated frame readings open episodes then"""
+        when = when or self.now
+        zone = self._zone(bin_obj)
+        zone['readings'] += 1
+        zone['fill_gain'] += max(new_level - (bin_obj.fill_level or 0), 0)
+
+        if new_status == 'Critical':
+            if bin_obj.critical_since is None:
+                bin_obj.critical_since = when
+                zone['critical_events'] += 1
+        else:
+            # Dropped back without a collection (sensor noise, emptied by hand): no response to time
+            bin_obj.critical_since = None
+
+        if new_level >= OVERFLOW_LEVEL:
+            if bin_obj.overflow_since is None:
+                bin_obj.overflow_since = when
+        else:
+            self._close_overflow(bin_obj, zone, when)
+
+    def collection(self, bin_obj, collector_name):
+        zone = self._zone(bin_obj)
+        collector = self._collectors[collector_name]
+        zone['collections'] += 1
+        collector['collections'] += 1
+        if bin_obj.critical_since is not None:
+            waited = (self.now - bin_obj.critical_since).total_seconds()
+            for counters in (zone, collector):
+                counters['responses'] += 1
+                counters['response_seconds'] += waited
+            bin_obj.critical_since = None
+        self._close_overflow(bin_obj, zone, self.now)
+
+    def apply(self):
+        _increment(ZoneDailyStats, ('zone', 'day'),
+                   [dict(counters, zone=zone, day=self.day) for zone, counters in self._zones.items()])
+        _increment(CollectorDailyStats, ('collector_name', 'day'),
+                   [dict(counters, collector_name=name, day=self.day) for name, counters in self._collectors.items()])
+
+
+def _window(days):
+    end = datetime.utcnow().date()
+    return end - timedelta(days=days - 1), end
+
+
+def _mean_minutes(seconds, count):
+    return round(seconds / count / 60, 1) if count else None
+
+
+def zone_report(days, bins):
+    """Per-zone fill rate (percentage points per bin per day), collections, response and overflow times"""
+    start, end = _window(days)
+    bins_per_zone = defaultdict(int)
+    for b in bins:
+        bins_per_zone[zone_of(b["lat"], b["lon"])] += 1
+
+    totals = defaultdict(lambda: dict.fromkeys(ZONE_COUNTERS, 0))
+    for row in ZoneDailyStats.query.filter(ZoneDailyStats.day >= start, ZoneDailyStats.day <= end):
+        for counter in ZONE_COUNTERS:
+            totals[row.zone][counter] += getattr(row, counter)
+
+    zones = []
+    for zone in sorted(set(totals) | set(bins_per_zone)):
+        t = totals[zone]
+        count = bins_per_zone.get(zone, 0)
+        zones.append({
+            "zone": zone,
+            "bounds": zone_bounds(zone),
+            "bins": count,
+            "fill_rate": round(t['fill_gain'] / count / days, 2) if count else None,
+            "readings": t['readings'],
+            "collections": t['collections'],
+            "critical_events": t['critical_events'],
+            "mean_response_minutes": _mean_minutes(t['response_seconds'], t['responses']),
+            "overflows": t['overflows'],
+            "overflow_minutes": round(t['overflow_seconds'] / 60, 1),
+        })
+    return {"from": start.isoformat(), "to": end.isoformat(), "zones": zones}
+
+
+def collector_report(days):
+    """Collections and mean Critical-to-collection time per collector per day"""
+    start, end = _window(days)
+    rows = CollectorDailyStats.query.filter(CollectorDailyStats.day >= start, CollectorDailyStats.day <= end)\
+        .order_by(CollectorDailyStats.collector_name, CollectorDailyStats.day).all()
+    collectors = {}
+    for row in rows:
+        entry = collectors.setdefault(row.collector_name, {"collector_name": row.collector_name, "collections": 0,
+                                                           "responses": 0, "response_seconds": 0.0, "days": []})
+        entry["collections"] += row.collections
+        entry["responses"] += row.responses
+        entry["response_seconds"] += row.response_seconds
+        entry["days"].append({"day": row.day.isoformat(), "collections": row.collections,
+                              "mean_response_minutes": _mean_minutes(row.response_seconds, row.responses)})
+    for entry in collectors.values():
+        entry["mean_response_minutes"] = _mean_minutes(entry.pop("response_seconds"), entry["responses"])
+    return {"from": start.isoformat(), "to": end.isoformat(), "collectors": list(collectors.values())}
+
+
+def _daily_totals(days, counters):
+    start, end = _window(days)
+    columns = [db.func.sum(getattr(ZoneDailyStats, c)) for c in counters]
+    rows = db.session.query(ZoneDailyStats.day, *columns)\
+        .filter(ZoneDailyStats.day >= start, ZoneDailyStats.day <= end)\
+        .group_by(ZoneDailyStats.day).order_by(ZoneDailyStats.day).all()
+    return start, end, rows
+
+
+def response_report(days):
+    """Mean time from a bin turning Critical to its collection, overall and per day"""
+    start, end, rows = _daily_totals(days, ('responses', 'response_seconds'))
+    total_count = sum(r[1] or 0 for r in rows)
+    total_seconds = sum(r[2] or 0 for r in rows)
+    return {
+        "from": start.isoformat(), "to": end.isoformat(),
+        "responses": total_count,
+        "mean_response_minutes": _mean_minutes(total_seconds, total_count),
+        "days": [{"day": day.isoformat(), "responses": count or 0, "mean_response_minutes": _mean_minutes(seconds or 0, count)}
+                 for day, count, seconds in rows],
+    }
+
+
+def overflow_report(days, open_since):
+    """Time bins spent at 100% per day, plus the episodes still open (`open_since`: overflow_since values)"""
+    start, end, rows = _daily_totals(days, ('overflows', 'overflow_seconds'))
+    now = datetime.utcnow()
+    return {
+        "from": start.isoformat(), "to": end.isoformat(),
+        "overflows": sum(r[1] or 0 for r in rows),
+        "overflow_minutes": round(sum(r[2] or 0 for r in rows) / 60, 1),
+        "open": len(open_since),
+        "open_minutes": round(sum((now - since).total_seconds() for since in open_since) / 60, 1),
+        "days": [{"day": day.isoformat(), "overflows": count or 0, "overflow_minutes": round((seconds or 0) / 60, 1),
+                  "mean_overflow_minutes": _mean_minutes(seconds or 0, count)}
+                 for day, count, seconds in rows],
+    }
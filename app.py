@@ -1,312 +1,127 @@
 import os
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
-from models import db, WasteBin, BinHistory, Collector, Admin, validate_password_policy
-
-app = Flask(__name__, instance_relative_config=True)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///prioribin.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = 'dev'
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-
-db.init_app(app)
-
-with app.app_context():
+import time
+from importlib import import_module
+
+import click
+from flask import Flask, current_app
+from models import db
+from live_state import worker_sync
+from config import Config, sqlite_pragmas, process_lock
+from migrations import init_db
+from retention import run_retention, enable_incremental_vacuum, start_scheduler
+from bin_updates import bins_synced, bin_removed, reading_filter
+from mqtt_ingest import TOPIC, IngestWorker, PahoTransport
+
+# Blueprint name -> (module, attribute); only the configured ones are imported
+BLUEPRINTS = {
+    'admin': ('admin_views', 'admin_bp'),
+    'collector': ('collector_views', 'collector_bp'),
+    'sensor': ('sensor_api', 'sensor_bp'),
+}
+
+
+def create_app(config=None):
+    """Builds the application; `config` (an object or a dict) overrides settings from config.Config.
+
+    Touches no tables: run `flask --app app init-db` once per deployment and after
+    upgrades to create and upgrade the schema.
+    """
+    app = Flask(__name__, instance_relative_config=True)
+    app.config.from_object(Config)  # Database URL, pool and secret key (environment-overridable)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    db.init_app(app)
+    os.makedirs(app.instance_path, exist_ok=True)
+    with app.app_context():
+        sqlite_pragmas(db.engine, app.config['SQLITE_BUSY_TIMEOUT_MS'])
+
+    reading_filter.configure(deadband=app.config['READING_DEADBAND'], hysteresis=app.config['STATUS_HYSTERESIS'],
+                             min_interval=app.config['READING_MIN_INTERVAL'], heartbeat=app.config['READING_HEARTBEAT'])
+
+    for name in app.config['BLUEPRINTS']:
+        if name not in BLUEPRINTS:
+            raise ValueError(f"Unknown blueprint {name!r}; choose from {', '.join(BLUEPRINTS)}")
+        module, attribute = BLUEPRINTS[name]
+        app.register_blueprint(getattr(import_module(module), attribute))
+
+    if app.config['HISTORY_RETENTION_INTERVAL']:
+        start_scheduler(app, app.config['HISTORY_RETENTION_INTERVAL'])
+    # Under several workers each process only sees its own writes; this pulls in the others'
+    if app.config['LIVE_SYNC_INTERVAL']:
+        worker_sync.interval = app.config['LIVE_SYNC_INTERVAL']
+        worker_sync.start(app, bins_synced, bin_removed)
+
+    register_commands(app)
+    return app
+
+
+# --- CLI ---
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(prune_history)
+    app.cli.add_command(ingest_mqtt)
+
+
+@click.command('init-db')
+def init_db_command():
+    """Create missing tables, upgrade older schemas and add the default admin."""
+    init_db(os.path.join(current_app.instance_path, 'schema.lock'))
+    click.echo("Database ready")
+
+
+@click.command('prune-history')
+@click.option('--raw-days', type=int, default=None, help='Days of raw events to keep (default: HISTORY_RAW_DAYS).')
+@click.option('--hourly-days', type=int, default=None, help='Days of hourly rollups to keep (default: HISTORY_HOURLY_DAYS).')
+@click.option('--enable-incremental-vacuum', 'convert_vacuum', is_flag=True,
+              help='First switch SQLite to incremental auto-vacuum (one full VACUUM that locks the database).')
+def prune_history(raw_days, hourly_days, convert_vacuum):
+    """Roll old BinHistory events up into hourly and daily tables and reclaim the space."""
+    config = current_app.config
+    with process_lock(os.path.join(current_app.instance_path, 'retention.lock'), blocking=False) as acquired:
+        if not acquired:
+            raise click.ClickException("Another retention run is in progress")
+        if convert_vacuum and enable_incremental_vacuum(db.engine):
+            click.echo("Switched to incremental auto-vacuum")
+        stats = run_retention(config['HISTORY_RAW_DAYS'] if raw_days is None else raw_days,
+                              config['HISTORY_HOURLY_DAYS'] if hourly_days is None else hourly_days)
+    click.echo(", ".join(f"{key}: {value}" for key, value in stats.items()))
+
+
+@click.command('ingest-mqtt')
+@click.option('--host', default=None, help='Broker host (default: MQTT_HOST).')
+@click.option('--port', type=int, default=None, help='Broker port (default: MQTT_PORT).')
+@click.option('--topic', default=TOPIC, show_default=True, help='Topic filter to subscribe to.')
+def ingest_mqtt(host, port, topic):
+    """Apply sensor readings published to bins/<bin_id>/level on an MQTT broker."""
+    config = current_app.config
+    transport = PahoTransport(host or config['MQTT_HOST'], port or config['MQTT_PORT'],
+                              config['MQTT_USERNAME'], config['MQTT_PASSWORD'])
+    worker = IngestWorker(current_app._get_current_object(), transport, topic,
+                          config['MQTT_BATCH_SIZE'], config['MQTT_BATCH_LINGER'])
+    worker.start()
+    click.echo(f"Ingesting {topic} from {host or config['MQTT_HOST']}:{port or config['MQTT_PORT']}; Ctrl+C to stop")
     try:
-        os.makedirs(app.instance_path)
-    except OSError:
-        pass
-    db.create_all()
-
-    # Create default admin if not exists
-    if not Admin.query.filter_by(username='admin').first():
-        default_admin = Admin(username='admin')
-        default_admin.set_password('Admin@123!')
-        db.session.add(default_admin)
-        db.session.commit()
-
-# --- Logic ---
-def calculate_status(fill_level):
-    if fill_level >= 90: return "Critical"
-    elif fill_level >= 70: return "Warning"
-    return "Normal"
-
-def log_event(bin_id, event_type, description, collector_name=None):
-    new_log = BinHistory(
-        bin_id=bin_id, 
-        event_type=event_type, 
-        description=description,
-        collector_name=collector_name
-    )
-    db.session.add(new_log)
-
-# --- Web Routes ---
-@app.route('/')
-def home():
-    return render_template('home.html')
-
-@app.route('/admin_login', methods=['GET', 'POST'])
-def admin_login():
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        
-        admin = Admin.query.filter_by(username=username).first()
-        if admin and admin.check_password(password):
-            session['admin_id'] = admin.id
-            session['admin_username'] = admin.username
-            return redirect(url_for('admin_dashboard'))
-        else:
-            flash('The password is not right.', 'error')
-            
-    return render_template('admin_login.html')
-
-@app.route('/admin_logout')
-def admin_logout():
-    session.pop('admin_id', None)
-    session.pop('admin_username', None)
-    return redirect(url_for('home'))
-
-@app.route('/admin')
-def admin_dashboard():
-    if 'admin_id' not in session:
-        return redirect(url_for('admin_login'))
-        
-    bins = WasteBin.query.order_by(WasteBin.fill_level.desc()).all()
-    # Fetch active collectors for the new UI
-    cutoff = datetime.utcnow() - timedelta(minutes=5)
-    active_collectors = Collector.query.filter(Collector.last_active >= cutoff).all()
-    all_collectors = Collector.query.all()
-    return render_template('admin.html', bins=bins, active_collectors=active_collectors, all_collectors=all_collectors)
-
-@app.route('/history/<bin_id>')
-def bin_history(bin_id):
-    logs = BinHistory.query.filter_by(bin_id=bin_id).order_by(BinHistory.timestamp.desc()).limit(50).all()
-    
-    import json
-    import re
-    graph_labels = []
-    graph_data = []
-    
-    for log in reversed(logs):
-        if log.event_type == 'Collection':
-            graph_labels.append(log.timestamp.strftime('%m-%d %H:%M'))
-            graph_data.append(0)
-        elif log.event_type in ['Critical Alert', 'Update']:
-            match = re.search(r'Sensor: (\d+)%', log.description)
-            level = int(match.group(1)) if match else 100
-            graph_labels.append(log.timestamp.strftime('%m-%d %H:%M'))
-            graph_data.append(level)
-            
-    return render_template('history.html', logs=logs, bin_id=bin_id, chart_labels=json.dumps(graph_labels), chart_data=json.dumps(graph_data))
-
-# NEW: Collector Login Page
-@app.route('/collector_login', methods=['GET', 'POST'])
-def collector_login():
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        
-        collector = Collector.query.filter_by(username=username).first()
-        if collector and collector.check_password(password):
-            session['collector_id'] = collector.id
-            session['collector_name'] = collector.name
-            session['collector_username'] = collector.username
-            collector.last_active = datetime.utcnow()
-            db.session.commit()
-            return redirect(url_for('collector_dashboard'))
-        else:
-            flash('The password is not right.', 'error')
-            
-    return render_template('collector_login.html')
-
-@app.route('/collector_logout')
-def collector_logout():
-    session.pop('collector_id', None)
-    session.pop('collector_name', None)
-    session.pop('collector_username', None)
-    return redirect(url_for('home'))
-
-@app.route('/collector')
-def collector_dashboard():
-    if 'collector_id' not in session:
-        return redirect(url_for('collector_login'))
-    
-    collector_id = session['collector_id']
-    collector = Collector.query.get(collector_id)
-    if collector:
-        collector.last_active = datetime.utcnow()
-        db.session.commit()
-
-    all_bins = WasteBin.query.all()
-    return render_template('collector.html', bins=all_bins, collector_name=session.get('collector_name'), collector_username=session.get('collector_username'))
-
-@app.route('/collector/change_password', methods=['POST'])
-def collector_change_password():
-    if 'collector_id' not in session:
-        return redirect(url_for('collector_login'))
-        
-    collector_id = session['collector_id']
-    collector = Collector.query.get(collector_id)
-    
-    current_password = request.form.get('current_password')
-    new_password = request.form.get('new_password')
-    
-    if collector and collector.check_password(current_password):
-        is_valid, msg = validate_password_policy(new_password)
-        if not is_valid:
-            flash(msg, 'error')
-        else:
-            collector.set_password(new_password)
-            db.session.commit()
-            flash('Password changed successfully!', 'success')
-    else:
-        flash('The password is not right.', 'error')
-        
-    return redirect(url_for('collector_dashboard'))
-
-@app.route('/admin/register_collector', methods=['POST'])
-def register_collector():
-    if 'admin_id' not in session:
-        return redirect(url_for('admin_login'))
-
-    name = request.form.get('name')
-    username = request.form.get('username')
-    password = request.form.get('password')
-    
-    if name and username and password:
-        existing = Collector.query.filter_by(username=username).first()
-        if not existing:
-            is_valid, msg = validate_password_policy(password)
-            if not is_valid:
-                flash(f'Password policy error: {msg}', 'error')
-            else:
-                new_collector = Collector(name=name, username=username)
-                new_collector.set_password(password)
-                db.session.add(new_collector)
-                db.session.commit()
-                flash(f'Collector {name} registered successfully!', 'success')
-        else:
-            flash('Username already exists.', 'error')
-            
-    return redirect(url_for('admin_dashboard'))
-
-# --- Data Management Routes ---
-@app.route('/add_bin', methods=['POST'])
-def add_bin():
-    if 'admin_id' not in session:
-        return redirect(url_for('admin_login'))
-
-    bin_id = request.form.get('bin_id')
-    lat = request.form.get('lat')
-    lon = request.form.get('lon')
-    if bin_id and lat and lon:
-        if not WasteBin.query.filter_by(bin_id=bin_id).first():
-            new_bin = WasteBin(bin_id=bin_id, location_lat=float(lat), location_lon=float(lon))
-            db.session.add(new_bin)
-            log_event(bin_id, "System", "Bin initialized")
-            db.session.commit()
-    return redirect(url_for('admin_dashboard'))
-
-@app.route('/delete_bin/<bin_id>', methods=['POST'])
-def delete_bin(bin_id):
-    if 'admin_id' not in session:
-        return redirect(url_for('admin_login'))
-
-    bin_obj = WasteBin.query.filter_by(bin_id=bin_id).first()
-    if bin_obj:
-        BinHistory.query.filter_by(bin_id=bin_id).delete()
-        db.session.delete(bin_obj)
-        db.session.commit()
-    return redirect(url_for('admin_dashboard'))
-
-
-
-
-
-
-# --- API Endpoints for Tracking ---
-
-@app.route('/api/update_location', methods=['POST'])
-def update_location():
-    """Receives GPS from Collector Phone"""
-    data = request.json
-    username = data.get('username')  # Changed from name to username for unique lookup
-    name = data.get('name') 
-    lat = data.get('lat')
-    lon = data.get('lon')
-
-    if username:
-        collector = Collector.query.filter_by(username=username).first()
-    else:
-        # Fallback for older apps temporarily
-        collector = Collector.query.filter_by(name=name).first()
-
-    if collector:
-        if lat and lon: # only update if provided
-            collector.lat = lat
-            collector.lon = lon
-        collector.last_active = datetime.utcnow()
-        db.session.commit()
-        return jsonify({"success": True})
-    return jsonify({"error": "Collector not found"}), 404
-
-@app.route('/api/get_collectors')
-def get_collectors():
-    """Sends list of active collectors to Admin Map"""
-    # Only show collectors active in the last 5 minutes
-    cutoff = datetime.utcnow() - timedelta(minutes=5)
-    active = Collector.query.filter(Collector.last_active >= cutoff).all()
-    return jsonify([c.to_dict() for c in active])
-
-@app.route('/api/update_bin', methods=['POST'])
-def update_bin():
-    """Hardware Simulation Endpoint"""
-    data = request.json
-    bin_obj = WasteBin.query.filter_by(bin_id=data['bin_id']).first()
-    if bin_obj:
-        new_level = int(data['fill_level'])
-        new_status = calculate_status(new_level)
-        
-        # Log event if level has changed to ensure graph history
-        if bin_obj.fill_level != new_level:
-            if bin_obj.status != "Critical" and new_status == "Critical":
-                log_event(bin_obj.bin_id, "Critical Alert", f"Sensor: {new_level}%")
-            else:
-                # Log regular update
-                log_event(bin_obj.bin_id, "Update", f"Sensor: {new_level}%")
-
-        bin_obj.fill_level = new_level
-        bin_obj.status = new_status
-        db.session.commit()
-        return jsonify({"status": bin_obj.status}), 200
-    return jsonify({"error": "Bin not found"}), 404
+        while True:
+            time.sleep(60)
+            click.echo(", ".join(f"{key}: {value}" for key, value in worker.stats.items()))
+    except KeyboardInterrupt:
+        worker.stop()
 
-@app.route('/api/collect_bin/<bin_id>', methods=['POST'])
-def collect_bin(bin_id):
-    """Collector marked bin as cleaned"""
-    # Get collector name from JSON body
-    data = request.json
-    collector_name = data.get('collector_name', 'Unknown')
-    
-    bin_obj = WasteBin.query.filter_by(bin_id=bin_id).first()
-    if bin_obj:
-        log_event(bin_id, "Collection", "Cleaned by collector", collector_name)
-        bin_obj.fill_level = 0
-        bin_obj.status = "Normal"
-        db.session.commit()
-        return jsonify({"success": True}), 200
-    return jsonify({"error": "Bin not found"}), 404
 
-# --- ADD THIS TO app.py ---
+def __getattr__(name):
+    # `from app import app` (older WSGI files, scripts) still works; the app is built on first access
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-@app.route('/api/get_all_bins', methods=['GET'])
-def get_all_bins():
-    """Helper for Simulator to know which bins exist"""
-    bins = WasteBin.query.all()
-    # Convert list of objects to list of dictionaries
-    return jsonify([b.to_dict() for b in bins])
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app = create_app()
+    with app.app_context():
+        init_db(os.path.join(app.instance_path, 'schema.lock'))  # The dev server sets itself up
+    app.run(debug=True)
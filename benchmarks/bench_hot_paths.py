@@ -0,0 +1,77 @@
+"""Latency and throughput of the ingestion, dashboard and history paths; see conftest.py"""
+import itertools
+
+from models import BinHistory
+from live_state import page_cache
+from presence import presence
+
+
+def test_update_bin(fleet, client, bench):
+    # Walks the fleet with a changing level, so every reading is written and fanned out
+    readings = itertools.count()
+
+    def update():
+        n = next(readings)
+        response = client.post('/api/update_bin', json={"bin_id": fleet.bin_id(n * 7919 % fleet.bins), "fill_level": n % 101})
+        assert response.status_code == 200
+
+    bench(update)
+
+
+def test_get_all_bins(fleet, client, bench):
+    def poll():
+        response = client.get('/api/get_all_bins')
+        assert response.status_code == 200
+
+    bench(poll)
+
+
+def test_get_collectors(fleet, client, bench):
+    with fleet.app.app_context():
+        for collector in presence.all():
+            presence.ping(username=collector.username)
+
+    def poll():
+        response = client.get('/api/get_collectors')
+        assert response.status_code == 200
+
+    bench(poll)
+
+
+def test_bin_history(fleet, client, bench):
+    # Rendered afresh each round; the page cache would otherwise answer every request
+    def render():
+        response = client.get(f'/history/{fleet.hot_bin}')
+        assert response.status_code == 200
+
+    bench(render, setup=page_cache.clear)
+
+
+def test_history_deep_page(fleet, client, bench):
+    # A page from the middle of the busiest bin's history, through the keyset cursor
+    with fleet.app.app_context():
+        query = BinHistory.query.filter_by(bin_id=fleet.hot_bin)
+        middle = query.order_by(BinHistory.timestamp.desc(), BinHistory.id.desc()).offset(query.count() // 2).first()
+        cursor = f"{middle.timestamp.isoformat()}_{middle.id}"
+
+    def page():
+        response = client.get(f'/api/history/{fleet.hot_bin}?before={cursor}&limit=50')
+        assert len(response.json['events']) == 50
+
+    bench(page)
+
+
+def test_admin_dashboard(fleet, admin_client, bench):
+    def render():
+        response = admin_client.get('/admin')
+        assert response.status_code == 200
+
+    bench(render, setup=page_cache.clear)
+
+
+def test_admin_dashboard_cached(fleet, admin_client, bench):
+    def hit():
+        response = admin_client.get('/admin')
+        assert response.status_code == 200
+
+    bench(hit)
@@ -0,0 +1,235 @@
+"""Fixtures for the in-process benchmark suite (bench_*.py), which a plain `pytest` does not collect.
+
+    pytest benchmarks                               # 100 and 10k bins
+    PRIORIBIN_BENCH_HEAVY=1 pytest benchmarks       # adds 100k bins with 10M history rows
+    PRIORIBIN_BENCH_UPDATE=1 pytest benchmarks      # records the results as the new baselines
+
+One app and one temporary SQLite database serve the whole session. The fleet
+grows from the smallest scale to the largest, so each scale only inserts
+the rows it adds. Every benchmark is compared with its entry in
+baselines.json and fails when its median latency is more than
+PRIORIBIN_BENCH_THRESHOLD (default 0.5, i.e. 50%) above the baseline.
+Baselines are machine-specific; record them on the machine that runs the
+suite.
+"""
+import atexit
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from migrations import init_db  # noqa: E402
+from models import db, WasteBin, BinHistory, Collector  # noqa: E402
+from live_state import live_bins, page_cache  # noqa: E402
+from spatial import bin_index  # noqa: E402
+from priority import priority_engine  # noqa: E402
+from dispatch import dispatcher  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+HEAVY = os.environ.get('PRIORIBIN_BENCH_HEAVY') == '1'
+UPDATE = os.environ.get('PRIORIBIN_BENCH_UPDATE') == '1'
+THRESHOLD = float(os.environ.get('PRIORIBIN_BENCH_THRESHOLD', 0.5))
+SLACK_MS = 0.5  # Absolute allowance, so sub-millisecond paths do not fail on timer noise
+
+# (bins, history rows); a tenth of the rows belong to HOT_BIN, the rest are spread evenly
+SCALES = [(100, 10_000), (10_000, 1_000_000)] + ([(100_000, 10_000_000)] if HEAVY else [])
+HOT_BIN = 'BIN-000000'
+COLLECTORS = 50
+INSERT_CHUNK = 50_000
+ROUND_BUDGET = 2.0  # Seconds of timed rounds per benchmark, after the minimum
+MIN_ROUNDS = 3
+MAX_ROUNDS = 200
+
+_results = {}
+
+
+def bin_id(i):
+    return f'BIN-{i:06d}'
+
+
+def status(level):
+    return "Critical" if level >= 90 else "Warning" if level >= 70 else "Normal"
+
+
+class Fleet:
+    """The benchmark database at one scale"""
+
+    hot_bin = HOT_BIN
+    bin_id = staticmethod(bin_id)
+
+    def __init__(self, app, bins, history_rows):
+        self.app = app
+        self.bins = bins
+        self.history_rows = history_rows
+
+
+def _grow(from_bins, to_bins, from_rows, to_rows, rng):
+    """Adds bins and history rows up to the next scale with bulk inserts"""
+    now = datetime.utcnow()
+    bins = WasteBin.__table__
+    for start in range(from_bins, to_bins, INSERT_CHUNK):
+        rows = []
+        for i in range(start, min(start + INSERT_CHUNK, to_bins)):
+            level = rng.randint(0, 100)
+            rows.append({"bin_id": bin_id(i), "location_lat": 9.9 + rng.random() * 0.2,
+                         "location_lon": 76.2 + rng.random() * 0.2, "fill_level": level, "status": status(level),
+                         "last_updated": now - timedelta(minutes=rng.randint(1, 600))})
+        db.session.execute(bins.insert(), rows)
+
+    # Spread over the past year; rows added for a larger scale interleave with the earlier ones
+    history = BinHistory.__table__
+    year_ago = now - timedelta(days=365)
+    step = timedelta(days=365) / to_rows
+    for start in range(from_rows, to_rows, INSERT_CHUNK):
+        rows = []
+        for i in range(start, min(start + INSERT_CHUNK, to_rows)):
+            level = rng.randint(0, 100)
+            target = HOT_BIN if i % 10 == 0 else bin_id(rng.randrange(to_bins))
+            rows.append({"bin_id": target, "event_type": "Update", "description": f"Sensor: {level}%",
+                         "fill_level": level, "timestamp": year_ago + step * rng.randrange(to_rows)})
+        db.session.execute(history.insert(), rows)
+    db.session.commit()
+
+
+def _reset_caches():
+    # The in-process caches hold the previous scale's bins
+    live_bins.reset()
+    bin_index.invalidate()
+    priority_engine.invalidate()
+    dispatcher.configure()
+    page_cache.clear()
+
+
+@pytest.fixture(scope='session')
+def app():
+    tmp = tempfile.mkdtemp(prefix='prioribin-bench-')
+    # Registered before create_app, so it runs after the collector flusher's final flush at exit
+    atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'LIVE_SYNC_INTERVAL': None,
+        'HISTORY_RETENTION_INTERVAL': None,
+        'TEMPLATES_AUTO_RELOAD': False,
+        # Every reading is written, the worst case for the ingestion path
+        'READING_DEADBAND': 0,
+        'READING_MIN_INTERVAL': 0,
+    })
+    with app.app_context():
+        init_db(os.path.join(tmp, 'schema.lock'))
+        now = datetime.utcnow()
+        for i in range(COLLECTORS):
+            collector = Collector(name=f'Collector {i}', username=f'collector{i}',
+                                  lat=9.9 + i * 0.004, lon=76.2 + i * 0.004, last_active=now)
+            collector.set_password('Bench@123!')
+            db.session.add(collector)
+        db.session.commit()
+    return app
+
+
+@pytest.fixture(scope='session', params=SCALES, ids=lambda scale: f'{scale[0]}bins')
+def fleet(request, app):
+    bins, history_rows = request.param
+    state = app.config.setdefault('BENCH_SCALE', [0, 0])
+    with app.app_context():
+        _grow(state[0], bins, state[1], history_rows, random.Random(bins))
+        db.session.remove()
+    state[:] = [bins, history_rows]
+    _reset_caches()
+    return Fleet(app, bins, history_rows)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/admin_login', data={'username': 'admin', 'password': 'Admin@123!'})
+    return client
+
+
+def _load_baselines():
+    if not os.path.exists(BASELINES):
+        return {}
+    with open(BASELINES) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def bench(request):
+    """bench(func, setup=None) times func() over repeated rounds and checks the median against baselines.json.
+
+    `setup` runs untimed before each round. The key is the test name with
+    its scale, e.g. "test_update_bin[10000bins]".
+    """
+    key = request.node.name
+
+    def run(func, setup=None):
+        for _ in range(2):  # Warm-up: caches, template compilation, SQLite page cache
+            if setup:
+                setup()
+            func()
+        samples = []
+        deadline = time.perf_counter() + ROUND_BUDGET
+        while len(samples) < MIN_ROUNDS or (time.perf_counter() < deadline and len(samples) < MAX_ROUNDS):
+            if setup:
+                setup()
+            began = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - began) * 1000)
+
+        samples.sort()
+        result = {
+            "median_ms": round(statistics.median(samples), 3),
+            "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 3),
+            "ops_per_s": round(1000 / statistics.mean(samples), 1),
+            "rounds": len(samples),
+        }
+        _results[key] = result
+
+        baseline = _load_baselines().get(key)
+        if baseline and not UPDATE:
+            limit = baseline["median_ms"] * (1 + THRESHOLD) + SLACK_MS
+            assert result["median_ms"] <= limit, (
+                f"{key} regressed: median {result['median_ms']:.2f} ms vs baseline "
+                f"{baseline['median_ms']:.2f} ms (limit {limit:.2f} ms)")
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session):
+    if UPDATE and _results:
+        baselines = _load_baselines()
+        baselines.update(_results)
+        with open(BASELINES, 'w') as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+            f.write('\n')
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    baselines = _load_baselines()
+    terminalreporter.section("benchmarks")
+    for key, result in sorted(_results.items()):
+        baseline = baselines.get(key)
+        change = f"{(result['median_ms'] / baseline['median_ms'] - 1) * 100:+6.1f}%" if baseline and not UPDATE else ""
+        terminalreporter.write_line(
+            f"{key:<45} median {result['median_ms']:10.2f} ms  p95 {result['p95_ms']:10.2f} ms  "
+            f"{result['ops_per_s']:9.1f} ops/s  {change}")
+    if UPDATE:
+        terminalreporter.write_line(f"Baselines written to {BASELINES}")
@@ -0,0 +1,123 @@
+"""Measures the hot history/collector queries on a synthetic database, with and without indexes.
+
+    python benchmarks/history_index_benchmark.py --rows 5000000
+
+Builds a throwaway SQLite file from the app's own table definitions, fills
+bin_history with `--rows` synthetic sensor events spread over `--bins` bins,
+times the queries behind bin_history, delete_bin and get_collectors, then
+creates the model indexes the same way startup does and times them again.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import db, BinHistory, Collector  # noqa: E402
+from migrations import create_missing_indexes  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Prioribin history index benchmark")
+parser.add_argument("--rows", type=int, default=5_000_000, help="Synthetic bin_history rows")
+parser.add_argument("--bins", type=int, default=2_000, help="Distinct bins the rows are spread over")
+parser.add_argument("--collectors", type=int, default=5_000, help="Synthetic collector rows")
+parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query")
+args = parser.parse_args()
+
+INSERT_CHUNK = 50_000
+
+
+def build_database(engine):
+    history = BinHistory.__table__
+    collectors = Collector.__table__
+    # Create the tables bare so the first timing pass shows the unindexed plan
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            indexes = set(table.indexes)
+            table.indexes.clear()
+            table.create(conn)
+            table.indexes.update(indexes)
+
+    start = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=365) / max(args.rows, 1)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for offset in range(0, args.rows, INSERT_CHUNK):
+            batch = []
+            for i in range(offset, min(offset + INSERT_CHUNK, args.rows)):
+                level = rng.randint(0, 100)
+                batch.append({
+                    "bin_id": f"BIN-{rng.randrange(args.bins):05d}",
+                    "event_type": "Update",
+                    "description": f"Sensor: {level}%",
+                    "fill_level": level,
+                    "timestamp": start + step * i,
+                })
+            conn.execute(history.insert(), batch)
+            print(f"\r   inserted {min(offset + INSERT_CHUNK, args.rows):,} / {args.rows:,} history rows", end="")
+        print()
+
+        now = datetime.utcnow()
+        conn.execute(collectors.insert(), [{
+            "name": f"Collector {i}",
+            "username": f"collector{i}",
+            "password_hash": "x",
+            "last_active": now - timedelta(minutes=rng.randint(0, 60 * 24)),
+        } for i in range(args.collectors)])
+
+
+def timed(conn, label, statement):
+    samples = []
+    for _ in range(args.repeat):
+        began = time.perf_counter()
+        conn.execute(statement).all()
+        samples.append((time.perf_counter() - began) * 1000)
+    samples.sort()
+    plan = " | ".join(row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + str(
+        statement.compile(compile_kwargs={"literal_binds": True})))))
+    print(f"   {label:<18} p50 {samples[len(samples) // 2]:9.2f} ms   max {samples[-1]:9.2f} ms   [{plan}]")
+
+
+def run_queries(engine):
+    bin_id = "BIN-00007"
+    cutoff = datetime.utcnow() - timedelta(minutes=5)
+    history = BinHistory.__table__
+    collectors = Collector.__table__
+    with engine.connect() as conn:
+        # /history/<bin_id>: newest 50 events of one bin
+        timed(conn, "bin_history", select(history).where(history.c.bin_id == bin_id)
+              .order_by(history.c.timestamp.desc()).limit(50))
+        # delete_bin: rows matched by the delete (counted, so the data stays intact)
+        timed(conn, "delete_bin match", select(func.count()).select_from(history)
+              .where(history.c.bin_id == bin_id))
+        # /api/get_collectors: active collectors
+        timed(conn, "get_collectors", select(collectors).where(collectors.c.last_active >= cutoff))
+        # Fallback lookup by name in update_location
+        timed(conn, "collector by name", select(collectors).where(collectors.c.name == "Collector 42"))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        print(f"Building synthetic database ({args.rows:,} history rows, {args.bins:,} bins)...")
+        build_database(engine)
+
+        print("\nWithout indexes:")
+        run_queries(engine)
+
+        began = time.perf_counter()
+        create_missing_indexes(engine)
+        print(f"\nCreated indexes in {time.perf_counter() - began:.1f} s")
+
+        print("\nWith indexes:")
+        run_queries(engine)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+from models import db, WasteBin, BinHistory
+from live_state import live_bins
+from events import broker
+from spatial import bin_index
+from analytics import StatsBatch
+import forecast
+
+# SQLite caps the number of bound parameters per statement, so large batches are resolved in chunks
+BATCH_LOOKUP_CHUNK = 500
+
+# In-process caches derived from bin state (dispatch plan, priority scores); see listen()
+_listeners = []
+
+STATUS_RANK = {"Normal": 0, "Warning": 1, "Critical": 2}
+
+
+def calculate_status(fill_level, current=None, hysteresis=0):
+    """Status for a fill level. Given the bin's `current` status, a bin only drops back
+    below a threshold once the level is `hysteresis` points under it; rising is immediate."""
+    if current is not None and hysteresis:
+        lowered = calculate_status(fill_level + hysteresis)
+        if STATUS_RANK.get(lowered, 0) < STATUS_RANK.get(current, 0):
+            return lowered
+        return max(calculate_status(fill_level), current, key=lambda s: STATUS_RANK.get(s, 0))
+    if fill_level >= 90: return "Critical"
+    elif fill_level >= 70: return "Warning"
+    return "Normal"
+
+
+class ReadingFilter:
+    """Decides which sensor readings are worth a write.
+
+    Always kept: a bin's first reading, status changes (with hysteresis, see
+    calculate_status) and drops of at least `empty_drop` points (emptied). Other
+    readings are kept when they move the level by more than the bin's deadband
+    (WasteBin.deadband, else `deadband`) and come at least `min_interval`
+    seconds after the last kept one, or when none was kept for `heartbeat`
+    seconds, which keeps a steady sensor visibly alive. Zero disables a rule.
+    """
+
+    def __init__(self, deadband=2, hysteresis=3, min_interval=30, heartbeat=900, empty_drop=20):
+        self.configure(deadband, hysteresis, min_interval, heartbeat, empty_drop)
+
+    def configure(self, deadband=None, hysteresis=None, min_interval=None, heartbeat=None, empty_drop=None):
+        if deadband is not None:
+            self.deadband = deadband
+        if hysteresis is not None:
+            self.hysteresis = hysteresis
+        if min_interval is not None:
+            self.min_interval = min_interval
+        if heartbeat is not None:
+            self.heartbeat = heartbeat
+        if empty_drop is not None:
+            self.empty_drop = empty_drop
+
+    def status(self, bin_obj, level):
+        return calculate_status(level, bin_obj.status, self.hysteresis)
+
+    def accept(self, bin_obj, level, status, when):
+        if bin_obj.last_updated is None or bin_obj.fill_level is None:
+            return True
+        if status != bin_obj.status:
+            return True
+        change = level - bin_obj.fill_level
+        if self.empty_drop and -change >= self.empty_drop:
+            return True
+        elapsed = (when - bin_obj.last_updated).total_seconds()
+        if self.heartbeat and elapsed >= self.heartbeat:
+            return True
+        if elapsed < self.min_interval:
+            return False
+        deadband = self.deadband if bin_obj.deadband is None else bin_obj.deadband
+        return abs(change) > deadband
+
+
+def log_event(bin_id, event_type, description, collector_name=None, fill_level=None):
+    new_log = BinHistory(
+        bin_id=bin_id,
+        event_type=event_type,
+        description=description,
+        collector_name=collector_name,
+        fill_level=fill_level
+    )
+    db.session.add(new_log)
+
+
+def reading_event(bin_obj, new_level, new_status):
+    """Returns the (event_type, description) a sensor reading should log, or None if unchanged"""
+    if bin_obj.fill_level == new_level:
+        return None
+    if bin_obj.status != "Critical" and new_status == "Critical":
+        return "Critical Alert", f"Sensor: {new_level}%"
+    return "Update", f"Sensor: {new_level}%"
+
+
+def load_bins(bin_ids):
+    bins = {}
+    bin_ids = list(bin_ids)
+    for i in range(0, len(bin_ids), BATCH_LOOKUP_CHUNK):
+        chunk = bin_ids[i:i + BATCH_LOOKUP_CHUNK]
+        for bin_obj in WasteBin.query.filter(WasteBin.bin_id.in_(chunk)):
+            bins[bin_obj.bin_id] = bin_obj
+    return bins
+
+
+def apply_reading(bin_obj, new_level, stats, history_rows, when=None):
+    """Folds one reading taken at `when` (default: now) into the bin unless reading_filter drops it.
+
+    History goes to `history_rows`. Returns whether the reading was applied.
+    """
+    when = when or stats.now
+    new_status = reading_filter.status(bin_obj, new_level)
+    if not reading_filter.accept(bin_obj, new_level, new_status, when):
+        return False
+    event = reading_event(bin_obj, new_level, new_status)
+    if event:
+        history_rows.append({"bin_id": bin_obj.bin_id, "event_type": event[0], "description": event[1],
+                             "fill_level": new_level, "timestamp": when})
+
+    stats.reading(bin_obj, new_level, new_status, when)
+    forecast.observe(bin_obj, new_level, when)
+    bin_obj.fill_level = new_level
+    bin_obj.status = new_status
+    return True
+
+
+def apply_levels(readings):
+    """Applies (bin_id, fill_level) readings with one lookup and one commit; returns a result per reading"""
+    bins = load_bins({bin_id for bin_id, _ in readings})
+    results = []
+    history_rows = []
+    changed = {}
+    stats = StatsBatch()
+    for bin_id, new_level in readings:
+        bin_obj = bins.get(bin_id)
+        if not bin_obj:
+            results.append({"bin_id": bin_id, "error": "Bin not found"})
+            continue
+        if apply_reading(bin_obj, new_level, stats, history_rows):
+            changed[bin_id] = bin_obj.to_dict()
+            results.append({"bin_id": bin_id, "status": bin_obj.status})
+        else:
+            results.append({"bin_id": bin_id, "status": bin_obj.status, "filtered": True})
+
+    commit_readings(history_rows, stats, changed.values())
+    return results
+
+
+def commit_readings(history_rows, stats, states):
+    """Writes a batch of applied readings in one commit, then fans the changed bin `states` out"""
+    if history_rows:
+        db.session.bulk_insert_mappings(BinHistory, history_rows)
+    stats.apply()
+    db.session.commit()
+    if states:
+        bins_changed(*states)
+
+
+def listen(listener):
+    """Keeps `listener` (bins_changed(states) and bin_removed(bin_id) methods) in step with bin writes.
+
+    Blueprints register the caches they serve from, so a process only loads
+    and maintains what its routes need.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def bins_changed(*states):
+    """Writes committed bin states through to the live store and pushes them to stream subscribers"""
+    version = live_bins.put(*states)
+    for listener in _listeners:
+        listener.bins_changed(states)
+    broker.publish('bins', {"version": version, "full": False, "bins": list(states), "removed": []})
+
+
+def bin_removed(bin_id):
+    version = live_bins.remove(bin_id)
+    bin_index.invalidate()
+    for listener in _listeners:
+        listener.bin_removed(bin_id)
+    broker.publish('bins', {"version": version, "full": False, "bins": [], "removed": [bin_id]})
+
+
+def bins_synced(*states):
+    """Bins changed by another worker process; new ones also need a place in the spatial index"""
+    if len(live_bins.get([s['bin_id'] for s in states])) < len(states):
+        bin_index.invalidate()
+    bins_changed(*states)
+
+
+reading_filter = ReadingFilter()
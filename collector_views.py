@@ -0,0 +1,269 @@
+import math
+
+from flask import Blueprint, current_app, render_template, request, jsonify, redirect, url_for, session, flash
+
+from models import db, WasteBin, Collector, validate_password_policy
+from live_state import live_bins, collector_feed
+from responses import cached_page
+from bin_updates import STATUS_RANK, log_event, bins_changed, listen
+from events import broker
+from routing import plan_route
+from dispatch import dispatcher
+from spatial import bin_index, parse_position
+from presence import presence
+from analytics import StatsBatch
+import forecast
+
+# Collector login, the driver's dashboard and the APIs the phone calls
+collector_bp = Blueprint('collector', __name__)
+
+# Last route per collector, reused while bins and position are unchanged
+_route_cache = {}
+
+
+@collector_bp.record_once
+def start_services(state):
+    app = state.app
+    presence.start(app)
+    dispatcher.configure(capacity=app.config['COLLECTOR_CAPACITY'], time_budget=app.config['DISPATCH_TIME_BUDGET'])
+    listen(dispatcher)
+
+
+def position_args(collector):
+    """The ?lat=&lon= fix the phone sent, else the collector's last reported position; ValueError if invalid"""
+    lat, lon = request.args.get('lat'), request.args.get('lon')
+    if lat is None and lon is None:
+        return collector.lat, collector.lon
+    return parse_position(lat, lon)
+
+
+def route_plan(username, lat, lon):
+    """Ordered collection route from (lat, lon) over the collector's remaining Critical and Warning bins"""
+    # Route over this truck's share of the fleet plan; collectors outside the plan see every bin
+    assignment = dispatcher.route_for(username, live_bins.all)
+    if assignment is not None:
+        bins = assignment['stops']
+    else:
+        bins = [b for b in live_bins.all() if b['status'] in ('Critical', 'Warning')]
+    # ~100 m of movement does not warrant a new plan
+    key = (live_bins.version, dispatcher.version, round(lat, 3), round(lon, 3))
+    cached = _route_cache.get(username)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    plan = plan_route((lat, lon), bins, current_app.config['ROUTE_TIME_BUDGET'])
+    plan.update(collector=username, start={"lat": lat, "lon": lon})
+    _route_cache[username] = (key, plan)
+    return plan
+
+
+def task_state(collector, lat=None, lon=None):
+    """The collector's remaining tasks in visiting order plus the route summary.
+
+    Without a known position there is no route; tasks then come most urgent first.
+    """
+    lat = collector.lat if lat is None else lat
+    lon = collector.lon if lon is None else lon
+    if lat is None or lon is None:
+        assignment = dispatcher.route_for(collector.username, live_bins.all)
+        tasks = assignment['stops'] if assignment is not None else \
+            [b for b in live_bins.all() if b['status'] in ('Critical', 'Warning')]
+        tasks = sorted(tasks, key=lambda b: (-STATUS_RANK.get(b['status'], 0), -(b['fill_level'] or 0)))
+        return {"collector": collector.username, "tasks": tasks, "route": None}
+
+    plan = route_plan(collector.username, lat, lon)
+    return {"collector": collector.username, "tasks": plan['stops'],
+            "route": {k: v for k, v in plan.items() if k not in ('stops', 'collector')}}
+
+@collector_bp.route('/collector_login', methods=['GET', 'POST'])
+def collector_login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        collector = Collector.query.filter_by(username=username).first()
+        if collector and collector.check_password(password):
+            session['collector_id'] = collector.id
+            session['collector_name'] = collector.name
+            session['collector_username'] = collector.username
+            presence.ping(username=collector.username)
+            collector_feed.bump()
+            return redirect(url_for('.collector_dashboard'))
+        else:
+            flash('The password is not right.', 'error')
+
+    return render_template('collector_login.html')
+
+@collector_bp.route('/collector_logout')
+def collector_logout():
+    session.pop('collector_id', None)
+    session.pop('collector_name', None)
+    session.pop('collector_username', None)
+    return redirect(url_for('admin.home'))
+
+@collector_bp.route('/collector')
+def collector_dashboard():
+    if 'collector_id' not in session:
+        return redirect(url_for('.collector_login'))
+
+    if presence.ping(username=session.get('collector_username')):
+        collector_feed.bump()
+
+    def render():
+        # Only the priority queue is rendered; other bins load per map viewport from /api/bins
+        priority_bins = [b for b in live_bins.all() if b['status'] in ('Critical', 'Warning')]
+        return render_template('collector.html', bins=priority_bins, collector_name=session.get('collector_name'), collector_username=session.get('collector_username'))
+
+    return cached_page(('collector', session.get('collector_username')), (live_bins.version,), render)
+
+@collector_bp.route('/collector/change_password', methods=['POST'])
+def collector_change_password():
+    if 'collector_id' not in session:
+        return redirect(url_for('.collector_login'))
+
+    collector_id = session['collector_id']
+    collector = Collector.query.get(collector_id)
+
+    current_password = request.form.get('current_password')
+    new_password = request.form.get('new_password')
+
+    if collector and collector.check_password(current_password):
+        is_valid, msg = validate_password_policy(new_password)
+        if not is_valid:
+            flash(msg, 'error')
+        else:
+            collector.set_password(new_password)
+            db.session.commit()
+            flash('Password changed successfully!', 'success')
+    else:
+        flash('The password is not right.', 'error')
+
+    return redirect(url_for('.collector_dashboard'))
+
+# --- API Endpoints for Tracking ---
+
+@collector_bp.route('/api/update_location', methods=['POST'])
+def update_location():
+    """Receives GPS from Collector Phone"""
+    data = request.json
+    username = data.get('username')  # Changed from name to username for unique lookup
+    name = data.get('name')
+    lat = data.get('lat')
+    lon = data.get('lon')
+    if lat is not None or lon is not None:
+        # Checked before presence records it: the trail and the dashboards do arithmetic on it
+        try:
+            lat, lon = parse_position(lat, lon)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    # Absorbed in memory; positions reach the database in periodic batches
+    collector = presence.ping(username=username, name=name, lat=lat, lon=lon)  # Name is a fallback for older apps
+
+    if collector:
+        collector_feed.bump()
+        broker.publish('collector', {"name": collector.name, "username": collector.username,
+                                     "lat": collector.lat, "lon": collector.lon})
+        return jsonify({"success": True})
+    return jsonify({"error": "Collector not found"}), 404
+
+@collector_bp.route('/api/collect_bin/<bin_id>', methods=['POST'])
+def collect_bin(bin_id):
+    """Collector marked bin as cleaned; answers with the collector's remaining tasks (see /api/tasks)"""
+    # Get collector name from JSON body
+    data = request.json
+    collector_name = data.get('collector_name', 'Unknown')
+    collector = presence.get(data.get('collector_username') or session.get('collector_username'))
+    lat, lon = data.get('lat'), data.get('lon')
+    if lat is not None or lon is not None:
+        # Checked before anything is recorded, so a rejected request can be retried without a second collection
+        try:
+            lat, lon = parse_position(lat, lon)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    bin_obj = WasteBin.query.filter_by(bin_id=bin_id).first()
+    if bin_obj:
+        log_event(bin_id, "Collection", "Cleaned by collector", collector_name, fill_level=0)
+        stats = StatsBatch()
+        stats.collection(bin_obj, collector_name)
+        stats.apply()
+        forecast.reset(bin_obj, stats.now)
+        bin_obj.last_collected = stats.now
+        bin_obj.fill_level = 0
+        bin_obj.status = "Normal"
+        state = bin_obj.to_dict()
+        db.session.commit()
+        bins_changed(state)
+        if collector is None:
+            return jsonify({"success": True}), 200
+        # The phone patches its task list and route from this instead of reloading the page
+        return jsonify(dict(task_state(collector, lat, lon), success=True)), 200
+    return jsonify({"error": "Bin not found"}), 404
+
+@collector_bp.route('/api/tasks')
+def collector_tasks():
+    """A collector's remaining tasks in visiting order and the route over them; ?lat=&lon= is a fresh GPS fix"""
+    collector = presence.get(request.args.get('collector') or session.get('collector_username'))
+    if not collector:
+        return jsonify({"error": "Collector not found"}), 404
+    try:
+        lat, lon = position_args(collector)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(task_state(collector, lat, lon))
+
+@collector_bp.route('/api/route')
+def collector_route():
+    """Ordered collection route over Critical and Warning bins for one collector"""
+    username = request.args.get('collector') or session.get('collector_username')
+    collector = presence.get(username)
+    if not collector:
+        return jsonify({"error": "Collector not found"}), 404
+
+    # The phone may send its fresh GPS fix; otherwise use the last reported position
+    try:
+        lat, lon = position_args(collector)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if lat is None or lon is None:
+        return jsonify({"error": "Collector position unknown"}), 400
+    return jsonify(route_plan(collector.username, lat, lon))
+
+@collector_bp.route('/api/bins')
+def bins_in_view():
+    """Bins inside a map viewport, given as ?bbox=west,south,east,north"""
+    try:
+        west, south, east, north = (float(v) for v in request.args['bbox'].split(','))
+    except (KeyError, ValueError):
+        return jsonify({"error": "bbox must be west,south,east,north"}), 400
+    # float() takes "nan" and "inf", which the grid cannot place
+    if not all(math.isfinite(v) for v in (west, south, east, north)):
+        return jsonify({"error": "bbox must be finite numbers"}), 400
+    max_results = current_app.config['BBOX_MAX_RESULTS']
+    limit = min(request.args.get('limit', type=int) or max_results, max_results)
+    ids = bin_index.within(south, west, north, east, live_bins.all, limit)
+    return jsonify(live_bins.get(ids))
+
+@collector_bp.route('/api/bins/nearest')
+def nearest_bins():
+    """The k bins closest to ?lat=&lon=, nearest first, with their distance in km"""
+    if request.args.get('lat') is None or request.args.get('lon') is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    try:
+        lat, lon = parse_position(request.args['lat'], request.args['lon'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    k = max(1, min(request.args.get('k', default=5, type=int), 500))
+
+    nearest = bin_index.nearest(lat, lon, k, live_bins.all)
+    found = {b['bin_id']: b for b in live_bins.get([bin_id for _, bin_id in nearest])}
+    return jsonify([dict(found[bin_id], distance_km=round(d, 3)) for d, bin_id in nearest if bin_id in found])
+
+@collector_bp.route('/api/dispatch/<username>')
+def collector_dispatch(username):
+    """The bins assigned to one collector, in visiting order"""
+    assignment = dispatcher.route_for(username, live_bins.all)
+    if assignment is None:
+        return jsonify({"error": "Collector not active"}), 404
+    return jsonify(assignment)
@@ -0,0 +1,112 @@
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+def database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///prioribin.db')
+    # Heroku-style URLs use a scheme name SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    """Connection pool settings for server databases; SQLite is tuned per connection instead (see sqlite_pragmas)"""
+    if url.startswith('sqlite'):
+        return {}
+    return {
+        "pool_size": int(os.environ.get('DB_POOL_SIZE', 10)),
+        "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        "pool_timeout": int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        "pool_recycle": int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        "pool_pre_ping": True,  # Drops connections the server closed while they sat in the pool
+    }
+
+
+class Config:
+    """Deployment settings, overridable through environment variables"""
+
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    LIVE_SYNC_INTERVAL = float(os.environ.get('LIVE_SYNC_INTERVAL', 1.0))  # Seconds; see live_state.WorkerSync
+    # Route groups this process serves; sensor-only ingestion workers set BLUEPRINTS=sensor
+    BLUEPRINTS = tuple(name.strip() for name in os.environ.get('BLUEPRINTS', 'admin,collector,sensor').split(','))
+
+    TEMPLATES_AUTO_RELOAD = True  # Edited templates show up without a restart; ProductionConfig turns this off
+    ROUTE_TIME_BUDGET = 0.5  # Seconds of local search per route
+    COLLECTOR_CAPACITY = 20.0  # Full-bin equivalents one truck can take per round
+    DISPATCH_TIME_BUDGET = 1.0  # Seconds per fleet plan, shared by assignment and route polishing
+    BBOX_MAX_RESULTS = 5000  # Cap on bins returned for one map viewport
+    SERIES_MAX_POINTS = 1000  # Cap on points in one /api/history/<bin_id>/series response
+    # Open /api/stream connections per process; each holds a worker thread (see gunicorn.conf.py)
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 4))
+    MQTT_HOST = os.environ.get('MQTT_HOST', 'localhost')  # Broker for `flask ingest-mqtt`
+    MQTT_PORT = int(os.environ.get('MQTT_PORT', 1883))
+    MQTT_USERNAME = os.environ.get('MQTT_USERNAME')
+    MQTT_PASSWORD = os.environ.get('MQTT_PASSWORD')
+    MQTT_BATCH_SIZE = 500  # Readings per transaction
+    MQTT_BATCH_LINGER = 0.2  # Seconds a partial batch waits for more readings
+    # Ingestion filter (see bin_updates.ReadingFilter); 0 disables a rule
+    READING_DEADBAND = int(os.environ.get('READING_DEADBAND', 2))  # Points of level change ignored as jitter
+    STATUS_HYSTERESIS = int(os.environ.get('STATUS_HYSTERESIS', 3))  # Points below 70/90 before a status drops
+    READING_MIN_INTERVAL = float(os.environ.get('READING_MIN_INTERVAL', 30))  # Seconds between kept readings per bin
+    READING_HEARTBEAT = float(os.environ.get('READING_HEARTBEAT', 900))  # Keep one reading this often regardless
+    INGEST_SEQ_WINDOW = 256  # Frame readings this close behind a bin's last sequence number are retransmissions
+    HISTORY_RAW_DAYS = 30  # Raw events older than this are rolled up
+    HISTORY_HOURLY_DAYS = 365  # Hourly rollups older than this are dropped
+    HISTORY_RETENTION_INTERVAL = 3600  # Seconds between retention runs; None leaves it to the CLI
+    ANALYTICS_MAX_DAYS = 366
+
+
+class ProductionConfig(Config):
+    """Settings for wsgi.py: templates are compiled once instead of checked for edits on every render"""
+
+    TEMPLATES_AUTO_RELOAD = False
+
+
+def sqlite_pragmas(engine, busy_timeout_ms):
+    """Puts every new SQLite connection in WAL mode with a busy timeout.
+
+    WAL lets readers run alongside the single writer, synchronous=NORMAL only
+    fsyncs at checkpoints (safe in WAL mode), and the busy timeout makes a
+    second writer wait for the lock instead of failing with "database is locked".
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")  # First, so the others wait too
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+@contextmanager
+def process_lock(lock_path, blocking=True):
+    """Yields whether this process holds an exclusive lock on `lock_path`.
+
+    Coordinates worker processes on one host (schema setup, scheduled jobs).
+    Without fcntl (Windows, where waitress runs a single process) it always yields True.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield True
+        return
+    with open(lock_path, 'w') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
@@ -0,0 +1,251 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from presence import presence
+from routing import plan_route, stop_weight
+from spatial import BinGridIndex, haversine_km
+
+PRIORITY_STATUSES = ('Critical', 'Warning')
+NEARBY_STOPS = 8  # Assigned stops and truck starts around a bin whose trucks are tried for its insertion
+
+
+def bin_load(bin_data):
+    """Truck capacity a bin uses, in full-bin equivalents"""
+    return max(bin_data["fill_level"], 0) / 100.0
+
+
+def _insertion(start, stops, bin_data):
+    """Cheapest (extra km, position) for adding a bin to an open route from `start`"""
+    point = (bin_data["lat"], bin_data["lon"])
+    prev = start
+    best = (float("inf"), len(stops))
+    for pos, stop in enumerate(stops):
+        nxt = (stop["lat"], stop["lon"])
+        extra = haversine_km(*prev, *point) + haversine_km(*point, *nxt) - haversine_km(*prev, *nxt)
+        if extra < best[0]:
+            best = (extra, pos)
+        prev = nxt
+    tail = haversine_km(*prev, *point)
+    if tail < best[0]:
+        best = (tail, len(stops))
+    return best
+
+
+class _Plan:
+    """One fleet plan: per-collector routes, the bins no truck had room for, and a grid index of both.
+
+    The index holds assigned stops ("stop", bin_id) and truck starts
+    ("start", username); `owner` maps its keys to the route they belong to.
+    Entries of dropped stops stay in the grid without an owner.
+    """
+
+    def __init__(self, collectors, capacity):
+        self.routes = {c.username: {"collector": c.username, "name": c.name, "start": (c.lat, c.lon),
+                                    "stops": [], "load": 0.0} for c in collectors}
+        self.unassigned = []
+        self.capacity = capacity
+        self.index = BinGridIndex()
+        self.owner = {}
+        self.built_at = None
+        for c in collectors:
+            self.index.add(c.lat, c.lon, ("start", c.username))
+            self.owner[("start", c.username)] = c.username
+
+    def insert(self, bin_data, nearby_only=False):
+        """Adds a bin at its cheapest insertion point; returns False when no suitable truck has room"""
+        load = bin_load(bin_data)
+        open_routes = [r for r in self.routes.values() if r["load"] + load <= self.capacity]
+        if not open_routes:
+            return False
+        nearby = {self.owner.get(key) for _, key in
+                  self.index.nearest(bin_data["lat"], bin_data["lon"], NEARBY_STOPS, list)}
+        candidates = [r for r in open_routes if r["collector"] in nearby]
+        if not candidates and not nearby_only:
+            # Trucks working elsewhere are only tried when none nearby has room
+            candidates = open_routes
+        best = None
+        for route in candidates:
+            extra, pos = _insertion(route["start"], route["stops"], bin_data)
+            if best is None or extra < best[0]:
+                best = (extra, pos, route)
+        if best is None:
+            return False
+        extra, pos, route = best
+        route["stops"].insert(pos, bin_data)
+        route["load"] += load
+        self.index.add(bin_data["lat"], bin_data["lon"], ("stop", bin_data["bin_id"]))
+        self.owner[("stop", bin_data["bin_id"])] = route["collector"]
+        return True
+
+    def locate(self, bin_id):
+        route = self.routes.get(self.owner.get(("stop", bin_id)))
+        if route is not None:
+            for i, stop in enumerate(route["stops"]):
+                if stop["bin_id"] == bin_id:
+                    return route, i
+        return None, None
+
+    def drop(self, bin_id):
+        route, index = self.locate(bin_id)
+        if route is not None:
+            route["load"] -= bin_load(route["stops"][index])
+            del route["stops"][index]
+            del self.owner[("stop", bin_id)]
+            return True
+        before = len(self.unassigned)
+        self.unassigned = [b for b in self.unassigned if b["bin_id"] != bin_id]
+        return len(self.unassigned) != before
+
+    def apply(self, state):
+        """Patches the plan with one fresh bin state; returns whether it changed"""
+        route, index = self.locate(state["bin_id"])
+        if state["status"] not in PRIORITY_STATUSES:
+            return self.drop(state["bin_id"])
+        if route is not None:
+            # Stays with its truck and position; only the load moves
+            route["load"] += bin_load(state) - bin_load(route["stops"][index])
+            route["stops"][index] = state
+            return True
+        if state["status"] == 'Critical':
+            self.drop(state["bin_id"])
+            if not self.insert(state):
+                self.unassigned.append(state)
+            return True
+        return False
+
+
+class Dispatcher:
+    """Splits Critical and Warning bins among the active collectors (a capacitated VRP).
+
+    A full plan assigns bins in urgency order, each to the cheapest insertion
+    point among the trucks with capacity left that already stop (or start)
+    near it, found through a grid index of the plan, then polishes every
+    truck's order with the route optimizer, all within `time_budget`. Between
+    full rebuilds the plan is patched in place: bins that turn Critical are
+    inserted, bins that are emptied or removed are dropped. The plan is
+    rebuilt when it is older than `max_age`.
+
+    Rebuilds run outside the lock that readers and bins_changed take, and the
+    new plan is swapped in whole; bin changes that arrive meanwhile are
+    replayed onto it first.
+    """
+
+    def __init__(self, capacity=20.0, max_age=timedelta(minutes=1), time_budget=1.0):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # One rebuild at a time
+        self._plan = None
+        self._pending = None  # Bin states changed during a rebuild, or None when none is running
+        self._generation = 0  # Bumped by configure(), so a rebuild under old settings is thrown away
+        self.capacity = capacity
+        self.max_age = max_age
+        self.time_budget = time_budget
+        self.version = 0
+
+    def configure(self, capacity=None, time_budget=None):
+        with self._lock:
+            if capacity is not None:
+                self.capacity = capacity
+            if time_budget is not None:
+                self.time_budget = time_budget
+            self._plan = None
+            self._generation += 1
+
+    def _build(self, bins, capacity, time_budget):
+        # Runs without the lock, inside an app context
+        deadline = time.perf_counter() + time_budget
+        # Active collectors (same window get_collectors uses) with a known position
+        collectors = [c for c in presence.active() if c.lat is not None and c.lon is not None]
+        plan = _Plan(collectors, capacity)
+
+        candidates = [b for b in bins if b["status"] in PRIORITY_STATUSES
+                      and b.get("lat") is not None and b.get("lon") is not None]
+        candidates.sort(key=stop_weight, reverse=True)
+
+        # Assignment may use half the budget; past that, bins only go to trucks already nearby
+        assign_until = deadline - time_budget / 2
+        for bin_data in candidates:
+            if not plan.insert(bin_data, nearby_only=time.perf_counter() > assign_until):
+                plan.unassigned.append(bin_data)
+
+        # Polish each truck's stop order; what is left of the budget is shared across trucks
+        budget = max(deadline - time.perf_counter(), 0.0) / max(len(plan.routes), 1)
+        for route in plan.routes.values():
+            if len(route["stops"]) > 2 and budget > 0:
+                route["stops"] = plan_route(route["start"], route["stops"], budget)["stops"]
+
+        plan.built_at = datetime.utcnow()
+        return plan
+
+    def _current(self, bins_loader):
+        """The plan, rebuilt first when missing or older than max_age"""
+        with self._lock:
+            plan = self._plan
+            if plan is not None and datetime.utcnow() - plan.built_at <= self.max_age:
+                return plan
+        with self._build_lock:
+            with self._lock:
+                plan = self._plan
+                if plan is not None and datetime.utcnow() - plan.built_at <= self.max_age:
+                    return plan  # Another thread rebuilt it meanwhile
+                generation, capacity, time_budget = self._generation, self.capacity, self.time_budget
+                self._pending = []
+            try:
+                plan = self._build(bins_loader(), capacity, time_budget)
+            finally:
+                with self._lock:
+                    pending, self._pending = self._pending, None
+            with self._lock:
+                for state in pending:
+                    plan.apply(state)
+                if generation == self._generation:
+                    self._plan = plan
+                    self.version += 1
+            return plan
+
+    def plan(self, bins_loader):
+        """Full assignment: per-collector routes plus bins no truck had room for"""
+        plan = self._current(bins_loader)
+        with self._lock:
+            return {
+                "routes": [self._serialize(r) for r in plan.routes.values()],
+                "unassigned": list(plan.unassigned),
+                "built_at": plan.built_at.isoformat(),
+                "version": self.version,
+            }
+
+    def route_for(self, username, bins_loader):
+        """One collector's assigned stops, or None if they are not part of the plan"""
+        plan = self._current(bins_loader)
+        with self._lock:
+            route = plan.routes.get(username)
+            return self._serialize(route) if route else None
+
+    @staticmethod
+    def _serialize(route):
+        return {"collector": route["collector"], "name": route["name"],
+                "start": {"lat": route["start"][0], "lon": route["start"][1]},
+                "stops": list(route["stops"]), "load": round(route["load"], 2)}
+
+    def bins_changed(self, states):
+        """Patches the current plan with fresh bin states (no-op before the first plan)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(states)
+            if self._plan is None:
+                return
+            changed = False
+            for state in states:
+                changed |= self._plan.apply(state)
+            if changed:
+                self.version += 1
+
+    def bin_removed(self, bin_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append({"bin_id": bin_id, "status": None})
+            if self._plan is not None and self._plan.drop(bin_id):
+                self.version += 1
+
+
+dispatcher = Dispatcher()
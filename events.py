@@ -0,0 +1,72 @@
+import json
+import queue
+import threading
+
+
+class Subscription:
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+
+
+class EventBroker:
+    """In-process fan-out of live updates to Server-Sent Event streams.
+
+    Each subscriber gets a bounded queue. Publishing never blocks: a subscriber
+    whose queue is full is considered too slow, is dropped, and its stream ends
+    so the browser reconnects and resyncs through the delta API.
+
+    Under a threaded WSGI server every open stream holds a worker thread, so
+    at most `max_subscribers` streams are served per process; beyond that
+    subscribe() refuses and clients poll the delta API instead.
+    """
+
+    def __init__(self, max_queue=100, max_subscribers=4):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+
+    def configure(self, max_subscribers=None):
+        if max_subscribers is not None:
+            self.max_subscribers = max_subscribers
+
+    def subscribe(self):
+        """A new Subscription, or None when this process already serves max_subscribers streams"""
+        sub = Subscription(self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event, data):
+        """Sends one event to every subscriber; the payload is serialized once"""
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(message)
+            except queue.Full:
+                sub.dropped = True
+                self.unsubscribe(sub)
+
+    def stream(self, sub, keepalive=15):
+        """Generator of SSE text for one subscriber, with comment keep-alives while idle"""
+        try:
+            yield "retry: 3000\n\n"
+            while not sub.dropped:
+                try:
+                    yield sub.queue.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+broker = EventBroker()
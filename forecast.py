@@ -0,0 +1,54 @@
+import math
+from datetime import timedelta
+
+CRITICAL_LEVEL = 90  # calculate_status's Critical threshold
+FULL_LEVEL = 100
+TIME_CONSTANT_HOURS = 6.0  # Readings older than this weigh in at under 1/e
+MIN_RATE = 0.01  # Percent per hour below which a bin counts as not filling
+MIN_OBSERVED_HOURS = 0.25  # No estimate until readings span this long
+MIN_WEIGHT = 1 - math.exp(-MIN_OBSERVED_HOURS / TIME_CONSTANT_HOURS)
+
+
+def observe(bin_obj, new_level, now):
+    """Folds one reading into the bin's fill-rate model; call before fill_level is overwritten.
+
+    The model is a time-weighted EWMA of the fill slope (percent per hour):
+    each reading's slope counts with weight 1 - exp(-dt / T), so irregular
+    reporting intervals average out correctly, and fill_rate_weight tracks
+    the total weight so young estimates can be bias-corrected (see fill_rate).
+    O(1) per reading; no history is read.
+    """
+    last = bin_obj.last_updated
+    old_level = bin_obj.fill_level or 0
+    bin_obj.last_updated = now
+    if last is None or new_level < old_level:
+        # First reading, or emptied: the new level only becomes the baseline
+        return
+    hours = (now - last).total_seconds() / 3600
+    if hours <= 0:
+        return
+    alpha = 1 - math.exp(-hours / TIME_CONSTANT_HOURS)
+    slope = (new_level - old_level) / hours
+    bin_obj.fill_rate = (1 - alpha) * (bin_obj.fill_rate or 0.0) + alpha * slope
+    bin_obj.fill_rate_weight = (1 - alpha) * (bin_obj.fill_rate_weight or 0.0) + alpha
+
+
+def reset(bin_obj, now):
+    """Collection: the empty bin is the new baseline, the learned rate is kept"""
+    bin_obj.last_updated = now
+
+
+def fill_rate(bin_obj):
+    """Estimated fill rate in percent per hour, or None until enough readings have been seen"""
+    if not bin_obj.fill_rate_weight or bin_obj.fill_rate_weight < MIN_WEIGHT:
+        return None
+    return bin_obj.fill_rate / bin_obj.fill_rate_weight
+
+
+def predicted_at(bin_obj, level):
+    """When the bin is expected to reach `level`, or None if it already has or is not filling"""
+    rate = fill_rate(bin_obj)
+    current = bin_obj.fill_level or 0
+    if rate is None or rate < MIN_RATE or current >= level or bin_obj.last_updated is None:
+        return None
+    return bin_obj.last_updated + timedelta(hours=(level - current) / rate)
@@ -0,0 +1,81 @@
+import struct
+
+# Compact sensor frame, all integers little-endian:
+#   'PB' magic, version, battery %, bin-id length, bin id (ASCII), reading count,
+#   then per reading: sequence number (u16), age in seconds (u16), fill level (u8)
+# One body may hold several frames back to back. A frame with 8 buffered readings
+# and a 6-character bin id is 52 bytes.
+MAGIC = b'PB'
+VERSION = 1
+HEADER = struct.Struct('<2sBBB')
+COUNT = struct.Struct('<B')
+READING = struct.Struct('<HHB')
+BATTERY_UNKNOWN = 255  # Sent by units without battery sensing
+SEQ_MODULUS = 1 << 16
+
+
+class FrameError(ValueError):
+    pass
+
+
+class Frame:
+    __slots__ = ("bin_id", "battery", "readings")
+
+    def __init__(self, bin_id, battery, readings):
+        self.bin_id = bin_id
+        self.battery = battery  # Percent, or None when unknown
+        self.readings = readings  # [(seq, age_seconds, fill_level)], oldest first
+
+
+def decode(body):
+    """Splits a request body into Frames; raises FrameError on anything malformed"""
+    frames = []
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        if len(view) - offset < HEADER.size:
+            raise FrameError("Truncated frame header")
+        magic, version, battery, id_length = HEADER.unpack_from(view, offset)
+        if magic != MAGIC:
+            raise FrameError("Bad frame magic")
+        if version != VERSION:
+            raise FrameError(f"Unsupported frame version {version}")
+        offset += HEADER.size
+
+        end = offset + id_length + COUNT.size
+        if end > len(view) or id_length == 0:
+            raise FrameError("Truncated or empty bin id")
+        try:
+            bin_id = bytes(view[offset:offset + id_length]).decode('ascii')
+        except UnicodeDecodeError:
+            raise FrameError("Bin id is not ASCII")
+        (count,) = COUNT.unpack_from(view, offset + id_length)
+        offset = end
+
+        end = offset + count * READING.size
+        if end > len(view):
+            raise FrameError("Truncated readings")
+        readings = list(READING.iter_unpack(view[offset:end]))
+        offset = end
+        frames.append(Frame(bin_id, None if battery == BATTERY_UNKNOWN else battery, readings))
+    return frames
+
+
+def encode(bin_id, readings, battery=None):
+    """Builds one frame; the inverse of decode (used by the simulator)"""
+    raw_id = bin_id.encode('ascii')
+    parts = [HEADER.pack(MAGIC, VERSION, BATTERY_UNKNOWN if battery is None else battery, len(raw_id)),
+             raw_id, COUNT.pack(len(readings))]
+    parts.extend(READING.pack(seq % SEQ_MODULUS, min(age, 0xFFFF), level) for seq, age, level in readings)
+    return b''.join(parts)
+
+
+def is_newer(seq, last_seq, window):
+    """Whether `seq` follows `last_seq`, or at least is not one of the `window` numbers up to it.
+
+    Sequence numbers wrap at 2**16 and restart at a random value when a unit
+    reboots, so only a retransmission of recent readings counts as old.
+    """
+    if last_seq is None:
+        return True
+    return (last_seq - seq) % SEQ_MODULUS >= window
@@ -0,0 +1,25 @@
+# gunicorn settings for `gunicorn wsgi:app`; every value can be overridden from the environment
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+
+# Each worker is a separate process with its own in-memory caches (see live_state.WorkerSync)
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Threaded workers: every open /api/stream connection holds a thread for its lifetime. At most
+# STREAM_MAX_SUBSCRIBERS (default 4) of a worker's threads go to streams; further dashboards and
+# collector phones get a 503 and poll instead. Raise THREADS together with that cap.
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 8))
+
+timeout = int(os.environ.get('TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = 1000
+
+accesslog = os.environ.get('ACCESS_LOG', '-')
+errorlog = '-'
@@ -5,8 +5,8 @@
 // ===== SETTINGS =====
 const char* ssid       = "divya.";
 const char* password   = "jdev@bsnl";
-const char* serverURL  = "https://prioribin.pythonanywhere.com/api/update_bin";
-const char* wakeupURL  = "https://prioribin.pythonanywhere.com";
+const char* serverURL  = "https://prioribin.pythonanywhere.com/api/ingest";
+const char* wakeupURL  = "https://prioribin.pythonanywhere.com/api/ping";
 const char* BIN_ID     = "BIN-01";
 
 // ===== Sensor Pins =====
@@ -17,9 +17,27 @@ const int ECHO_PIN = 18;
 const float BIN_EMPTY_CM = 77.0;
 const float BIN_FULL_CM  =  2.0;
 
+// ===== Batching =====
+const int BATCH_SIZE  = 6;    // Readings per upload: one upload every ~30 s at the 5 s loop
+const int MAX_BUFFER  = 32;   // Kept while the server is unreachable; the oldest are dropped beyond this
+const int BATTERY_PIN = -1;   // ADC pin on a 1:2 divider from a LiPo cell; -1 when mains powered
+
 // ===== Edge Memory =====
 int previous_fill_level = -1;
 
+struct Reading {
+  uint16_t seq;
+  unsigned long takenAt;  // millis()
+  uint8_t fill;
+};
+Reading buffer[MAX_BUFFER];
+int buffered = 0;
+uint16_t nextSeq;  // Random start, so the server can tell a reboot from a retransmission
+
+// One TLS connection, kept open between uploads
+WiFiClientSecure client;
+HTTPClient http;
+
 // ─────────────────────────────────────────
 
 void wakeUpServer() {
@@ -27,7 +45,7 @@ void wakeUpServer() {
   WiFiClientSecure client;
   client.setInsecure();
   HTTPClient http;
-  http.setTimeout(15000);
+  http.setTimeout(15000);  // Only the first request may wait for a sleeping host
   http.begin(client, wakeupURL);
   int code = http.GET();
   Serial.println(code > 0 ? "[Wake-Up] Server awake!" : "[Wake-Up] Server slow, continuing...");
@@ -66,6 +84,9 @@ void setup() {
   }
 
   Serial.println("\nWiFi connected! IP: " + WiFi.localIP().toString());
+  nextSeq = esp_random() & 0xFFFF;
+  client.setInsecure();
+  http.setReuse(true);
   wakeUpServer();
 }
 
@@ -107,6 +128,12 @@ float readDistanceCM() {
 
 // ─────────────────────────────────────────
 
+int statusLevel(int fillLevel) {
+  if (fillLevel >= 90) return 2;
+  if (fillLevel >= 70) return 1;
+  return 0;
+}
+
 int calculateFillLevel(float distance) {
   float range   = BIN_EMPTY_CM - BIN_FULL_CM;
   float filled  = BIN_EMPTY_CM - distance;
@@ -118,7 +145,54 @@ int calculateFillLevel(float distance) {
 
 // ─────────────────────────────────────────
 
-void sendData(int fillLevel) {
+uint8_t batteryPercent() {
+  if (BATTERY_PIN < 0) return 255;  // Unknown
+  float volts = analogReadMilliVolts(BATTERY_PIN) * 2 / 1000.0;
+  float percent = (volts - 3.3) / (4.2 - 3.3) * 100.0;
+  if (percent < 0)   percent = 0;
+  if (percent > 100) percent = 100;
+  return (uint8_t) percent;
+}
+
+void bufferReading(int fillLevel) {
+  if (buffered == MAX_BUFFER) {
+    memmove(buffer, buffer + 1, sizeof(Reading) * (MAX_BUFFER - 1));
+    buffered--;
+  }
+  buffer[buffered].seq = nextSeq++;
+  buffer[buffered].takenAt = millis();
+  buffer[buffered].fill = fillLevel;
+  buffered++;
+}
+
+// Frame layout (little-endian), decoded by frames.py on the server:
+// 'P' 'B' version battery% id-length id count, then per reading seq(u16) age-seconds(u16) fill(u8)
+size_t buildFrame(uint8_t* out) {
+  size_t idLength = strlen(BIN_ID);
+  size_t n = 0;
+  out[n++] = 'P';
+  out[n++] = 'B';
+  out[n++] = 1;
+  out[n++] = batteryPercent();
+  out[n++] = idLength;
+  memcpy(out + n, BIN_ID, idLength);
+  n += idLength;
+  out[n++] = buffered;
+
+  unsigned long now = millis();
+  for (int i = 0; i < buffered; i++) {
+    unsigned long age = (now - buffer[i].takenAt) / 1000;
+    if (age > 65535) age = 65535;
+    out[n++] = buffer[i].seq & 0xFF;
+    out[n++] = buffer[i].seq >> 8;
+    out[n++] = age & 0xFF;
+    out[n++] = age >> 8;
+    out[n++] = buffer[i].fill;
+  }
+  return n;
+}
+
+void sendBuffered() {
   if (WiFi.status() != WL_CONNECTED) {
     Serial.println("WiFi dropped. Reconnecting...");
     WiFi.begin(ssid, password);
@@ -127,37 +201,29 @@ void sendData(int fillLevel) {
       delay(500); Serial.print("."); a++;
     }
     if (WiFi.status() != WL_CONNECTED) {
-      Serial.println("\nReconnect failed. Skipping.");
+      Serial.println("\nReconnect failed. Keeping " + String(buffered) + " readings.");
       return;
     }
     Serial.println("\nReconnected!");
   }
 
-  String payload = "{\"bin_id\": \"" + String(BIN_ID) + "\", \"fill_level\": " + String(fillLevel) + "}";
-  Serial.println("Sending: " + payload);
-
-  int httpCode = -1;
-  for (int attempt = 1; attempt <= 3; attempt++) {
-    WiFiClientSecure client;
-    client.setInsecure();
-    HTTPClient http;
-    http.setTimeout(15000);
-    http.begin(client, serverURL);
-    http.addHeader("Content-Type", "application/json");
-    httpCode = http.POST(payload);
-    http.end();
-
-    if (httpCode > 0) {
-      Serial.println("Sent! Code: " + String(httpCode));
-      break;
-    } else {
-      Serial.println("Attempt " + String(attempt) + " failed. Retrying...");
-      delay(3000);
-    }
+  uint8_t frame[8 + 50 + MAX_BUFFER * 5];
+  size_t length = buildFrame(frame);
+  Serial.println("Sending " + String(buffered) + " readings (" + String(length) + " bytes)");
+
+  // A failed upload keeps the buffer for the next one; the server skips readings it already has
+  http.setTimeout(5000);
+  http.begin(client, serverURL);
+  http.addHeader("Content-Type", "application/octet-stream");
+  int httpCode = http.POST(frame, length);
+  http.end();  // Leaves the connection open for the next upload (setReuse)
+
+  if (httpCode == 200) {
+    Serial.println("Sent! Code: " + String(httpCode));
+    buffered = 0;
+  } else {
+    Serial.println("Upload failed (" + String(httpCode) + "). Keeping " + String(buffered) + " readings.");
   }
-
-  if (httpCode <= 0)
-    Serial.println("All 3 attempts failed. Server offline.");
 }
 
 // ─────────────────────────────────────────
@@ -172,6 +238,8 @@ void loop() {
   }
 
   int fillLevel = calculateFillLevel(distance);
+  // Status changes (and the first reading) go out at once; steady readings wait for a full batch
+  bool statusChanged = previous_fill_level == -1 || statusLevel(fillLevel) != statusLevel(previous_fill_level);
 
   if (previous_fill_level == -1)
     previous_fill_level = fillLevel;
@@ -193,7 +261,9 @@ void loop() {
   else
     Serial.println("STATUS   : Normal");
 
-  sendData(fillLevel);
+  bufferReading(fillLevel);
+  if (buffered >= BATCH_SIZE || statusChanged)
+    sendBuffered();
   previous_fill_level = fillLevel;
 
   Serial.println("Waiting 5 seconds...\n");
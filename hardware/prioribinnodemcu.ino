@@ -5,8 +5,8 @@
 // ===== SETTINGS =====
 const char* ssid       = "divya.";
 const char* password   = "jdev@bsnl";
-const char* serverURL  = "https://prioribin.pythonanywhere.com/api/update_bin";
-const char* wakeupURL  = "https://prioribin.pythonanywhere.com";
+const char* serverURL  = "https://prioribin.pythonanywhere.com/api/ingest";
+const char* wakeupURL  = "https://prioribin.pythonanywhere.com/api/ping";
 const char* BIN_ID     = "BIN-02";
 
 // ===== Sensor Pins (NodeMCU) =====
@@ -16,9 +16,27 @@ const int ECHO_PIN = D6;
 // ===== Bin Dimensions =====
 const float BIN_EMPTY_CM = 22.0;   // bin height
 const float BIN_FULL_CM  = 2.0;    // distance when full
+// ===== Batching =====
+const int BATCH_SIZE    = 6;      // Readings per upload: one upload every ~30 s at the 5 s loop
+const int MAX_BUFFER    = 32;     // Kept while the server is unreachable; the oldest are dropped beyond this
+const bool BATTERY_ON_A0 = false; // LiPo cell on A0 through a 1:2 divider; false when mains powered
+
 // ===== Edge Memory =====
 int previous_fill_level = -1;
 
+struct Reading {
+  uint16_t seq;
+  unsigned long takenAt;  // millis()
+  uint8_t fill;
+};
+Reading buffer[MAX_BUFFER];
+int buffered = 0;
+uint16_t nextSeq;  // Random start, so the server can tell a reboot from a retransmission
+
+// One TLS connection, kept open between uploads
+BearSSL::WiFiClientSecure client;
+HTTPClient http;
+
 // ─────────────────────────────────────────
 
 void wakeUpServer() {
@@ -28,7 +46,7 @@ void wakeUpServer() {
   client->setInsecure();
 
   HTTPClient http;
-  http.setTimeout(15000);
+  http.setTimeout(15000);  // Only the first request may wait for a sleeping host
 
   http.begin(*client, wakeupURL);
   int code = http.GET();
@@ -76,6 +94,11 @@ void setup() {
   Serial.print("IP: ");
   Serial.println(WiFi.localIP());
 
+  nextSeq = RANDOM_REG32 & 0xFFFF;
+  client.setInsecure();
+  client.setBufferSizes(1024, 512);  // Small frames; frees heap for the kept-open session
+  http.setReuse(true);
+
   wakeUpServer();
 }
 
@@ -122,6 +145,12 @@ float readDistanceCM() {
 
 // ─────────────────────────────────────────
 
+int statusLevel(int fillLevel) {
+  if (fillLevel >= 90) return 2;
+  if (fillLevel >= 70) return 1;
+  return 0;
+}
+
 int calculateFillLevel(float distance) {
 
   float range   = BIN_EMPTY_CM - BIN_FULL_CM;
@@ -136,7 +165,60 @@ int calculateFillLevel(float distance) {
 
 // ─────────────────────────────────────────
 
-void sendData(int fillLevel) {
+uint8_t batteryPercent() {
+  if (!BATTERY_ON_A0) return 255;  // Unknown
+  float volts = analogRead(A0) / 1023.0 * 3.3 * 2;
+  float percent = (volts - 3.3) / (4.2 - 3.3) * 100.0;
+  if (percent < 0) percent = 0;
+  if (percent > 100) percent = 100;
+  return (uint8_t) percent;
+}
+
+void bufferReading(int fillLevel) {
+
+  if (buffered == MAX_BUFFER) {
+    memmove(buffer, buffer + 1, sizeof(Reading) * (MAX_BUFFER - 1));
+    buffered--;
+  }
+
+  buffer[buffered].seq = nextSeq++;
+  buffer[buffered].takenAt = millis();
+  buffer[buffered].fill = fillLevel;
+  buffered++;
+}
+
+// Frame layout (little-endian), decoded by frames.py on the server:
+// 'P' 'B' version battery% id-length id count, then per reading seq(u16) age-seconds(u16) fill(u8)
+size_t buildFrame(uint8_t* out) {
+
+  size_t idLength = strlen(BIN_ID);
+  size_t n = 0;
+
+  out[n++] = 'P';
+  out[n++] = 'B';
+  out[n++] = 1;
+  out[n++] = batteryPercent();
+  out[n++] = idLength;
+  memcpy(out + n, BIN_ID, idLength);
+  n += idLength;
+  out[n++] = buffered;
+
+  unsigned long now = millis();
+
+  for (int i = 0; i < buffered; i++) {
+    unsigned long age = (now - buffer[i].takenAt) / 1000;
+    if (age > 65535) age = 65535;
+    out[n++] = buffer[i].seq & 0xFF;
+    out[n++] = buffer[i].seq >> 8;
+    out[n++] = age & 0xFF;
+    out[n++] = age >> 8;
+    out[n++] = buffer[i].fill;
+  }
+
+  return n;
+}
+
+void sendBuffered() {
 
   if (WiFi.status() != WL_CONNECTED) {
 
@@ -152,45 +234,33 @@ void sendData(int fillLevel) {
     }
 
     if (WiFi.status() != WL_CONNECTED) {
-      Serial.println("\nReconnect failed. Skipping.");
+      Serial.println("\nReconnect failed. Keeping " + String(buffered) + " readings.");
       return;
     }
 
     Serial.println("\nReconnected!");
   }
 
-  String payload = "{\"bin_id\": \"" + String(BIN_ID) + "\", \"fill_level\": " + String(fillLevel) + "}";
-
-  Serial.println("Sending: " + payload);
-
-  int httpCode = -1;
+  uint8_t frame[8 + 50 + MAX_BUFFER * 5];
+  size_t length = buildFrame(frame);
 
-  for (int attempt = 1; attempt <= 3; attempt++) {
+  Serial.println("Sending " + String(buffered) + " readings (" + String(length) + " bytes)");
 
-    std::unique_ptr<BearSSL::WiFiClientSecure> client(new BearSSL::WiFiClientSecure);
-    client->setInsecure();
+  // A failed upload keeps the buffer for the next one; the server skips readings it already has
+  http.setTimeout(5000);
+  http.begin(client, serverURL);
+  http.addHeader("Content-Type", "application/octet-stream");
 
-    HTTPClient http;
+  int httpCode = http.POST(frame, length);
 
-    http.setTimeout(15000);
-    http.begin(*client, serverURL);
-    http.addHeader("Content-Type", "application/json");
+  http.end();  // Leaves the connection open for the next upload (setReuse)
 
-    httpCode = http.POST(payload);
-
-    http.end();
-
-    if (httpCode > 0) {
-      Serial.println("Sent! Code: " + String(httpCode));
-      break;
-    } else {
-      Serial.println("Attempt " + String(attempt) + " failed. Retrying...");
-      delay(3000);
-    }
+  if (httpCode == 200) {
+    Serial.println("Sent! Code: " + String(httpCode));
+    buffered = 0;
+  } else {
+    Serial.println("Upload failed (" + String(httpCode) + "). Keeping " + String(buffered) + " readings.");
   }
-
-  if (httpCode <= 0)
-    Serial.println("All 3 attempts failed. Server offline.");
 }
 
 // ─────────────────────────────────────────
@@ -207,6 +277,9 @@ void loop() {
 
   int fillLevel = calculateFillLevel(distance);
 
+  // Status changes (and the first reading) go out at once; steady readings wait for a full batch
+  bool statusChanged = previous_fill_level == -1 || statusLevel(fillLevel) != statusLevel(previous_fill_level);
+
   if (previous_fill_level == -1)
     previous_fill_level = fillLevel;
 
@@ -227,7 +300,10 @@ void loop() {
   else
     Serial.println("STATUS   : Normal");
 
-  sendData(fillLevel);
+  bufferReading(fillLevel);
+
+  if (buffered >= BATCH_SIZE || statusChanged)
+    sendBuffered();
 
   previous_fill_level = fillLevel;
 
@@ -0,0 +1,288 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from models import db, WasteBin
+
+# Distinguishes version tokens handed out by this process from ones issued before a restart
+EPOCH = os.urandom(4).hex()
+
+
+def version_token(version):
+    return f"{EPOCH}-{version}"
+
+
+def parse_version_token(token):
+    """Returns the numeric version of a token issued by this process, or None"""
+    epoch, _, version = (token or "").partition("-")
+    if epoch != EPOCH or not version.isdigit():
+        return None
+    return int(version)
+
+
+class LiveBinState:
+    """Process-local copy of every bin's live state (fill level, status, location).
+
+    Routes that change a bin write through to this store after committing, so the
+    polling endpoints can answer from memory instead of scanning the bins table.
+    The JSON snapshot is rebuilt at most once per version, on the first read after a change.
+    Every change is stamped with the version it produced, so pollers can ask for
+    just the bins that changed since the version they last saw.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bins = None  # bin_id -> to_dict() payload, loaded lazily on first use
+        self._changes = OrderedDict()  # bin_id -> version of its last change, oldest first
+        self._loaded_version = 0
+        self._snapshot = None
+        self.version = 0
+
+    def _ensure_loaded(self):
+        # Must be called with the lock held and inside an app context
+        if self._bins is None:
+            self._bins = {b.bin_id: b.to_dict() for b in WasteBin.query.order_by(WasteBin.id).all()}
+            self._changes.clear()
+            self._snapshot = None
+            self.version += 1
+            self._loaded_version = self.version
+
+    def _touch(self, bin_id):
+        self._changes[bin_id] = self.version
+        self._changes.move_to_end(bin_id)
+
+    def put(self, *bin_dicts):
+        """Stores the latest state of one or more bins (as produced by WasteBin.to_dict).
+
+        Returns the version token of the change. The version moves even while
+        nothing is cached, so pages cached against it are rebuilt.
+        """
+        with self._lock:
+            self.version += 1
+            if self._bins is None:
+                # The first read loads fresh rows, and a token from before it asks for a full reload
+                return version_token(self.version)
+            for data in bin_dicts:
+                self._bins[data["bin_id"]] = data
+                self._touch(data["bin_id"])
+            self._snapshot = None
+            return version_token(self.version)
+
+    def remove(self, bin_id):
+        with self._lock:
+            if self._bins is None:
+                self.version += 1
+                return version_token(self.version)
+            if self._bins.pop(bin_id, None) is None:
+                return None
+            self.version += 1
+            self._touch(bin_id)
+            self._snapshot = None
+            return version_token(self.version)
+
+    def reset(self):
+        """Drops the cache so the next read reloads from the database"""
+        with self._lock:
+            self._bins = None
+            self._snapshot = None
+            self.version += 1
+
+    def all(self):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._bins.values())
+
+    def get(self, bin_ids):
+        """Payloads for the given ids, skipping any that no longer exist"""
+        with self._lock:
+            self._ensure_loaded()
+            return [self._bins[b] for b in bin_ids if b in self._bins]
+
+    def diff(self, states, bin_ids=None):
+        """Compares bins read back from the database with the cache.
+
+        Returns (states that differ from the cached ones, cached ids missing from
+        `bin_ids`); both are empty while nothing is cached. Applying them is up
+        to the caller, so the changes fan out like any other write.
+        """
+        with self._lock:
+            if self._bins is None:
+                return [], []
+            changed = [s for s in states if self._bins.get(s["bin_id"]) != s]
+            removed = [] if bin_ids is None else [b for b in self._bins if b not in bin_ids]
+            return changed, removed
+
+    def count(self):
+        with self._lock:
+            return None if self._bins is None else len(self._bins)
+
+    def snapshot(self):
+        """Returns (version token, JSON bytes) of the full bin list"""
+        with self._lock:
+            self._ensure_loaded()
+            if self._snapshot is None:
+                self._snapshot = json.dumps(list(self._bins.values())).encode()
+            return version_token(self.version), self._snapshot
+
+    def changes_since(self, token):
+        """Returns the bins changed after the version in `token`.
+
+        The result holds the current version token, the changed bins, the ids of
+        removed bins and whether it is a full resync (unknown, stale or foreign token).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            since = parse_version_token(token)
+            if since is None or since < self._loaded_version or since > self.version:
+                return {"version": version_token(self.version), "full": True,
+                        "bins": list(self._bins.values()), "removed": []}
+
+            changed, removed = [], []
+            # Newest changes sit at the end, so walk backwards until we pass `since`
+            for bin_id, version in reversed(self._changes.items()):
+                if version <= since:
+                    break
+                if bin_id in self._bins:
+                    changed.append(self._bins[bin_id])
+                else:
+                    removed.append(bin_id)
+            return {"version": version_token(self.version), "full": False,
+                    "bins": changed, "removed": removed}
+
+
+class CollectorFeed:
+    """Caches the serialized active-collector list between position updates.
+
+    The list is rebuilt when a collector reports in (bump) or after MAX_AGE, which
+    bounds how long an idle collector lingers past the activity window.
+    """
+
+    MAX_AGE = timedelta(seconds=10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._payload = None
+        self._etag = None
+        self._built_at = None
+        self.version = 0
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._payload = None
+
+    def get(self, build):
+        """Returns (etag, JSON bytes), calling build() for a fresh list when the cache is stale"""
+        with self._lock:
+            now = datetime.utcnow()
+            if self._payload is None or now - self._built_at > self.MAX_AGE:
+                self._payload = json.dumps(build()).encode()
+                self._etag = '"c-' + hashlib.md5(self._payload).hexdigest() + '"'
+                self._built_at = now
+            return self._etag, self._payload
+
+
+class PageCache:
+    """Rendered dashboard pages, reused while the data they show is unchanged.
+
+    Each page is stored with the versions of the data it rendered (live_bins,
+    collector_feed); a bin or collector write bumps a version, so the next
+    request renders afresh without explicit invalidation. MAX_AGE bounds how
+    long time-dependent parts (collector activity, priority ageing) can lag.
+    Beyond `size` pages the least recently used is dropped.
+    """
+
+    MAX_AGE = timedelta(seconds=10)
+
+    def __init__(self, size=256):
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()  # key -> (versions, built_at, html)
+        self.size = size
+
+    def get(self, key, versions, render):
+        """The cached page (bytes) under `key` if it was rendered from `versions`, else render() and keep that"""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry[0] == versions and now - entry[1] <= self.MAX_AGE:
+                self._pages.move_to_end(key)
+                return entry[2]
+        # Rendered outside the lock; a write meanwhile leaves a stale version that the next request replaces.
+        # Kept as UTF-8 so hits skip re-encoding pages that run to megabytes on large fleets
+        html = render().encode()
+        with self._lock:
+            self._pages[key] = (versions, now, html)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+class WorkerSync:
+    """Pulls bin changes committed by other worker processes into this one.
+
+    Each process has its own live_bins, dispatcher plan, priority arrays and
+    stream subscribers, and routes only write through to their own process.
+    Every `interval` seconds this re-reads the bins whose changed_at moved
+    (looking back `overlap` for transactions that committed late) and hands
+    the ones that differ from the cache to on_changed; when the row count no
+    longer matches, deleted ids go to on_removed. In a single process it
+    finds nothing to do. changed_at rather than last_updated, since frame
+    readings are backdated to when the unit took them.
+    """
+
+    def __init__(self, interval=1.0, overlap=timedelta(seconds=5)):
+        self._watermark = None
+        self._thread = None
+        self.interval = interval
+        self.overlap = overlap
+
+    def run_once(self, on_changed, on_removed):
+        """One pass; must be called inside an app context"""
+        now = datetime.utcnow()
+        since = (self._watermark or now) - self.overlap
+        self._watermark = now
+        cached = live_bins.count()
+        if cached is None:
+            return  # Nothing cached yet; the first read loads fresh rows
+
+        states = [b.to_dict() for b in WasteBin.query.filter(WasteBin.changed_at >= since)]
+        bin_ids = None
+        if db.session.query(db.func.count(WasteBin.id)).scalar() != cached:
+            bin_ids = {bin_id for (bin_id,) in db.session.query(WasteBin.bin_id)}
+        db.session.remove()
+
+        changed, removed = live_bins.diff(states, bin_ids)
+        if changed:
+            on_changed(*changed)
+        for bin_id in removed:
+            on_removed(bin_id)
+
+    def start(self, app, on_changed, on_removed):
+        if self._thread is not None:
+            return
+
+        def loop():
+            stop = threading.Event()
+            while not stop.wait(self.interval):
+                try:
+                    with app.app_context():
+                        self.run_once(on_changed, on_removed)
+                except Exception:
+                    app.logger.exception("Syncing live bin state failed")
+
+        self._thread = threading.Thread(target=loop, name="live-sync", daemon=True)
+        self._thread.start()
+
+
+live_bins = LiveBinState()
+collector_feed = CollectorFeed()
+page_cache = PageCache()
+worker_sync = WorkerSync()
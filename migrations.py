@@ -0,0 +1,131 @@
+import re
+
+from sqlalchemy import inspect, text
+
+from config import process_lock
+from models import db, Admin
+
+# Matches the free-text level that update_bin wrote before BinHistory had a fill_level column
+SENSOR_PATTERN = re.compile(r'Sensor: (\d+)%')
+BACKFILL_CHUNK = 5000
+
+
+def _backfill_history_fill_level():
+    """Parses the level out of existing history descriptions, once, in id-ordered chunks"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            text("SELECT id, event_type, description FROM bin_history "
+                 "WHERE id > :last_id ORDER BY id LIMIT :chunk"),
+            {"last_id": last_id, "chunk": BACKFILL_CHUNK},
+        ).all()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, event_type, description in rows:
+            if event_type == 'Collection':
+                updates.append({"id": row_id, "level": 0})
+            elif event_type in ('Critical Alert', 'Update'):
+                match = SENSOR_PATTERN.search(description or '')
+                updates.append({"id": row_id, "level": int(match.group(1)) if match else 100})
+        if updates:
+            db.session.execute(text("UPDATE bin_history SET fill_level = :level WHERE id = :id"), updates)
+        db.session.commit()
+        last_id = rows[-1][0]
+
+
+def create_missing_indexes(engine):
+    """Creates any index declared on the models that the database does not have yet"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _add_columns(inspector, table, names):
+    """ALTER TABLE ADD COLUMN for each named model column the table lacks; returns the names added.
+
+    Column types come from the models, rendered for the connected database.
+    """
+    existing = {c['name'] for c in inspector.get_columns(table)}
+    columns = db.metadata.tables[table].columns
+    added = [name for name in names if name not in existing]
+    for name in added:
+        ddl_type = columns[name].type.compile(dialect=db.engine.dialect)
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+    db.session.commit()
+    return added
+
+
+def upgrade_schema():
+    """Brings a database created by an older version up to the current models.
+
+    db.create_all() only creates missing tables, so columns added to existing
+    tables are applied here. Each step checks the live schema and is a no-op
+    once applied.
+    """
+    inspector = inspect(db.engine)
+
+    history_columns = {c['name'] for c in inspector.get_columns('bin_history')}
+    if 'fill_level' not in history_columns:
+        db.session.execute(text("ALTER TABLE bin_history ADD COLUMN fill_level INTEGER"))
+        db.session.commit()
+        _backfill_history_fill_level()
+
+    if 'critical_since' in _add_columns(inspector, 'waste_bin', ['critical_since', 'overflow_since']):
+        # Bins already Critical or full open their episode at the history event that started it
+        db.session.execute(text(
+            "UPDATE waste_bin SET critical_since = COALESCE("
+            "(SELECT MAX(h.timestamp) FROM bin_history h "
+            " WHERE h.bin_id = waste_bin.bin_id AND h.event_type = 'Critical Alert'), last_updated) "
+            "WHERE status = 'Critical'"))
+        db.session.execute(text(
+            "UPDATE waste_bin SET overflow_since = COALESCE("
+            "(SELECT MIN(h.timestamp) FROM bin_history h "
+            " WHERE h.bin_id = waste_bin.bin_id AND h.fill_level >= 100 AND NOT EXISTS ("
+            "  SELECT 1 FROM bin_history l WHERE l.bin_id = h.bin_id AND l.fill_level < 100"
+            "  AND l.timestamp > h.timestamp)), last_updated) "
+            "WHERE fill_level >= 100"))
+        db.session.commit()
+
+    if 'fill_rate' in _add_columns(inspector, 'waste_bin', ['fill_rate', 'fill_rate_weight']):
+        # last_updated was only ever the creation time; the forecast needs the time of the last
+        # reading, so the next reading starts each bin's model from a fresh baseline
+        db.session.execute(text("UPDATE waste_bin SET last_updated = NULL"))
+        db.session.commit()
+
+    if _add_columns(inspector, 'waste_bin', ['last_collected']):
+        # Latest collection still in raw history, else the day of the latest rolled-up one
+        db.session.execute(text(
+            "UPDATE waste_bin SET last_collected = COALESCE("
+            "(SELECT MAX(h.timestamp) FROM bin_history h "
+            " WHERE h.bin_id = waste_bin.bin_id AND h.event_type = 'Collection'), "
+            "(SELECT MAX(d.bucket) FROM bin_history_daily d "
+            " WHERE d.bin_id = waste_bin.bin_id AND d.collections > 0))"))
+        db.session.commit()
+
+    _add_columns(inspector, 'waste_bin', ['battery_level', 'last_seq', 'deadband'])
+
+    if _add_columns(inspector, 'waste_bin', ['changed_at']):
+        # last_updated is NULL on databases the fill_rate step above just upgraded
+        db.session.execute(text("UPDATE waste_bin SET changed_at = COALESCE(last_updated, CURRENT_TIMESTAMP)"))
+        db.session.commit()
+
+    create_missing_indexes(db.engine)
+
+
+def init_db(lock_path):
+    """Creates missing tables, upgrades older schemas and adds the default admin (`flask init-db`).
+
+    Safe to run repeatedly. `lock_path` serializes processes that run it at the same time.
+    """
+    with process_lock(lock_path):
+        db.create_all()
+        upgrade_schema()
+
+        # Create default admin if not exists
+        if not Admin.query.filter_by(username='admin').first():
+            default_admin = Admin(username='admin')
+            default_admin.set_password('Admin@123!')
+            db.session.add(default_admin)
+            db.session.commit()
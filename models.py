@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import forecast
 
 db = SQLAlchemy()
 
@@ -10,25 +11,112 @@ class WasteBin(db.Model):
     location_lon = db.Column(db.Float, nullable=False)
     fill_level = db.Column(db.Integer, default=0)
     status = db.Column(db.String(20), default="Normal")
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Time of the last reading
+    # Wall-clock time of the last write; readings can be backdated, so WorkerSync polls this instead
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    fill_rate = db.Column(db.Float, nullable=True)  # EWMA state of the fill-rate model (see forecast.py)
+    fill_rate_weight = db.Column(db.Float, nullable=True)
+    critical_since = db.Column(db.DateTime, nullable=True)  # Open Critical episode, closed by a collection
+    overflow_since = db.Column(db.DateTime, nullable=True)  # Open episode at 100%
+    last_collected = db.Column(db.DateTime, nullable=True)
+    battery_level = db.Column(db.Integer, nullable=True)  # Percent, from the unit's last frame
+    last_seq = db.Column(db.Integer, nullable=True)  # Sequence number of the last applied frame reading
+    deadband = db.Column(db.Integer, nullable=True)  # Ignored level jitter in points; None uses READING_DEADBAND
 
     def to_dict(self):
+        rate = forecast.fill_rate(self)
+        critical_at = forecast.predicted_at(self, forecast.CRITICAL_LEVEL)
+        full_at = forecast.predicted_at(self, forecast.FULL_LEVEL)
         return {
             "bin_id": self.bin_id,
             "lat": self.location_lat,
             "lon": self.location_lon,
             "fill_level": self.fill_level,
-            "status": self.status
+            "status": self.status,
+            "fill_rate": round(rate, 2) if rate is not None else None,  # Percent per hour
+            "predicted_critical_at": critical_at.isoformat() if critical_at else None,
+            "predicted_full_at": full_at.isoformat() if full_at else None,
+            "last_collected": self.last_collected.isoformat() if self.last_collected else None,
+            "battery_level": self.battery_level
         }
 
 class BinHistory(db.Model):
+    # History pages read one bin's newest events; delete_bin removes them by bin_id;
+    # the retention job walks old events by time
+    __table_args__ = (db.Index('ix_bin_history_bin_id_timestamp', 'bin_id', 'timestamp'),
+                      db.Index('ix_bin_history_timestamp', 'timestamp'))
+
     id = db.Column(db.Integer, primary_key=True)
     bin_id = db.Column(db.String(50), nullable=False)
     event_type = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(200))
     collector_name = db.Column(db.String(50), nullable=True)  # NEW: Who did it?
+    fill_level = db.Column(db.Integer, nullable=True)  # Level after the event; None for system events
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+class BinHistoryHourly(db.Model):
+    # Fill levels of events older than the raw retention window, per bin and hour (see retention.py)
+    __table_args__ = (db.UniqueConstraint('bin_id', 'bucket', name='uq_bin_history_hourly_bin_id_bucket'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    bin_id = db.Column(db.String(50), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)  # Start of the hour
+    min_level = db.Column(db.Integer, nullable=False)
+    max_level = db.Column(db.Integer, nullable=False)
+    avg_level = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    collections = db.Column(db.Integer, nullable=False, default=0)
+
+class BinHistoryDaily(db.Model):
+    # Same as BinHistoryHourly per day; kept after hourly rows are pruned
+    __table_args__ = (db.UniqueConstraint('bin_id', 'bucket', name='uq_bin_history_daily_bin_id_bucket'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    bin_id = db.Column(db.String(50), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)  # Midnight UTC
+    min_level = db.Column(db.Integer, nullable=False)
+    max_level = db.Column(db.Integer, nullable=False)
+    avg_level = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    collections = db.Column(db.Integer, nullable=False, default=0)
+
+class ZoneDailyStats(db.Model):
+    # Per map zone and day counters, maintained by analytics.py as readings and collections arrive
+    __table_args__ = (db.UniqueConstraint('zone', 'day', name='uq_zone_daily_stats_zone_day'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    zone = db.Column(db.String(32), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    readings = db.Column(db.Integer, nullable=False, default=0)
+    fill_gain = db.Column(db.Integer, nullable=False, default=0)  # Sum of level increases, in percentage points
+    collections = db.Column(db.Integer, nullable=False, default=0)
+    critical_events = db.Column(db.Integer, nullable=False, default=0)
+    responses = db.Column(db.Integer, nullable=False, default=0)  # Collections of Critical bins
+    response_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    overflows = db.Column(db.Integer, nullable=False, default=0)
+    overflow_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+class CollectorDailyStats(db.Model):
+    __table_args__ = (db.UniqueConstraint('collector_name', 'day', name='uq_collector_daily_stats_name_day'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    collector_name = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    collections = db.Column(db.Integer, nullable=False, default=0)
+    responses = db.Column(db.Integer, nullable=False, default=0)
+    response_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+class CollectorTrack(db.Model):
+    # One sealed chunk of a collector's GPS trail (see trails.py for the packing)
+    __table_args__ = (db.Index('ix_collector_track_username_start', 'username', 'start'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(50), nullable=False)
+    start = db.Column(db.DateTime, nullable=False)
+    end = db.Column(db.DateTime, nullable=False)
+    points = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
 from werkzeug.security import generate_password_hash, check_password_hash
 import re
 
@@ -58,12 +146,12 @@ class Admin(db.Model):
 # --- NEW TABLE FOR TRACKING COLLECTORS ---
 class Collector(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(50), nullable=False, index=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     lat = db.Column(db.Float, nullable=True)
     lon = db.Column(db.Float, nullable=True)
-    last_active = db.Column(db.DateTime, default=datetime.utcnow)
+    last_active = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -0,0 +1,198 @@
+import json
+import math
+import queue
+import threading
+import time
+
+from models import db
+from bin_updates import apply_levels
+
+TOPIC = 'bins/+/level'  # Payload: the fill level as a number, or {"fill_level": N}
+QUEUE_SIZE = 10000
+
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter matching: '+' is one level, a trailing '#' is any number of levels"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts) or (part != '+' and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def parse_message(topic, payload):
+    """(bin_id, fill_level) from a bins/<bin_id>/level message, or None if it is malformed or outside 0..100"""
+    parts = topic.split('/')
+    if len(parts) != 3 or parts[0] != 'bins' or parts[2] != 'level' or not parts[1]:
+        return None
+    try:
+        value = json.loads(payload)
+    except ValueError:
+        return None
+    if isinstance(value, dict):
+        value = value.get('fill_level')
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    # json.loads takes NaN and Infinity, which int() would raise on in the transport's thread
+    if not (0 <= value <= 100 and math.isfinite(value)):
+        return None
+    return parts[1], int(value)
+
+
+class LocalBroker:
+    """In-process stand-in for an MQTT broker, for tests and single-host setups without Mosquitto.
+
+    Same subscribe/publish/close surface as PahoTransport; publish delivers
+    synchronously on the caller's thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = []
+
+    def subscribe(self, pattern, callback):
+        with self._lock:
+            self._subscriptions.append((pattern, callback))
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for pattern, callback in subscriptions:
+            if topic_matches(pattern, topic):
+                callback(topic, payload)
+
+    def close(self):
+        with self._lock:
+            self._subscriptions = []
+
+
+class PahoTransport:
+    """A real MQTT broker (Mosquitto, ...) through paho-mqtt, an optional dependency.
+
+    Subscriptions are QoS 1 and renewed on every reconnect; paho delivers
+    messages on its own network thread.
+    """
+
+    def __init__(self, host='localhost', port=1883, username=None, password=None, client_id='prioribin-ingest'):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise RuntimeError("MQTT ingestion needs paho-mqtt: pip install paho-mqtt")
+        self._subscriptions = []
+        if hasattr(mqtt, 'CallbackAPIVersion'):  # paho-mqtt 2.x
+            self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        else:
+            self._client = mqtt.Client(client_id=client_id)
+        if username:
+            self._client.username_pw_set(username, password)
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._client.connect_async(host, port)
+        self._client.loop_start()
+
+    def _on_connect(self, client, *args):
+        for pattern, _ in self._subscriptions:
+            client.subscribe(pattern, qos=1)
+
+    def _on_message(self, client, userdata, message):
+        for pattern, callback in self._subscriptions:
+            if topic_matches(pattern, message.topic):
+                callback(message.topic, message.payload)
+
+    def subscribe(self, pattern, callback):
+        self._subscriptions.append((pattern, callback))
+        if self._client.is_connected():
+            self._client.subscribe(pattern, qos=1)
+
+    def publish(self, topic, payload):
+        self._client.publish(topic, payload, qos=1)
+
+    def close(self):
+        self._client.disconnect()
+        self._client.loop_stop()
+
+
+class IngestWorker:
+    """Applies sensor readings from a broker topic in batches, away from the web workers.
+
+    The transport's thread only parses and queues messages; one worker thread
+    drains the queue and applies up to `batch_size` readings per transaction
+    through apply_levels (the logic behind /api/update_bins), waiting at most
+    `linger` seconds for a batch to fill. A full queue blocks the transport,
+    which backs up into the broker instead of dropping readings.
+    """
+
+    def __init__(self, app, transport, topic=TOPIC, batch_size=500, linger=0.2, queue_size=QUEUE_SIZE):
+        self.app = app
+        self.transport = transport
+        self.topic = topic
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue = queue.Queue(queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"applied": 0, "filtered": 0, "unknown_bin": 0, "malformed": 0, "failed": 0, "batches": 0}
+
+    def _on_message(self, topic, payload):
+        reading = parse_message(topic, payload)
+        if reading is None:
+            self.stats["malformed"] += 1
+            return
+        self._queue.put(reading)
+
+    def run_once(self, timeout=None):
+        """Applies one batch; waits up to `timeout` seconds (None: the linger time) for the first reading"""
+        try:
+            batch = [self._queue.get(timeout=self.linger if timeout is None else timeout)]
+        except queue.Empty:
+            return 0
+        linger_until = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = linger_until - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        with self.app.app_context():
+            try:
+                results = apply_levels(batch)
+            except Exception:
+                db.session.rollback()
+                self.stats["failed"] += len(batch)
+                self.app.logger.exception("MQTT ingestion batch of %d readings failed", len(batch))
+                return 0
+            finally:
+                db.session.remove()
+        unknown = sum(1 for r in results if "error" in r)
+        filtered = sum(1 for r in results if r.get("filtered"))
+        self.stats["unknown_bin"] += unknown
+        self.stats["filtered"] += filtered
+        self.stats["applied"] += len(batch) - unknown - filtered
+        self.stats["batches"] += 1
+        return len(batch)
+
+    def start(self):
+        self.transport.subscribe(self.topic, self._on_message)
+
+        def loop():
+            # After stop(), whatever is still queued is applied before the thread exits
+            while not self._stop.is_set() or not self._queue.empty():
+                self.run_once(timeout=0.5)
+
+        self._thread = threading.Thread(target=loop, name="mqtt-ingest", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=10):
+        self.transport.close()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
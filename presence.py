@@ -0,0 +1,161 @@
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from models import db, Collector
+from trails import trails
+
+ACTIVE_WINDOW = timedelta(minutes=5)
+
+
+class CollectorPosition:
+    """Latest known position and heartbeat of one collector"""
+
+    __slots__ = ("id", "name", "username", "lat", "lon", "last_active")
+
+    def __init__(self, collector):
+        self.id = collector.id
+        self.name = collector.name
+        self.username = collector.username
+        self.lat = collector.lat
+        self.lon = collector.lon
+        self.last_active = collector.last_active or datetime.min
+
+    def to_dict(self):
+        # Same shape as Collector.to_dict
+        return {
+            "name": self.name,
+            "username": self.username,
+            "lat": self.lat,
+            "lon": self.lon,
+            "last_active": self.last_active.isoformat()
+        }
+
+
+class CollectorPresence:
+    """Write-behind store for collector GPS pings and page-view heartbeats.
+
+    Pings only touch memory; a background thread flushes the coalesced latest
+    position of every collector that moved to the Collector table in one
+    batched UPDATE every `flush_interval` seconds, then merges in positions
+    other worker processes have flushed. Readers (get_collectors, the admin
+    page, the dispatcher) are served from memory.
+    """
+
+    def __init__(self, flush_interval=5.0):
+        self._lock = threading.Lock()
+        self._by_username = None  # loaded lazily from the Collector table
+        self._dirty = set()
+        self._thread = None
+        self.flush_interval = flush_interval
+
+    def _ensure_loaded(self):
+        # Must be called with the lock held and inside an app context
+        if self._by_username is None:
+            self._by_username = {c.username: CollectorPosition(c) for c in Collector.query.all()}
+
+    def _find(self, username=None, name=None):
+        self._ensure_loaded()
+        if username:
+            record = self._by_username.get(username)
+            if record is None:
+                # Registered after we loaded, possibly by another worker
+                collector = Collector.query.filter_by(username=username).first()
+                if collector:
+                    record = self._by_username[username] = CollectorPosition(collector)
+            return record
+        # Fallback for older apps that only send the display name
+        return next((r for r in self._by_username.values() if r.name == name), None)
+
+    def ping(self, username=None, name=None, lat=None, lon=None):
+        """Records a heartbeat (and position, if given); returns the collector's record or None"""
+        with self._lock:
+            record = self._find(username, name)
+            if record is None:
+                return None
+            record.last_active = datetime.utcnow()
+            if lat is not None and lon is not None:
+                record.lat = lat
+                record.lon = lon
+                trails.record(record.username, lat, lon, record.last_active)
+            self._dirty.add(record.username)
+            return record
+
+    def get(self, username):
+        with self._lock:
+            return self._find(username)
+
+    def register(self, collector):
+        """Adds a newly created collector without waiting for a reload"""
+        with self._lock:
+            if self._by_username is not None:
+                self._by_username[collector.username] = CollectorPosition(collector)
+
+    def active(self):
+        """Collectors seen within the activity window"""
+        cutoff = datetime.utcnow() - ACTIVE_WINDOW
+        with self._lock:
+            self._ensure_loaded()
+            return [r for r in self._by_username.values() if r.last_active >= cutoff]
+
+    def all(self):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_username.values())
+
+    def flush(self, final=False):
+        """Writes pending positions (and trail chunks) in one batch, then picks up newer ones flushed elsewhere"""
+        trails.flush(seal_all=final)
+        with self._lock:
+            if self._by_username is None:
+                return
+            rows = [{"id": r.id, "lat": r.lat, "lon": r.lon, "last_active": r.last_active}
+                    for r in (self._by_username[u] for u in self._dirty)]
+            self._dirty.clear()
+        if rows:
+            try:
+                db.session.bulk_update_mappings(Collector, rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Keep the positions pending so the next flush retries them
+                failed = {row["id"] for row in rows}
+                with self._lock:
+                    self._dirty.update(r.username for r in self._by_username.values() if r.id in failed)
+                raise
+
+        fresh = Collector.query.all()
+        with self._lock:
+            for collector in fresh:
+                record = self._by_username.get(collector.username)
+                if record is None:
+                    self._by_username[collector.username] = CollectorPosition(collector)
+                elif collector.last_active and collector.last_active > record.last_active \
+                        and collector.username not in self._dirty:
+                    record.lat, record.lon, record.last_active = collector.lat, collector.lon, collector.last_active
+        db.session.remove()
+
+    def start(self, app):
+        """Starts the background flusher once per process"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name="presence-flush", daemon=True)
+            self._thread.start()
+
+        def final_flush():
+            with app.app_context():
+                self.flush(final=True)
+        atexit.register(final_flush)
+
+    def _run(self, app):
+        stop = threading.Event()
+        while not stop.wait(self.flush_interval):
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception:
+                app.logger.exception("Flushing collector positions failed")
+
+
+presence = CollectorPresence()
@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import forecast
+from presence import presence
+from spatial import EARTH_RADIUS_KM
+
+# Relative weight of each score component; every component is scaled to 0..1
+WEIGHTS = {"fill": 0.4, "overflow": 0.3, "age": 0.15, "proximity": 0.15}
+OVERFLOW_HOURS = 24.0  # Overflow urgency falls off as exp(-hours_to_full / OVERFLOW_HOURS)
+AGE_HOURS = 168.0  # A week since the last collection maxes out the age term
+PROXIMITY_KM = 2.0  # A collector this far away halves the proximity term
+CRITICAL_FILL = forecast.CRITICAL_LEVEL / 100.0
+
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def _seconds(value):
+    """Naive UTC datetime or ISO string to seconds since the epoch; NaN for None"""
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - UNIX_EPOCH).total_seconds()
+
+
+class PriorityEngine:
+    """Composite collection priority for every bin, scored in one vectorized pass.
+
+    Bin attributes live in parallel NumPy arrays that bins_changed patches in
+    place; scores are recomputed for the whole fleet when bins changed or
+    `max_age` seconds passed (the time-based terms and collector positions
+    drift on their own). The score is a weighted sum of fill level, overflow
+    urgency (from the forecast's predicted_full_at), time since the last
+    collection and closeness to the nearest active collector.
+    """
+
+    def __init__(self, max_age=30.0, weights=None):
+        self._lock = threading.Lock()
+        self._states = None  # bin dicts, row-aligned with the arrays
+        self._rows = {}
+        self._dirty = True
+        self._computed_at = 0.0  # time.monotonic() of the last pass
+        self._computed_on = None
+        self._scores = None
+        self._components = None
+        self._order = None
+        self.max_age = max_age
+        self.weights = dict(weights or WEIGHTS)
+
+    def invalidate(self):
+        with self._lock:
+            self._states = None
+
+    def bin_removed(self, bin_id):
+        self.invalidate()
+
+    def _ensure_built(self, bins_loader):
+        # Must be called with the lock held
+        if self._states is not None:
+            return
+        states = [b for b in bins_loader() if b.get("lat") is not None and b.get("lon") is not None]
+        self._states = states
+        self._rows = {b["bin_id"]: i for i, b in enumerate(states)}
+        self._lat = np.radians(np.array([b["lat"] for b in states], dtype=float))
+        self._lon = np.radians(np.array([b["lon"] for b in states], dtype=float))
+        self._fill = np.array([b["fill_level"] or 0 for b in states], dtype=float)
+        self._full_at = np.array([_seconds(b.get("predicted_full_at")) for b in states], dtype=float)
+        self._collected_at = np.array([_seconds(b.get("last_collected")) for b in states], dtype=float)
+        self._dirty = True
+
+    def bins_changed(self, states):
+        """Patches changed bins into the arrays; unknown bins trigger a rebuild on next use"""
+        with self._lock:
+            if self._states is None:
+                return
+            for state in states:
+                row = self._rows.get(state["bin_id"])
+                if row is None:
+                    self._states = None
+                    return
+                self._states[row] = state
+                self._fill[row] = state["fill_level"] or 0
+                self._full_at[row] = _seconds(state.get("predicted_full_at"))
+                self._collected_at[row] = _seconds(state.get("last_collected"))
+            self._dirty = True
+
+    def _nearest_collector_km(self):
+        collectors = [c for c in presence.active() if c.lat is not None and c.lon is not None]
+        if not collectors:
+            return None
+        nearest = np.full(len(self._states), np.inf)
+        cos_lat = np.cos(self._lat)
+        for c in collectors:
+            lat, lon = np.radians(c.lat), np.radians(c.lon)
+            a = np.sin((self._lat - lat) / 2) ** 2 + cos_lat * np.cos(lat) * np.sin((self._lon - lon) / 2) ** 2
+            np.minimum(nearest, 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)), out=nearest)
+        return nearest
+
+    def _compute(self):
+        # Must be called with the lock held
+        now = _seconds(datetime.utcnow())
+        fill = np.clip(self._fill / 100.0, 0.0, 1.0)
+
+        # Without a prediction (young model, full or not filling) urgency ramps from Critical to full
+        hours_to_full = np.maximum((self._full_at - now) / 3600.0, 0.0)
+        overflow = np.where(np.isnan(hours_to_full), np.clip((fill - CRITICAL_FILL) / (1.0 - CRITICAL_FILL), 0.0, 1.0),
+                            np.exp(-np.nan_to_num(hours_to_full) / OVERFLOW_HOURS))
+
+        # No recorded collection counts as half overdue
+        age_hours = np.nan_to_num((now - self._collected_at) / 3600.0, nan=AGE_HOURS / 2)
+        age = np.clip(age_hours / AGE_HOURS, 0.0, 1.0)
+
+        distance = self._nearest_collector_km()
+        proximity = np.zeros_like(fill) if distance is None else 1.0 / (1.0 + distance / PROXIMITY_KM)
+
+        self._components = {"fill": fill, "overflow": overflow, "age": age, "proximity": proximity}
+        self._scores = sum(self.weights[name] * values for name, values in self._components.items())
+        self._order = np.argsort(-self._scores, kind="stable")
+        self._computed_at = time.monotonic()
+        self._computed_on = datetime.utcnow()
+        self._dirty = False
+
+    def _ensure_fresh(self, bins_loader):
+        self._ensure_built(bins_loader)
+        if self._dirty or time.monotonic() - self._computed_at > self.max_age:
+            self._compute()
+
+    def ranked(self, bins_loader):
+        """All bin dicts, highest priority first"""
+        with self._lock:
+            self._ensure_fresh(bins_loader)
+            return [self._states[i] for i in self._order]
+
+    def queue(self, bins_loader, offset=0, limit=50):
+        """One page of the priority queue with each bin's score and its components"""
+        with self._lock:
+            self._ensure_fresh(bins_loader)
+            page = []
+            for rank, row in enumerate(self._order[offset:offset + limit], start=offset + 1):
+                page.append(dict(self._states[row], rank=rank, score=round(float(self._scores[row]), 4),
+                                 components={name: round(float(values[row]), 4)
+                                             for name, values in self._components.items()}))
+            return {"total": len(self._states), "computed_at": self._computed_on.isoformat(), "bins": page}
+
+
+priority_engine = PriorityEngine()
@@ -0,0 +1,21 @@
+from flask import Response, request, session
+
+from live_state import page_cache
+
+
+def conditional_json(payload, etag):
+    """Wraps serialized JSON in a response, answering 304 when the client already has this ETag"""
+    if etag in request.headers.get('If-None-Match', ''):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype='application/json')
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_page(key, versions, render):
+    """HTML for a page from page_cache; pages with pending flash messages render fresh, since those show once"""
+    if session.get('_flashes'):
+        return render()
+    return page_cache.get(key, versions, render)
@@ -0,0 +1,312 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from config import process_lock
+from models import db, BinHistory, BinHistoryHourly, BinHistoryDaily
+
+RAW_DAYS = 30  # Raw events younger than this are never rolled up
+HOURLY_DAYS = 365  # Hourly rollups older than this are dropped; daily ones are kept
+LOOKUP_CHUNK = 500
+VACUUM_CHUNK = 2000  # Pages freed per incremental_vacuum statement
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+RESOLUTIONS = ('raw', 'hour', 'day')
+
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def floor_hour(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(when):
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class _Aggregate:
+    __slots__ = ("min", "max", "total", "samples", "collections")
+
+    def __init__(self):
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.samples = 0
+        self.collections = 0
+
+    def add(self, low, high, avg, samples, collections=0):
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.total += avg * samples
+        self.samples += samples
+        self.collections += collections
+
+    @property
+    def avg(self):
+        return self.total / self.samples
+
+
+def _merge(model, buckets):
+    """Adds {(bin_id, bucket): _Aggregate} to the rollup table, combining with rows already there"""
+    keys = list(buckets)
+    for i in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[i:i + LOOKUP_CHUNK]
+        existing = {(r.bin_id, r.bucket): r for r in db.session.query(
+            model.id, model.bin_id, model.bucket, model.min_level, model.max_level, model.avg_level, model.samples,
+            model.collections).filter(model.bin_id.in_({k[0] for k in chunk}), model.bucket.in_({k[1] for k in chunk}))}
+        inserts, updates = [], []
+        for key in chunk:
+            agg = buckets[key]
+            row = existing.get(key)
+            if row is not None:
+                agg.add(row.min_level, row.max_level, row.avg_level, row.samples, row.collections)
+            values = {"min_level": agg.min, "max_level": agg.max, "avg_level": agg.avg, "samples": agg.samples,
+                      "collections": agg.collections}
+            if row is not None:
+                updates.append(dict(values, id=row.id))
+            else:
+                inserts.append(dict(values, bin_id=key[0], bucket=key[1]))
+        # Plain executemany statements; hourly chunks update the same daily rows many times over
+        if updates:
+            db.session.bulk_update_mappings(model, updates)
+        if inserts:
+            db.session.bulk_insert_mappings(model, inserts)
+
+
+def rollup_raw(cutoff):
+    """Folds raw events older than `cutoff` into the hourly and daily tables and deletes them.
+
+    Works one hour of events at a time, each in its own short transaction, so
+    the SQLite write lock is released between hours and an interrupted run
+    loses nothing. The database aggregates each hour per bin, so no event rows
+    are loaded. Returns the number of raw rows removed.
+    """
+    removed = 0
+    while True:
+        oldest = db.session.query(db.func.min(BinHistory.timestamp)).filter(BinHistory.timestamp < cutoff).scalar()
+        if oldest is None:
+            return removed
+        hour = floor_hour(oldest)
+        window_end = min(hour + HOUR, cutoff)
+
+        # System events (no level) have nothing to aggregate and simply expire. The lower
+        # bound (no rows are older) makes SQLite range-scan the timestamp index for the hour
+        rows = db.session.query(
+            BinHistory.bin_id, db.func.min(BinHistory.fill_level), db.func.max(BinHistory.fill_level),
+            db.func.avg(BinHistory.fill_level), db.func.count(BinHistory.fill_level),
+            db.func.sum(db.case((BinHistory.event_type == 'Collection', 1), else_=0)))\
+            .filter(BinHistory.timestamp >= hour, BinHistory.timestamp < window_end,
+                    BinHistory.fill_level.isnot(None))\
+            .group_by(BinHistory.bin_id)
+        hourly, daily = {}, {}
+        for bin_id, low, high, avg, samples, collections in rows:
+            for buckets, bucket in ((hourly, hour), (daily, floor_day(hour))):
+                agg = buckets[(bin_id, bucket)] = _Aggregate()
+                agg.add(low, high, float(avg), samples, collections)
+
+        _merge(BinHistoryHourly, hourly)
+        _merge(BinHistoryDaily, daily)
+        removed += BinHistory.query.filter(BinHistory.timestamp < window_end).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def prune_hourly(cutoff):
+    removed = BinHistoryHourly.query.filter(BinHistoryHourly.bucket < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def incremental_vacuum(engine):
+    """Returns free pages to the filesystem on SQLite databases in incremental auto-vacuum mode.
+
+    Frees VACUUM_CHUNK pages per statement so writers get the lock in between.
+    Returns the number of pages released, or None when the database is not
+    SQLite or was created without incremental auto-vacuum (see enable_incremental_vacuum).
+    """
+    if engine.dialect.name != 'sqlite':
+        return None
+    raw = engine.raw_connection()
+    try:
+        conn = raw.driver_connection
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return None
+        released = 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free:
+            # execute() would step the pragma once (one page); executescript runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_CHUNK})")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            released += free - remaining
+            if remaining >= free:
+                break
+            free = remaining
+        return released
+    finally:
+        raw.close()
+
+
+def enable_incremental_vacuum(engine):
+    """Switches a SQLite database to incremental auto-vacuum.
+
+    Needs one full VACUUM, which rewrites the whole file and holds the write
+    lock while it runs, so it is left to the CLI (--enable-incremental-vacuum).
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            return False
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+    return True
+
+
+def run_retention(raw_days=RAW_DAYS, hourly_days=HOURLY_DAYS, now=None):
+    """One retention pass: roll up old raw events, drop old hourly rollups, vacuum. Returns counts."""
+    now = now or datetime.utcnow()
+    stats = {
+        "raw_rolled_up": rollup_raw(floor_hour(now - timedelta(days=raw_days))),
+        "hourly_pruned": prune_hourly(floor_day(now - timedelta(days=hourly_days))),
+    }
+    stats["pages_vacuumed"] = incremental_vacuum(db.engine)
+    return stats
+
+
+def start_scheduler(app, interval):
+    """Runs run_retention every `interval` seconds in a daemon thread, started once per process"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            return _scheduler
+        _scheduler = threading.Thread(target=_run_scheduler, args=(app, interval), name="history-retention",
+                                      daemon=True)
+        _scheduler.start()
+        return _scheduler
+
+
+def _run_scheduler(app, interval):
+    lock_path = os.path.join(app.instance_path, 'retention.lock')
+
+    stop = threading.Event()
+    while not stop.wait(interval):
+        try:
+            # Every worker runs the scheduler; the lock keeps two from rolling up the same events
+            with app.app_context(), process_lock(lock_path, blocking=False) as acquired:
+                if acquired:
+                    stats = run_retention(app.config['HISTORY_RAW_DAYS'], app.config['HISTORY_HOURLY_DAYS'])
+                    app.logger.info("History retention: %s", stats)
+        except Exception:
+            app.logger.exception("History retention failed")
+
+
+def _raw_points(bin_id, start, end):
+    rows = db.session.query(BinHistory.timestamp, BinHistory.fill_level, BinHistory.event_type)\
+        .filter(BinHistory.bin_id == bin_id, BinHistory.timestamp >= start, BinHistory.timestamp <= end,
+                BinHistory.fill_level.isnot(None))\
+        .order_by(BinHistory.timestamp).all()
+    return [(t, level, level, level, 1, 1 if event_type == 'Collection' else 0) for t, level, event_type in rows]
+
+
+def _rollup_points(model, bin_id, start, end, floor):
+    # Includes the bucket the range starts in
+    rows = model.query.filter(model.bin_id == bin_id, model.bucket >= floor(start), model.bucket <= end)\
+        .order_by(model.bucket).all()
+    return [(r.bucket, r.min_level, r.max_level, r.avg_level, r.samples, r.collections) for r in rows]
+
+
+def _rebucket(points, floor):
+    merged = {}
+    for t, low, high, avg, samples, collections in points:
+        bucket = floor(t)
+        agg = merged.get(bucket)
+        if agg is None:
+            agg = merged[bucket] = _Aggregate()
+        agg.add(low, high, avg, samples, collections)
+    return [(t, a.min, a.max, a.avg, a.samples, a.collections) for t, a in sorted(merged.items())]
+
+
+def fill_series(bin_id, start, end, resolution=None):
+    """Fill-level series of one bin between two times, from raw events and rollups.
+
+    Every event is either still raw or folded into the rollups, never both, so
+    the sources concatenate: daily rollups for days whose hourly rows were
+    pruned, then hourly rollups, then raw events. `resolution` ('raw', 'hour'
+    or 'day') defaults by range length, so long ranges read rollups instead
+    of every event. Points are (time, min, max, avg, samples, collections),
+    oldest first.
+    """
+    if resolution is None:
+        span = end - start
+        resolution = 'raw' if span <= 2 * DAY else 'hour' if span <= 60 * DAY else 'day'
+
+    raw = _raw_points(bin_id, start, end)
+    if resolution == 'day':
+        # Merges the day that is part rolled up, part raw
+        return _rebucket(_rollup_points(BinHistoryDaily, bin_id, start, end, floor_day) + raw, floor_day)
+
+    hourly = _rollup_points(BinHistoryHourly, bin_id, start, end, floor_hour)
+    first_hourly = db.session.query(db.func.min(BinHistoryHourly.bucket))\
+        .filter(BinHistoryHourly.bin_id == bin_id).scalar()
+    daily = _rollup_points(BinHistoryDaily, bin_id, start, end, floor_day)
+    if first_hourly is not None:
+        # Days before the first hourly row are the ones whose hourly rows were pruned
+        daily = [p for p in daily if p[0] < floor_day(first_hourly)]
+    if resolution == 'hour':
+        return daily + _rebucket(hourly + raw, floor_hour)
+    return daily + hourly + raw
+
+
+def downsample(points, threshold):
+    """Largest-Triangle-Three-Buckets: `threshold` of fill_series' points that keep the avg curve's shape.
+
+    The first and last points are kept; from each of the buckets in between,
+    the point spanning the largest triangle with the previously kept point and
+    the next bucket's mean, so peaks and collection drops survive where bucket
+    averages would flatten them.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return points
+    xs = [p[0].timestamp() for p in points]
+    ys = [p[3] for p in points]
+    every = (len(points) - 2) / (threshold - 2)
+    kept = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        # Mean of the next bucket (just the last point for the final bucket)
+        count = next_end - end
+        mean_x = sum(xs[end:next_end]) / count
+        mean_y = sum(ys[end:next_end]) / count
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - mean_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (mean_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(points[best])
+        a = best
+    kept.append(points[-1])
+    return kept
+
+
+def history_page(bin_id, before=None, limit=50):
+    """One page of a bin's events, newest first, strictly before the (timestamp, id) key `before`.
+
+    Keyset pagination: each page is a range scan of ix_bin_history_bin_id_timestamp
+    (SQLite keeps the rowid id in index entries), however deep the page.
+    """
+    query = BinHistory.query.filter(BinHistory.bin_id == bin_id)
+    if before is not None:
+        timestamp, row_id = before
+        query = query.filter(BinHistory.timestamp <= timestamp,
+                             db.or_(BinHistory.timestamp < timestamp, BinHistory.id < row_id))
+    return query.order_by(BinHistory.timestamp.desc(), BinHistory.id.desc()).limit(limit).all()
+
+
+def delete_bin_rollups(bin_id):
+    BinHistoryHourly.query.filter_by(bin_id=bin_id).delete()
+    BinHistoryDaily.query.filter_by(bin_id=bin_id).delete()
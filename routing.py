@@ -0,0 +1,206 @@
+import math
+import time
+from itertools import accumulate
+from operator import mul
+
+from spatial import EARTH_RADIUS_KM, PointGrid
+
+# How strongly urgent bins are pulled to the front of the route. 0 gives the
+# shortest path; larger values trade extra kilometres for reaching full bins sooner.
+URGENCY_FACTOR = 0.5
+STATUS_WEIGHT = {"Critical": 3.0, "Warning": 1.0, "Normal": 0.0}
+NEIGHBOURS = 8  # Nearest stops the local search tries to connect each stop to
+
+
+def stop_weight(bin_data):
+    """Urgency of a bin from its status (see calculate_status) and fill level"""
+    return STATUS_WEIGHT.get(bin_data["status"], 0.0) + bin_data["fill_level"] / 100.0
+
+
+class _Tour:
+    """An open path that starts at node 0 (the collector) and visits every stop once.
+
+    Alongside the order it keeps the leg lengths, arrival distances and
+    prefix sums of weight and weight x arrival, so the cost of a move, given
+    as the pieces of the current order it splices together, is evaluated in
+    O(pieces) instead of re-walking the route.
+    """
+
+    def __init__(self, points, weights):
+        self.points = points
+        self._lat = [math.radians(lat) for lat, _ in points]
+        self._lon = [math.radians(lon) for _, lon in points]
+        self._cos = [math.cos(lat) for lat in self._lat]
+        self.weights = weights
+        self.total_weight = sum(weights) or 1.0
+        self.grid = PointGrid(points, per_cell=NEIGHBOURS / 2)
+        self._neighbours = [None] * len(points)
+
+    def neighbours(self, node):
+        # Found on first use, so setup costs nothing for stops the search never reaches
+        if self._neighbours[node] is None:
+            self._neighbours[node] = self.grid.nearest(node, NEIGHBOURS)
+        return self._neighbours[node]
+
+    def dist(self, a, b):
+        h = (math.sin((self._lat[b] - self._lat[a]) / 2) ** 2
+             + self._cos[a] * self._cos[b] * math.sin((self._lon[b] - self._lon[a]) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+    def nearest_neighbour(self, deadline):
+        """Greedy construction: go to the nearby stop with the best urgency per kilometre.
+
+        Only the neighbour lists are scored; when all of those are visited the
+        closest remaining stop on the grid is next. Stops still left at the
+        deadline follow in a sweep of the grid.
+        """
+        remaining = set(range(1, len(self.weights)))
+        unvisited = PointGrid(self.points)
+        unvisited.remove(0)
+        order, current = [0], 0
+        while remaining:
+            if time.perf_counter() > deadline:
+                order.extend(unvisited.sweep(remaining))
+                break
+            nearby = [n for n in self.neighbours(current) if n in remaining]
+            if nearby:
+                nxt = min(nearby, key=lambda n: self.dist(current, n) / (1.0 + URGENCY_FACTOR * self.weights[n]))
+            else:
+                nxt = unvisited.nearest(current, 1)[0]
+            unvisited.remove(nxt)
+            remaining.remove(nxt)
+            order.append(nxt)
+            current = nxt
+        self.set_order(order, [0.0] + [self.dist(a, b) for a, b in zip(order, order[1:])])
+
+    def set_order(self, order, legs):
+        # legs[p] is the distance from order[p - 1] to order[p]; legs[0] is 0
+        self.order = order
+        self.legs = legs
+        self.arrival = list(accumulate(legs))
+        weights = [self.weights[n] for n in order]
+        self._w = [0.0] + list(accumulate(weights))
+        self._wa = [0.0] + list(accumulate(map(mul, weights, self.arrival)))
+        self.pos = [0] * len(order)
+        for p, node in enumerate(order):
+            self.pos[node] = p
+        self.cost = self.arrival[-1] + URGENCY_FACTOR * self._wa[-1] / self.total_weight
+
+    def evaluate(self, pieces):
+        """Cost of the order made of `pieces`, (first, last, reversed) position ranges of the current order.
+
+        Path length plus the urgency-weighted mean distance travelled before
+        reaching each bin. A piece keeps its inner legs, so its arrivals only
+        shift by where it is entered (or mirror, when reversed).
+        """
+        travelled = weighted = 0.0
+        prev = None
+        for a, b, rev in pieces:
+            first, last = (self.order[b], self.order[a]) if rev else (self.order[a], self.order[b])
+            if prev is not None:
+                travelled += self.dist(prev, first)
+            w = self._w[b + 1] - self._w[a]
+            wa = self._wa[b + 1] - self._wa[a]
+            inner = self.arrival[b] - self.arrival[a]
+            weighted += travelled * w + (self.arrival[b] * w - wa if rev else wa - self.arrival[a] * w)
+            travelled += inner
+            prev = last
+        return travelled + URGENCY_FACTOR * weighted / self.total_weight
+
+    def apply(self, pieces):
+        order, legs = [], []
+        for a, b, rev in pieces:
+            nodes, inner = self.order[a:b + 1], self.legs[a + 1:b + 1]
+            if rev:
+                nodes.reverse()
+                inner.reverse()
+            legs.append(self.dist(order[-1], nodes[0]) if order else 0.0)
+            legs.extend(inner)
+            order.extend(nodes)
+        self.set_order(order, legs)
+
+    def try_move(self, pieces):
+        pieces = [p for p in pieces if p[0] <= p[1]]
+        if self.evaluate(pieces) < self.cost - 1e-9 * (1.0 + self.cost):
+            self.apply(pieces)
+            return True
+        return False
+
+
+def _two_opt(tour, deadline):
+    """One pass of segment reversals that join each stop to one of its neighbours; returns whether any helped"""
+    improved = False
+    last = len(tour.order) - 1
+    for a in range(len(tour.order)):
+        if time.perf_counter() > deadline:
+            break
+        for c in tour.neighbours(a):
+            pa, pc = tour.pos[a], tour.pos[c]
+            # Reversing the stops between a and c makes them adjacent
+            start, end = (pa + 1, pc) if pc > pa + 1 else (pc + 1, pa) if pa > pc + 1 else (None, None)
+            if start is not None and tour.try_move([(0, start - 1, False), (start, end, True),
+                                                    (end + 1, last, False)]):
+                improved = True
+    return improved
+
+
+def _relocate(tour, i, e):
+    """Moves the stops at positions i..e next to a neighbour of either end, either way round, if that helps"""
+    last = len(tour.order) - 1
+    for c in set(tour.neighbours(tour.order[i]) + tour.neighbours(tour.order[e])):
+        pc = tour.pos[c]
+        for q in (pc, pc - 1):  # Insert after c, or before it
+            if q < 0 or i - 1 <= q <= e:
+                continue
+            for rev in (False, True):
+                if q < i:
+                    pieces = [(0, q, False), (i, e, rev), (q + 1, i - 1, False), (e + 1, last, False)]
+                else:
+                    pieces = [(0, i - 1, False), (e + 1, q, False), (i, e, rev), (q + 1, last, False)]
+                if tour.try_move(pieces):
+                    return True
+    return False
+
+
+def _or_opt(tour, deadline):
+    """One pass of moving runs of 1-3 stops; returns whether any move helped"""
+    improved = False
+    for size in (1, 2, 3):
+        for node in range(1, len(tour.order)):
+            if time.perf_counter() > deadline:
+                return improved
+            i = tour.pos[node]
+            if i + size <= len(tour.order) and _relocate(tour, i, i + size - 1):
+                improved = True
+    return improved
+
+
+def plan_route(start, bins, time_budget=0.5):
+    """Orders `bins` (WasteBin.to_dict payloads) into a collection route from `start` (lat, lon).
+
+    Builds a greedy tour over nearest-neighbour lists from a grid, then improves
+    it with 2-opt and Or-opt moves between neighbours until no move helps or
+    `time_budget` seconds, setup included, pass.
+    """
+    began = time.perf_counter()
+    deadline = began + time_budget
+    stops = [b for b in bins if b.get("lat") is not None and b.get("lon") is not None]
+    if not stops:
+        return {"stops": [], "distance_km": 0.0, "initial_distance_km": 0.0, "computed_ms": 0.0}
+
+    points = [tuple(start)] + [(b["lat"], b["lon"]) for b in stops]
+    tour = _Tour(points, [0.0] + [stop_weight(b) for b in stops])
+    tour.nearest_neighbour(deadline)
+    initial_km = tour.arrival[-1]
+    while time.perf_counter() < deadline:
+        if not _two_opt(tour, deadline) and not _or_opt(tour, deadline):
+            break
+
+    route = [dict(stops[node - 1], leg_km=round(tour.legs[p], 3), arrival_km=round(tour.arrival[p], 3))
+             for p, node in enumerate(tour.order) if p]
+    return {
+        "stops": route,
+        "distance_km": round(tour.arrival[-1], 3),
+        "initial_distance_km": round(initial_km, 3),
+        "computed_ms": round((time.perf_counter() - began) * 1000, 1),
+    }
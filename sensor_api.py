@@ -0,0 +1,142 @@
+import json
+from datetime import timedelta
+
+from flask import Blueprint, current_app, request, jsonify
+
+from live_state import live_bins
+from responses import conditional_json
+from bin_updates import load_bins, apply_reading, apply_levels, commit_readings
+from analytics import StatsBatch
+from frames import FrameError, decode, is_newer
+
+# Routes the bins and the simulator call; no templates, so ingestion-only workers run with BLUEPRINTS=sensor
+sensor_bp = Blueprint('sensor', __name__)
+
+
+def parse_reading(reading):
+    """(bin_id, fill_level) of one JSON reading; raises ValueError with the error to report for it.
+
+    Levels outside 0..100 are refused, as /api/ingest rejects them for frames.
+    """
+    bin_id = reading.get('bin_id')
+    if not isinstance(bin_id, str) or not bin_id:
+        raise ValueError("Invalid bin_id")
+    try:
+        level = int(reading['fill_level'])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise ValueError("Invalid fill_level")
+    if not 0 <= level <= 100:
+        raise ValueError("fill_level must be within 0..100")
+    return bin_id, level
+
+
+@sensor_bp.route('/api/ping')
+def ping():
+    """Wake-up target for the firmware: answers without touching the database"""
+    return jsonify({"ok": True})
+
+@sensor_bp.route('/api/update_bin', methods=['POST'])
+def update_bin():
+    """Hardware Simulation Endpoint"""
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid reading"}), 400
+    try:
+        reading = parse_reading(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = apply_levels([reading])[0]
+    if "error" in result:
+        return jsonify({"error": result["error"]}), 404
+    return jsonify({"status": result["status"]}), 200
+
+@sensor_bp.route('/api/update_bins', methods=['POST'])
+def update_bins():
+    """Bulk sensor ingestion: applies many readings with one lookup and one commit"""
+    data = request.json
+    readings = data.get('readings') if isinstance(data, dict) else data
+    if not isinstance(readings, list):
+        return jsonify({"error": "Expected a list of readings"}), 400
+
+    parsed = []
+    for reading in readings:
+        if not isinstance(reading, dict):
+            parsed.append({"bin_id": None, "error": "Invalid reading"})
+            continue
+        try:
+            parsed.append(parse_reading(reading))
+        except ValueError as e:
+            bin_id = reading.get('bin_id')
+            parsed.append({"bin_id": bin_id if isinstance(bin_id, str) else None, "error": str(e)})
+
+    applied = iter(apply_levels([p for p in parsed if isinstance(p, tuple)]))
+    results = [next(applied) if isinstance(p, tuple) else p for p in parsed]
+    return jsonify({"results": results}), 200
+
+@sensor_bp.route('/api/ingest', methods=['POST'])
+def ingest_frames():
+    """Compact ingestion for the firmware: binary frames (see frames.py) of buffered readings.
+
+    Readings are applied oldest first at the time they were taken. A retransmitted
+    reading (sequence number already seen) is skipped, so units can resend a
+    batch whose response they lost. Levels above 100 are counted as rejected.
+    """
+    try:
+        frames = decode(request.get_data(cache=False))
+    except FrameError as e:
+        return jsonify({"error": str(e)}), 400
+
+    bins = load_bins({f.bin_id for f in frames})
+    window = current_app.config['INGEST_SEQ_WINDOW']
+    results = []
+    history_rows = []
+    changed = {}
+    stats = StatsBatch()
+    for frame in frames:
+        bin_obj = bins.get(frame.bin_id)
+        if not bin_obj:
+            results.append({"bin_id": frame.bin_id, "error": "Bin not found"})
+            continue
+        battery_changed = frame.battery is not None and frame.battery != bin_obj.battery_level
+        if battery_changed:
+            bin_obj.battery_level = frame.battery
+        applied = filtered = rejected = 0
+        for seq, age, level in frame.readings:
+            if not is_newer(seq, bin_obj.last_seq, window):
+                continue
+            bin_obj.last_seq = seq
+            if level > 100:
+                rejected += 1
+                continue
+            # The unit's clock is only an offset; never step a bin back behind its last reading
+            when = stats.now - timedelta(seconds=age)
+            if bin_obj.last_updated is not None:
+                when = min(max(when, bin_obj.last_updated), stats.now)
+            if apply_reading(bin_obj, level, stats, history_rows, when):
+                applied += 1
+            else:
+                filtered += 1
+        if applied or battery_changed:
+            changed[frame.bin_id] = bin_obj.to_dict()
+        if rejected:
+            current_app.logger.warning("Rejected %d out-of-range readings from %s", rejected, frame.bin_id)
+        results.append({"bin_id": frame.bin_id, "applied": applied, "filtered": filtered, "rejected": rejected,
+                        "status": bin_obj.status})
+
+    commit_readings(history_rows, stats, changed.values())
+    return jsonify({"results": results}), 200
+
+@sensor_bp.route('/api/get_all_bins', methods=['GET'])
+def get_all_bins():
+    """Bin list for the simulator and dashboards.
+
+    Plain requests get the full list. With ?since=<version> only the bins changed
+    after that version are returned, wrapped with the new version token.
+    """
+    if 'since' in request.args:
+        changes = live_bins.changes_since(request.args['since'])
+        return conditional_json(json.dumps(changes).encode(), f'"{changes["version"]}"')
+
+    # Served from the in-memory snapshot; bin writes keep it current
+    version, payload = live_bins.snapshot()
+    return conditional_json(payload, f'"{version}"')
@@ -1,110 +1,328 @@
-import requests
-import time
-import random
+import asyncio
 import argparse
+import random
+import time
+
+import httpx
+
+import frames
 
 
 parser = argparse.ArgumentParser(description="Prioribin Edge Intelligence Simulator")
 parser.add_argument("--url", type=str, default="http://127.0.0.1:5000", help="Base URL of the Prioribin Server")
-args = parser.parse_args()
+parser.add_argument("--ignore", type=str, default="BIN-01,BIN-02",
+                    help="Comma-separated bin ids left to real hardware (demo mode)")
+parser.add_argument("--cycle", type=float, default=15, help="Seconds between demo sensor cycles")
+
+load = parser.add_argument_group("load generator", "Open-loop load test of the ingestion API")
+load.add_argument("--load", action="store_true", help="Run as a load generator instead of the demo")
+load.add_argument("--sensors", type=int, default=1000, help="Number of virtual sensors")
+load.add_argument("--interval", type=float, default=60, help="Mean seconds between reports from one sensor")
+load.add_argument("--jitter", type=float, default=0.2, help="Random +/- fraction applied to each interval")
+load.add_argument("--fill-rate", type=str, default="uniform:1,5",
+                  help="Percent added per report: uniform:LO,HI | normal:MEAN,SD | exp:MEAN")
+load.add_argument("--duration", type=float, default=60, help="Seconds to generate load for")
+load.add_argument("--connections", type=int, default=100, help="Size of the HTTP connection pool")
+load.add_argument("--endpoint", choices=["single", "batch", "frame"], default="single",
+                  help="Post each reading to /api/update_bin, group them into /api/update_bins, "
+                       "or send each as a binary frame to /api/ingest like the firmware")
+load.add_argument("--batch-size", type=int, default=100, help="Readings per request with --endpoint batch")
+load.add_argument("--batch-linger", type=float, default=0.05,
+                  help="Seconds a partial batch waits for more readings before it is sent")
+load.add_argument("--create-bins", action="store_true",
+                  help="Register one synthetic bin per virtual sensor (SIM-00001, ...) before the run")
+load.add_argument("--admin-user", type=str, default="admin", help="Admin login used by --create-bins")
+load.add_argument("--admin-password", type=str, default="Admin@123!", help="Admin password used by --create-bins")
+
+BASE_URL = None
+UPDATE_URL = None
+BATCH_UPDATE_URL = None
+INGEST_URL = None
+GET_BINS_URL = None
 
-BASE_URL = args.url
-UPDATE_URL = f'{BASE_URL}/api/update_bin'
-GET_BINS_URL = f'{BASE_URL}/api/get_all_bins'
 
-def get_registered_bins():
+async def get_registered_bins(client):
     """Fetches real bins from the Admin Dashboard"""
     try:
-        response = requests.get(GET_BINS_URL)
+        response = await client.get(GET_BINS_URL)
         if response.status_code == 200:
             return response.json()
-    except:
+    except httpx.HTTPError:
         return []
     return []
 
-print("----------------------------------------------------------------")
-print("🚀 PRIORIBIN: Edge Intelligence Simulator (Event-Triggered)")
-print("----------------------------------------------------------------")
-print("Waiting for server...")
-
-
-bin_states = {}
-
-try:
-    while True:
-        # 1. Fetch Active Bins from Server
-        
-        active_bins = get_registered_bins()
-        
-        if not active_bins:
-            print("⚠️  No bins found in system. Please add a bin in Admin Dashboard.")
-            time.sleep(15)
-            continue
-
-        
-        IGNORED_BINS = ["BIN-01", "BIN-02"]
-
-        simulated_count = 0
-        for bin_data in active_bins:
-            b_id = bin_data['bin_id']
-            
-            
-            if b_id in IGNORED_BINS:
+
+async def send_readings(client, readings):
+    """Pushes one cycle of readings in a single batch request, falling back to one POST per reading"""
+    try:
+        response = await client.post(BATCH_UPDATE_URL, json={"readings": readings}, timeout=5)
+        if response.status_code == 200:
+            for result in response.json().get("results", []):
+                if "error" in result:
+                    print(f"   ❌ {result['bin_id']}: {result['error']}")
+            return
+    except httpx.HTTPError:
+        print("   ❌ Network Error: Server Offline")
+        return
+
+    # Older servers without the batch endpoint
+    results = await asyncio.gather(*(client.post(UPDATE_URL, json=payload, timeout=1) for payload in readings),
+                                   return_exceptions=True)
+    if any(isinstance(r, Exception) for r in results):
+        print("   ❌ Network Error: Server Offline")
+
+
+# --- Demo mode ---
+
+async def run_demo(args):
+    print("----------------------------------------------------------------")
+    print("🚀 PRIORIBIN: Edge Intelligence Simulator (Event-Triggered)")
+    print("----------------------------------------------------------------")
+    print("Waiting for server...")
+
+    ignored_bins = {b.strip() for b in args.ignore.split(",") if b.strip()}
+    bin_states = {}
+
+    async with httpx.AsyncClient() as client:
+        while True:
+            # 1. Fetch Active Bins from Server
+            active_bins = await get_registered_bins(client)
+
+            if not active_bins:
+                print("⚠️  No bins found in system. Please add a bin in Admin Dashboard.")
+                await asyncio.sleep(args.cycle)
                 continue
-                
-            simulated_count += 1
-            server_fill_level = bin_data['fill_level'] 
-            
-            
-            if b_id not in bin_states:
-                bin_states[b_id] = server_fill_level
-
-            # 2. LOGIC: Check if Collector emptied it
-            # If server says 0 but we thought it was 100, the collector cleaned it
-            if server_fill_level == 0 and bin_states[b_id] > 0:
-                print(f"♻️  [EVENT] {b_id} was emptied by Collector. Resetting Edge Sensor.")
-                bin_states[b_id] = 0
-            
-            # 3. LOGIC: Simulate Waste Accumulation
-            current_level = bin_states[b_id]
-
-            if current_level >= 100:
-                # Bin is full. It CANNOT go down unless collected.
-                new_level = 100
-                status_msg = "🚨 CRITICAL: OVERFLOW DETECTED"
-            else:
-                # Simulate people throwing trash (random increase 5% to 15%)
-                increase = random.randint(5, 15)
-                new_level = min(current_level + increase, 100) # Cap at 100
-                status_msg = "✅ Monitoring... (Filling Up)"
-
-            # Update local memory
-            bin_states[b_id] = new_level
-
-            # 4. OUTPUT (Matches PDF concept of Edge Processing)
-            print("-" * 50)
-            print(f"📦 BIN ID: {b_id}")
-            print(f"   Sensor Reading: {new_level} cm (converted to %)")
-            
-            if new_level >= 90:
-                print("   [EDGE LOGIC] 🛑 Threshold Exceeded -> PRIORITY HIGH")
-                print("   STATUS: CRITICAL (Needs Collector)")
-            elif new_level >= 70:
-                print("   [EDGE LOGIC] ⚠️ Threshold Approaching -> PRIORITY MED")
-            else:
-                print(f"   [EDGE LOGIC] Normal accumulation (+{new_level - current_level if new_level>current_level else 0}%)")
-
-            # 5. Send to Server (Only if changed or critical to keep heartbeat)
-            payload = {"bin_id": b_id, "fill_level": new_level}
+
+            readings = []
+            for bin_data in active_bins:
+                b_id = bin_data['bin_id']
+
+                if b_id in ignored_bins:
+                    continue
+
+                server_fill_level = bin_data['fill_level']
+
+                if b_id not in bin_states:
+                    bin_states[b_id] = server_fill_level
+
+                # 2. LOGIC: Check if Collector emptied it
+                # If server says 0 but we thought it was 100, the collector cleaned it
+                if server_fill_level == 0 and bin_states[b_id] > 0:
+                    print(f"♻️  [EVENT] {b_id} was emptied by Collector. Resetting Edge Sensor.")
+                    bin_states[b_id] = 0
+
+                # 3. LOGIC: Simulate Waste Accumulation
+                current_level = bin_states[b_id]
+
+                if current_level >= 100:
+                    # Bin is full. It CANNOT go down unless collected.
+                    new_level = 100
+                else:
+                    # Simulate people throwing trash (random increase 5% to 15%)
+                    increase = random.randint(5, 15)
+                    new_level = min(current_level + increase, 100) # Cap at 100
+
+                # Update local memory
+                bin_states[b_id] = new_level
+
+                # 4. OUTPUT (Matches PDF concept of Edge Processing)
+                print("-" * 50)
+                print(f"📦 BIN ID: {b_id}")
+                print(f"   Sensor Reading: {new_level} cm (converted to %)")
+
+                if new_level >= 90:
+                    print("   [EDGE LOGIC] 🛑 Threshold Exceeded -> PRIORITY HIGH")
+                    print("   STATUS: CRITICAL (Needs Collector)")
+                elif new_level >= 70:
+                    print("   [EDGE LOGIC] ⚠️ Threshold Approaching -> PRIORITY MED")
+                else:
+                    print(f"   [EDGE LOGIC] Normal accumulation (+{new_level - current_level if new_level>current_level else 0}%)")
+
+                # 5. Queue for the batch upload at the end of the cycle
+                readings.append({"bin_id": b_id, "fill_level": new_level})
+
+            if readings:
+                print(f"\n📡 Uploading {len(readings)} readings in one batch...")
+                await send_readings(client, readings)
+
+            print("\n⏳ Cycle complete. Waiting for next sensor reading...\n")
+            await asyncio.sleep(args.cycle)
+
+
+# --- Load generator ---
+
+def fill_rate_sampler(spec):
+    """Builds a function returning one fill increment from a --fill-rate spec"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(*values)
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(random.gauss(*values), 0.0)
+    if kind == "exp" and len(values) == 1:
+        return lambda: random.expovariate(1.0 / values[0])
+    raise SystemExit(f"Invalid --fill-rate '{spec}'")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100.0 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []  # seconds, one per request
+        self.readings = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def record(self, latency, readings, ok):
+        self.latencies.append(latency)
+        self.readings += readings
+        if not ok:
+            self.errors += 1
+
+    def report(self, title):
+        elapsed = time.perf_counter() - self.started
+        ordered = sorted(self.latencies)
+        print("-" * 64)
+        print(f"📊 {title}")
+        print(f"   Requests : {len(ordered):,} ({self.errors:,} failed) in {elapsed:.1f} s")
+        print(f"   Throughput: {len(ordered) / elapsed:,.1f} req/s, {self.readings / elapsed:,.1f} readings/s")
+        if ordered:
+            print(f"   Latency  : p50 {percentile(ordered, 50) * 1000:.1f} ms | "
+                  f"p95 {percentile(ordered, 95) * 1000:.1f} ms | "
+                  f"p99 {percentile(ordered, 99) * 1000:.1f} ms | "
+                  f"max {ordered[-1] * 1000:.1f} ms")
+
+
+async def timed_post(client, stats, url, payload, readings):
+    began = time.perf_counter()
+    try:
+        if isinstance(payload, bytes):
+            response = await client.post(url, content=payload, headers={"Content-Type": "application/octet-stream"})
+        else:
+            response = await client.post(url, json=payload)
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    stats.record(time.perf_counter() - began, readings, ok)
+
+
+async def create_synthetic_bins(client, args, bin_ids):
+    """Registers the virtual sensors' bins through the admin form, scattered around the city centre"""
+    response = await client.post(f"{BASE_URL}/admin_login",
+                                 data={"username": args.admin_user, "password": args.admin_password})
+    if response.status_code != 302:
+        raise SystemExit("❌ Admin login failed; check --admin-user/--admin-password")
+
+    existing = {b["bin_id"] for b in await get_registered_bins(client)}
+    missing = [b for b in bin_ids if b not in existing]
+    print(f"🧱 Creating {len(missing):,} synthetic bins ({len(bin_ids) - len(missing):,} already exist)...")
+
+    async def add(bin_id):
+        await client.post(f"{BASE_URL}/add_bin", data={
+            "bin_id": bin_id,
+            "lat": f"{9.9312 + random.uniform(-0.08, 0.08):.6f}",
+            "lon": f"{76.2673 + random.uniform(-0.08, 0.08):.6f}",
+        })
+
+    for i in range(0, len(missing), args.connections):
+        await asyncio.gather(*(add(b) for b in missing[i:i + args.connections]))
+
+
+async def virtual_sensor(client, args, stats, bin_id, sample_fill, deadline, outbox):
+    level = random.uniform(0, 60)
+    seq = random.randrange(frames.SEQ_MODULUS)  # Units start at a random sequence number, like the firmware
+    # Spread the first reports over one interval so sensors don't fire in lockstep
+    await asyncio.sleep(random.uniform(0, args.interval))
+    while time.perf_counter() < deadline:
+        level = min(level + sample_fill(), 100.0)
+        if level >= 100 and random.random() < 0.05:
+            level = 0.0  # Occasionally emptied by a collector
+        reading = {"bin_id": bin_id, "fill_level": int(level)}
+        if outbox is not None:
+            await outbox.put(reading)
+        elif args.endpoint == "frame":
+            seq += 1
+            frame = frames.encode(bin_id, [(seq, 0, int(level))], battery=random.randint(20, 100))
+            asyncio.create_task(timed_post(client, stats, INGEST_URL, frame, 1))
+        else:
+            asyncio.create_task(timed_post(client, stats, UPDATE_URL, reading, 1))
+        delay = args.interval * (1 + random.uniform(-args.jitter, args.jitter))
+        await asyncio.sleep(max(delay, 0.001))
+
+
+async def batch_sender(client, args, stats, outbox, deadline):
+    """Groups queued readings into /api/update_bins requests of up to --batch-size"""
+    while time.perf_counter() < deadline or not outbox.empty():
+        batch = [await outbox.get()]
+        linger_until = time.perf_counter() + args.batch_linger
+        while len(batch) < args.batch_size:
+            remaining = linger_until - time.perf_counter()
+            if remaining <= 0:
+                break
             try:
-                requests.post(UPDATE_URL, json=payload, timeout=1)
-            except:
-                print("   ❌ Network Error: Server Offline")
+                batch.append(await asyncio.wait_for(outbox.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        asyncio.create_task(timed_post(client, stats, BATCH_UPDATE_URL, {"readings": batch}, len(batch)))
+
+
+ENDPOINT_PATHS = {"single": "update_bin", "batch": "update_bins", "frame": "ingest"}
+
+
+async def run_load(args):
+    bin_ids = [f"SIM-{i:05d}" for i in range(1, args.sensors + 1)]
+    sample_fill = fill_rate_sampler(args.fill_rate)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
 
-            time.sleep(1)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        if args.create_bins:
+            await create_synthetic_bins(client, args, bin_ids)
+
+        rate = args.sensors / args.interval
+        print(f"🚀 Load test: {args.sensors:,} sensors every ~{args.interval:g}s (~{rate:,.1f} readings/s) "
+              f"for {args.duration:g}s via /api/{ENDPOINT_PATHS[args.endpoint]}")
+
+        stats = LoadStats()
+        deadline = time.perf_counter() + args.duration
+        outbox = asyncio.Queue() if args.endpoint == "batch" else None
+        tasks = [asyncio.create_task(virtual_sensor(client, args, stats, b, sample_fill, deadline, outbox))
+                 for b in bin_ids]
+        if outbox is not None:
+            sender = asyncio.create_task(batch_sender(client, args, stats, outbox, deadline))
+
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(min(5, max(deadline - time.perf_counter(), 0)))
+            stats.report("Progress")
+
+        for task in tasks:
+            task.cancel()
+        if outbox is not None:
+            sender.cancel()
+        # Let in-flight requests finish before the final report
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        await asyncio.gather(*pending, return_exceptions=True)
+        stats.report("Final")
+
+
+def main():
+    global BASE_URL, UPDATE_URL, BATCH_UPDATE_URL, INGEST_URL, GET_BINS_URL
+    args = parser.parse_args()
+    BASE_URL = args.url
+    UPDATE_URL = f'{BASE_URL}/api/update_bin'
+    BATCH_UPDATE_URL = f'{BASE_URL}/api/update_bins'
+    INGEST_URL = f'{BASE_URL}/api/ingest'
+    GET_BINS_URL = f'{BASE_URL}/api/get_all_bins'
+
+    try:
+        asyncio.run(run_load(args) if args.load else run_demo(args))
+    except KeyboardInterrupt:
+        print("\n🛑 Simulation Stopped.")
 
-        print("\n⏳ Cycle complete. Waiting for next sensor reading...\n")
-        time.sleep(15) # Wait 15 seconds before next batch
 
-except KeyboardInterrupt:
-    print("\n🛑 Simulation Stopped.")
+if __name__ == '__main__':
+    main()
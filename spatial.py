@@ -0,0 +1,224 @@
+import heapq
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_position(lat, lon):
+    """(lat, lon) as finite floats within range; raises ValueError with a message for the client"""
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise ValueError("lat and lon must be numbers")
+    if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat and lon must be within -90..90 and -180..180")
+    return lat, lon
+
+
+class BinGridIndex:
+    """Grid-bucket spatial index over bin locations.
+
+    Bins are bucketed into square cells of `cell_deg` degrees, so viewport and
+    nearest-bin queries only look at the cells around the query instead of every
+    bin. Locations never change after add_bin, so the index only needs a rebuild
+    when bins are added or deleted (invalidate); it is rebuilt lazily on next use.
+    """
+
+    def __init__(self, cell_deg=0.01):
+        self._lock = threading.Lock()
+        self._cells = None  # (row, col) -> [(lat, lon, bin_id)]
+        self._extent = None  # (min_row, max_row, min_col, max_col) of occupied cells
+        self._count = 0
+        self.cell_deg = cell_deg
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def invalidate(self):
+        with self._lock:
+            self._cells = None
+
+    def _ensure_built(self, bins_loader):
+        # Must be called with the lock held
+        if self._cells is not None:
+            return
+        cells = {}
+        count = 0
+        for b in bins_loader():
+            if b.get("lat") is None or b.get("lon") is None:
+                continue
+            cells.setdefault(self._cell(b["lat"], b["lon"]), []).append((b["lat"], b["lon"], b["bin_id"]))
+            count += 1
+        self._cells = cells
+        self._count = count
+        if cells:
+            rows = [r for r, _ in cells]
+            cols = [c for _, c in cells]
+            self._extent = (min(rows), max(rows), min(cols), max(cols))
+
+    def add(self, lat, lon, key):
+        """Indexes one more point under `key` without a rebuild; the dispatcher indexes its plan's stops this way"""
+        with self._lock:
+            self._ensure_built(list)
+            row, col = cell = self._cell(lat, lon)
+            self._cells.setdefault(cell, []).append((lat, lon, key))
+            self._count += 1
+            if self._extent is None:
+                self._extent = (row, row, col, col)
+            else:
+                min_row, max_row, min_col, max_col = self._extent
+                self._extent = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+
+    def within(self, south, west, north, east, bins_loader, limit=None):
+        """Ids of bins inside the bounding box, up to `limit`"""
+        with self._lock:
+            self._ensure_built(bins_loader)
+            row0, col0 = self._cell(south, west)
+            row1, col1 = self._cell(north, east)
+            if (row1 - row0 + 1) * (col1 - col0 + 1) > len(self._cells):
+                # Box spans more cells than are occupied: walk the occupied ones instead
+                buckets = self._cells.values()
+            else:
+                buckets = (self._cells.get((r, c), ()) for r in range(row0, row1 + 1)
+                           for c in range(col0, col1 + 1))
+            found = []
+            for bucket in buckets:
+                for lat, lon, bin_id in bucket:
+                    if south <= lat <= north and west <= lon <= east:
+                        found.append(bin_id)
+                        if limit is not None and len(found) >= limit:
+                            return found
+            return found
+
+    def nearest(self, lat, lon, k, bins_loader):
+        """(distance_km, bin_id) of the k bins closest to a point, nearest first.
+
+        Searches outward ring by ring and stops once no unvisited cell can
+        hold anything closer than the k-th best found so far.
+        """
+        with self._lock:
+            self._ensure_built(bins_loader)
+            if not self._cells or k <= 0:
+                return []
+            k = min(k, self._count)
+            row, col = self._cell(lat, lon)
+            min_row, max_row, min_col, max_col = self._extent
+            max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+            # Smallest width of one cell in km at this latitude (longitude shrinks towards the poles)
+            cell_km = self.cell_deg * KM_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + 1, 89))), 0.01)
+
+            best = []  # max-heap of (-distance, bin_id)
+
+            def consider(bucket):
+                for b_lat, b_lon, bin_id in bucket:
+                    d = haversine_km(lat, lon, b_lat, b_lon)
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, bin_id))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, bin_id))
+
+            visited = 0
+            for ring in range(max_ring + 1):
+                if len(best) == k and (ring - 1) * cell_km > -best[0][0]:
+                    break
+                visited += max(8 * ring, 1)
+                if visited > 2 * len(self._cells):
+                    # Far from every bin: a scan of the occupied cells is cheaper than more empty rings
+                    best.clear()
+                    for bucket in self._cells.values():
+                        consider(bucket)
+                    break
+                for r, c in self._ring_cells(row, col, ring):
+                    consider(self._cells.get((r, c), ()))
+            return sorted((-d, bin_id) for d, bin_id in best)
+
+    @staticmethod
+    def _ring_cells(row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+
+class PointGrid:
+    """A fixed list of (lat, lon) points on a grid sized to their spread, for routing's neighbour queries.
+
+    Points are addressed by index and can be removed as a route visits them.
+    Distances are equirectangular km: close to haversine over a city, and
+    without trigonometry per comparison.
+    """
+
+    def __init__(self, points, per_cell=2.0):
+        kx = KM_PER_DEGREE * math.cos(math.radians(sum(lat for lat, _ in points) / len(points)))
+        self._x = [lon * kx for _, lon in points]
+        self._y = [lat * KM_PER_DEGREE for lat, _ in points]
+        width = max(max(self._x) - min(self._x), 1e-3)
+        height = max(max(self._y) - min(self._y), 1e-3)
+        self.cell_km = math.sqrt(width * height * per_cell / len(points))
+        self._cells = {}  # (row, col) -> [(x, y, index)]
+        for i in range(len(points)):
+            self._cells.setdefault(self._cell(i), []).append((self._x[i], self._y[i], i))
+        rows = [r for r, _ in self._cells]
+        cols = [c for _, c in self._cells]
+        self._extent = (min(rows), max(rows), min(cols), max(cols))
+
+    def _cell(self, i):
+        return int(self._y[i] // self.cell_km), int(self._x[i] // self.cell_km)
+
+    def remove(self, i):
+        cell = self._cell(i)
+        bucket = [p for p in self._cells[cell] if p[2] != i]
+        if bucket:
+            self._cells[cell] = bucket
+        else:
+            del self._cells[cell]
+
+    def nearest(self, i, k):
+        """Indexes of the up to k remaining points closest to point i (itself excluded), nearest first"""
+        x, y = self._x[i], self._y[i]
+        row, col = self._cell(i)
+        min_row, max_row, min_col, max_col = self._extent
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        found = []
+        visited = 0
+        for ring in range(max_ring + 1):
+            if ring > 1 and len(found) > k:
+                # Anything in this ring or beyond is at least ring - 1 cells away
+                found = heapq.nsmallest(k + 1, found)
+                if found[-1][0] <= ((ring - 1) * self.cell_km) ** 2:
+                    break
+            visited += max(8 * ring, 1)
+            if visited > 2 * len(self._cells):
+                # Mostly empty rings ahead: scanning the occupied cells is cheaper
+                buckets = self._cells.values()
+                found = []
+            else:
+                buckets = (self._cells.get(cell, ()) for cell in BinGridIndex._ring_cells(row, col, ring))
+            for bucket in buckets:
+                found.extend(((px - x) ** 2 + (py - y) ** 2, j) for px, py, j in bucket)
+            if visited > 2 * len(self._cells):
+                break
+        return [j for _, j in heapq.nsmallest(k + 1, found) if j != i][:k]
+
+    def sweep(self, indexes):
+        """`indexes` in a row-by-row sweep of the grid that alternates direction, a cheap spatially coherent order"""
+        def key(i):
+            row, col = self._cell(i)
+            return row, col if row % 2 == 0 else -col, self._x[i] if row % 2 == 0 else -self._x[i]
+        return sorted(indexes, key=key)
+
+
+bin_index = BinGridIndex()
@@ -0,0 +1,66 @@
+"""Fixtures for the behaviour tests: one app over a temporary SQLite database for the session"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from migrations import init_db  # noqa: E402
+from models import db, WasteBin, Collector  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    tmp = tempfile.mkdtemp(prefix='prioribin-test-')
+    # Registered before create_app, so it runs after the collector flusher's final flush at exit
+    atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'test.db')}",
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'LIVE_SYNC_INTERVAL': None,
+        'HISTORY_RETENTION_INTERVAL': None,
+    })
+    with app.app_context():
+        init_db(os.path.join(tmp, 'schema.lock'))
+    return app
+
+
+@pytest.fixture
+def add_bin(app):
+    """add_bin(bin_id, **columns) stores a bin at a fixed location; ids must be unique across the session"""
+    def add(bin_id, **columns):
+        with app.app_context():
+            db.session.add(WasteBin(bin_id=bin_id, location_lat=10.0, location_lon=76.3, **columns))
+            db.session.commit()
+            db.session.remove()
+        return bin_id
+
+    return add
+
+
+@pytest.fixture
+def add_collector(app):
+    """add_collector(username, lat=None, lon=None) registers a collector with the password Pass@123!"""
+    def add(username, lat=None, lon=None):
+        with app.app_context():
+            collector = Collector(name=username.title(), username=username, lat=lat, lon=lon)
+            collector.set_password('Pass@123!')
+            db.session.add(collector)
+            db.session.commit()
+            db.session.remove()
+        return username
+
+    return add
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/admin_login', data={'username': 'admin', 'password': 'Admin@123!'})
+    return client
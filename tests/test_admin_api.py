@@ -0,0 +1,16 @@
+import pytest
+
+ADMIN_APIS = ['/api/collector/nobody/track', '/api/dispatch', '/api/priority', '/api/forecast',
+              '/api/analytics/zones', '/api/analytics/collectors', '/api/analytics/response_times', '/api/analytics/overflow']
+
+
+@pytest.mark.parametrize("path", ADMIN_APIS + ['/api/stream'])
+def test_dashboard_apis_need_a_login(app, path):
+    assert app.test_client().get(path).status_code == 401
+
+
+@pytest.mark.parametrize("path", ADMIN_APIS)
+def test_dashboard_apis_answer_an_admin(admin_client, path):
+    response = admin_client.get(path)
+    # The unknown collector's trail is a 404, past the session check
+    assert response.status_code == (404 if '/track' in path else 200)
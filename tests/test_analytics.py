@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from analytics import StatsBatch, zone_of
+from bin_updates import apply_reading
+from models import db, WasteBin, ZoneDailyStats, CollectorDailyStats
+
+# A zone and day of their own, so the counters only hold what these tests add
+LAT, LON = 45.005, 12.005
+T0 = datetime(2024, 5, 1, 8, 0)
+
+
+def record(bin_obj, now, level=None, collector=None):
+    """One request's worth of stats, as the ingestion and collection routes write them"""
+    stats = StatsBatch(now=now)
+    if collector:
+        stats.collection(bin_obj, collector)
+        level = 0
+    else:
+        stats.reading(bin_obj, level, 'Critical' if level >= 90 else 'Warning' if level >= 70 else 'Normal')
+    bin_obj.fill_level = level
+    stats.apply()
+    db.session.commit()
+
+
+def test_daily_counters_follow_a_known_sequence(app):
+    with app.app_context():
+        bin_obj = WasteBin(bin_id='AN-1', location_lat=LAT, location_lon=LON, fill_level=50, status='Normal')
+        db.session.add(bin_obj)
+        db.session.commit()
+
+        record(bin_obj, T0, 95)  # Turns Critical
+        record(bin_obj, T0 + timedelta(minutes=10), 100)  # Overflowing
+        record(bin_obj, T0 + timedelta(minutes=40), collector='Ann')
+        record(bin_obj, T0 + timedelta(hours=2), 30)
+
+        zone = ZoneDailyStats.query.filter_by(zone=zone_of(LAT, LON), day=T0.date()).one()
+        assert (zone.readings, zone.fill_gain, zone.critical_events) == (3, 80, 1)
+        assert (zone.collections, zone.responses, zone.response_seconds) == (1, 1, 2400)
+        assert (zone.overflows, zone.overflow_seconds) == (1, 1800)
+        collector = CollectorDailyStats.query.filter_by(collector_name='Ann', day=T0.date()).one()
+        assert (collector.collections, collector.responses, collector.response_seconds) == (1, 1, 2400)
+        assert bin_obj.critical_since is None and bin_obj.overflow_since is None
+        db.session.remove()
+
+
+def test_backdated_readings_open_episodes_when_they_were_taken(app):
+    with app.app_context():
+        bin_obj = WasteBin(bin_id='AN-2', location_lat=LAT, location_lon=LON, fill_level=50, status='Normal',
+                           last_updated=T0 - timedelta(hours=1))
+        stats = StatsBatch(now=T0)
+        taken = T0 - timedelta(minutes=5)
+        assert apply_reading(bin_obj, 100, stats, [], taken)
+        assert bin_obj.critical_since == taken
+        assert bin_obj.overflow_since == taken
+        db.session.remove()
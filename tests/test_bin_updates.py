@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bin_updates import ReadingFilter, calculate_status
+from live_state import LiveBinState
+from models import WasteBin
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def reading_bin(level, status=None, seconds_ago=60, deadband=None):
+    return WasteBin(bin_id='F', location_lat=0, location_lon=0, fill_level=level,
+                    status=status or calculate_status(level), deadband=deadband,
+                    last_updated=NOW - timedelta(seconds=seconds_ago))
+
+
+def keeps(reading_filter, bin_obj, level, seconds_later=0):
+    when = bin_obj.last_updated + timedelta(seconds=seconds_later)
+    return reading_filter.accept(bin_obj, level, reading_filter.status(bin_obj, level), when)
+
+
+@pytest.mark.parametrize("level, status", [(0, "Normal"), (69, "Normal"), (70, "Warning"), (89, "Warning"),
+                                           (90, "Critical"), (100, "Critical")])
+def test_calculate_status_thresholds(level, status):
+    assert calculate_status(level) == status
+
+
+def test_calculate_status_rises_immediately():
+    assert calculate_status(70, "Normal", hysteresis=3) == "Warning"
+    assert calculate_status(90, "Warning", hysteresis=3) == "Critical"
+    assert calculate_status(95, "Normal", hysteresis=3) == "Critical"
+
+
+def test_calculate_status_drops_only_past_the_hysteresis():
+    assert calculate_status(89, "Critical", hysteresis=3) == "Critical"
+    assert calculate_status(88, "Critical", hysteresis=3) == "Critical"
+    assert calculate_status(87, "Critical", hysteresis=3) == "Critical"
+    assert calculate_status(86, "Critical", hysteresis=3) == "Warning"
+    assert calculate_status(67, "Warning", hysteresis=3) == "Warning"
+    assert calculate_status(66, "Warning", hysteresis=3) == "Normal"
+    # Emptied: straight down past both thresholds
+    assert calculate_status(5, "Critical", hysteresis=3) == "Normal"
+
+
+def test_first_reading_is_kept():
+    bin_obj = WasteBin(bin_id='F', location_lat=0, location_lon=0, status="Normal")
+    assert ReadingFilter().accept(bin_obj, 10, "Normal", NOW)
+
+
+def test_deadband_drops_jitter():
+    reading_filter = ReadingFilter(deadband=2, min_interval=0, heartbeat=0)
+    bin_obj = reading_bin(50)
+    assert not keeps(reading_filter, bin_obj, 52)
+    assert not keeps(reading_filter, bin_obj, 48)
+    assert keeps(reading_filter, bin_obj, 53)
+
+
+def test_bin_deadband_overrides_the_default():
+    reading_filter = ReadingFilter(deadband=2, min_interval=0, heartbeat=0)
+    assert not keeps(reading_filter, reading_bin(50, deadband=5), 54)
+    assert keeps(reading_filter, reading_bin(50, deadband=0), 51)
+
+
+def test_min_interval_holds_back_fast_readings():
+    reading_filter = ReadingFilter(deadband=2, min_interval=30, heartbeat=0)
+    bin_obj = reading_bin(40)
+    assert not keeps(reading_filter, bin_obj, 50, seconds_later=10)
+    assert keeps(reading_filter, bin_obj, 50, seconds_later=30)
+
+
+def test_heartbeat_keeps_a_steady_sensor_alive():
+    reading_filter = ReadingFilter(deadband=2, min_interval=30, heartbeat=900)
+    bin_obj = reading_bin(40)
+    assert not keeps(reading_filter, bin_obj, 40, seconds_later=899)
+    assert keeps(reading_filter, bin_obj, 40, seconds_later=900)
+
+
+def test_status_changes_and_emptying_bypass_the_limits():
+    reading_filter = ReadingFilter(deadband=5, min_interval=300, heartbeat=0, empty_drop=20)
+    assert keeps(reading_filter, reading_bin(69), 70, seconds_later=1)
+    assert keeps(reading_filter, reading_bin(60), 35, seconds_later=1)
+    assert not keeps(reading_filter, reading_bin(60), 45, seconds_later=1)
+
+
+def test_hysteresis_suppresses_flapping_at_a_threshold():
+    reading_filter = ReadingFilter(deadband=0, hysteresis=3, min_interval=300, heartbeat=0)
+    critical = reading_bin(90, "Critical")
+    # 89 keeps the Critical status, so it is an ordinary reading held back by min_interval
+    assert reading_filter.status(critical, 89) == "Critical"
+    assert not keeps(reading_filter, critical, 89, seconds_later=1)
+    assert reading_filter.status(critical, 86) == "Warning"
+    assert keeps(reading_filter, critical, 86, seconds_later=1)
+
+
+def test_zero_disables_each_rule():
+    reading_filter = ReadingFilter(deadband=0, hysteresis=0, min_interval=0, heartbeat=0, empty_drop=0)
+    bin_obj = reading_bin(90, "Critical")
+    assert reading_filter.status(bin_obj, 89) == "Warning"
+    assert keeps(reading_filter, reading_bin(50), 51)
+
+
+def test_put_moves_the_version_before_the_store_is_loaded():
+    store = LiveBinState()
+    before = store.version
+    assert store.put({"bin_id": "X"}) is not None
+    assert store.version > before
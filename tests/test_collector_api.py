@@ -0,0 +1,34 @@
+from models import BinHistory
+
+
+def collections(app, bin_id):
+    with app.app_context():
+        return BinHistory.query.filter_by(bin_id=bin_id, event_type='Collection').count()
+
+
+def test_collect_bin_answers_with_the_remaining_tasks(app, add_bin, add_collector):
+    add_collector('tasker', lat=10.0, lon=76.3)
+    add_bin('TASK-1', fill_level=95, status='Critical')
+    body = app.test_client().post('/api/collect_bin/TASK-1',
+                                  json={"collector_name": "Tasker", "collector_username": "tasker",
+                                        "lat": 10.001, "lon": 76.301}).json
+    assert body["success"] is True
+    assert body["collector"] == "tasker"
+    assert body["route"] is not None
+    assert all(task["bin_id"] != 'TASK-1' for task in body["tasks"])
+    assert collections(app, 'TASK-1') == 1
+
+
+def test_collect_bin_rejects_a_bad_position_before_recording(app, add_bin, add_collector):
+    add_collector('fumbler', lat=10.0, lon=76.3)
+    add_bin('TASK-2', fill_level=95, status='Critical')
+    client = app.test_client()
+    for lat in ("ten", float('nan'), 91.0):
+        response = client.post('/api/collect_bin/TASK-2', json={"collector_username": "fumbler", "lat": lat, "lon": 76.3})
+        assert response.status_code == 400
+    assert collections(app, 'TASK-2') == 0
+
+    # Numeric strings are positions too
+    response = client.post('/api/collect_bin/TASK-2', json={"collector_username": "fumbler", "lat": "10.0", "lon": "76.3"})
+    assert response.status_code == 200
+    assert collections(app, 'TASK-2') == 1
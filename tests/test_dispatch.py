@@ -0,0 +1,67 @@
+import time
+from types import SimpleNamespace
+
+from dispatch import Dispatcher, _Plan
+from presence import presence
+
+# Well away from the collectors other tests register, so these bins' nearest trucks are this module's
+LAT, LON = 40.0, 10.0
+
+
+def urgent(bin_id, fill_level=95, lat=LAT, lon=LON):
+    return {"bin_id": bin_id, "lat": lat, "lon": lon, "fill_level": fill_level,
+            "status": 'Critical' if fill_level >= 90 else 'Warning'}
+
+
+def planned_ids(plan):
+    return [s["bin_id"] for r in plan["routes"] for s in r["stops"]] + [b["bin_id"] for b in plan["unassigned"]]
+
+
+def test_plan_respects_capacity_and_accounts_for_every_urgent_bin(app, add_collector):
+    add_collector('disp-a', lat=LAT, lon=LON)
+    add_collector('disp-b', lat=LAT + 0.01, lon=LON + 0.01)
+    bins = [urgent(f'D-{i}', 90 + i % 10, LAT + i * 0.001, LON) for i in range(60)]
+    bins.append(dict(urgent('D-normal', 20), status='Normal'))
+    dispatcher = Dispatcher(capacity=3.0, time_budget=0.5)
+    with app.app_context():
+        for username in ('disp-a', 'disp-b'):
+            presence.ping(username=username)  # Active, as after logging in
+        plan = dispatcher.plan(lambda: bins)
+        route = dispatcher.route_for('disp-a', lambda: bins)
+        assert dispatcher.route_for('nobody', lambda: bins) is None
+
+    ids = planned_ids(plan)
+    assert sorted(ids) == sorted(b["bin_id"] for b in bins if b["status"] != 'Normal')
+    assert all(r["load"] <= 3.0 for r in plan["routes"])
+    # Three full bins a truck at most, so most of the 60 wait
+    assert len(plan["unassigned"]) >= 60 - 3 * len(plan["routes"])
+    assert route["collector"] == 'disp-a' and route["stops"]
+
+
+def test_plan_within_a_zero_budget_still_accounts_for_every_bin(app, add_collector):
+    add_collector('disp-c', lat=LAT, lon=LON + 0.02)
+    bins = [urgent(f'Z-{i}', 75 + i % 25, LAT + (i % 40) * 0.002, LON + (i // 40) * 0.002) for i in range(1500)]
+    dispatcher = Dispatcher(capacity=20.0, time_budget=0.0)
+    with app.app_context():
+        presence.ping(username='disp-c')
+        started = time.perf_counter()
+        plan = dispatcher.plan(lambda: bins)
+        elapsed = time.perf_counter() - started
+    assert sorted(planned_ids(plan)) == sorted(b["bin_id"] for b in bins)
+    assert all(r["load"] <= 20.0 for r in plan["routes"])
+    assert elapsed < 2.0
+
+
+def test_past_the_assignment_budget_only_nearby_trucks_are_tried():
+    trucks = [SimpleNamespace(username='near', name='Near', lat=LAT, lon=LON)] + \
+             [SimpleNamespace(username=f'far{i}', name='Far', lat=LAT + 1 + i, lon=LON) for i in range(3)]
+    plan = _Plan(trucks, capacity=1.0)
+    for i in range(8):
+        assert plan.insert(urgent(f'N-{i}', 10, LAT + i * 0.0001, LON))
+    assert {s["bin_id"] for s in plan.routes['near']["stops"]} == {f'N-{i}' for i in range(8)}
+
+    # The near truck is full and its stops crowd out every other truck around the bin
+    heavy = urgent('N-heavy', 50)
+    assert not plan.insert(heavy, nearby_only=True)
+    assert plan.insert(heavy)
+    assert plan.routes['far0']["stops"] == [heavy]
@@ -0,0 +1,81 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+import forecast
+from models import WasteBin
+
+T0 = datetime(2026, 1, 1, 6, 0)
+
+
+def filling_bin(level=0):
+    return WasteBin(bin_id='FC', location_lat=0, location_lon=0, fill_level=level, last_updated=T0)
+
+
+def feed(bin_obj, readings):
+    """readings: (hours after T0, level) pairs, applied the way apply_reading does"""
+    for hours, level in readings:
+        forecast.observe(bin_obj, level, T0 + timedelta(hours=hours))
+        bin_obj.fill_level = level
+
+
+def test_steady_filling_gives_its_rate():
+    bin_obj = filling_bin()
+    feed(bin_obj, [(h, 5 * h) for h in range(1, 11)])
+    assert forecast.fill_rate(bin_obj) == pytest.approx(5.0)
+
+
+def test_recent_slopes_weigh_more():
+    bin_obj = filling_bin()
+    feed(bin_obj, [(6, 12), (12, 60)])  # 2 %/h, then 8 %/h, each over one time constant
+    alpha = 1 - math.exp(-1)
+    expected = ((1 - alpha) * alpha * 2 + alpha * 8) / ((1 - alpha) * alpha + alpha)
+    assert forecast.fill_rate(bin_obj) == pytest.approx(expected)
+    assert 5 < expected < 8
+
+
+def test_no_estimate_until_readings_span_long_enough():
+    bin_obj = filling_bin()
+    feed(bin_obj, [(0.1, 2)])
+    assert forecast.fill_rate(bin_obj) is None
+    assert forecast.predicted_at(bin_obj, forecast.FULL_LEVEL) is None
+
+
+def test_reset_after_a_collection_keeps_the_rate_and_moves_the_baseline():
+    bin_obj = filling_bin()
+    feed(bin_obj, [(h, 5 * h) for h in range(1, 11)])
+    collected = T0 + timedelta(hours=11)
+    forecast.reset(bin_obj, collected)
+    bin_obj.fill_level = 0
+    assert bin_obj.last_updated == collected
+    assert forecast.fill_rate(bin_obj) == pytest.approx(5.0)
+    assert forecast.predicted_at(bin_obj, forecast.FULL_LEVEL) == pytest.approx(collected + timedelta(hours=20),
+                                                                               abs=timedelta(seconds=1))
+
+    # The first reading after the collection fills from zero at the same rate
+    feed(bin_obj, [(12, 5)])
+    assert forecast.fill_rate(bin_obj) == pytest.approx(5.0)
+
+
+def test_an_emptied_reading_only_resets_the_baseline():
+    bin_obj = filling_bin()
+    feed(bin_obj, [(h, 5 * h) for h in range(1, 11)])
+    rate = bin_obj.fill_rate
+    feed(bin_obj, [(11, 10)])
+    assert bin_obj.fill_rate == rate
+    assert bin_obj.last_updated == T0 + timedelta(hours=11)
+
+
+def test_predicted_times():
+    bin_obj = filling_bin()
+    feed(bin_obj, [(h, 5 * h) for h in range(1, 11)])  # 50% at T0 + 10 h
+    assert forecast.predicted_at(bin_obj, forecast.CRITICAL_LEVEL) == pytest.approx(T0 + timedelta(hours=18),
+                                                                                   abs=timedelta(seconds=1))
+    assert forecast.predicted_at(bin_obj, forecast.FULL_LEVEL) == pytest.approx(T0 + timedelta(hours=20),
+                                                                               abs=timedelta(seconds=1))
+    assert forecast.predicted_at(bin_obj, 40) is None  # Already past it
+
+    idle = filling_bin(30)
+    feed(idle, [(h, 30) for h in range(1, 5)])
+    assert forecast.predicted_at(idle, forecast.FULL_LEVEL) is None
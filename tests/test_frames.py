@@ -0,0 +1,100 @@
+import struct
+
+import pytest
+
+import frames
+from frames import FrameError, decode, encode, is_newer
+from models import BinHistory, WasteBin
+
+
+def test_round_trip_of_several_frames():
+    body = encode('BIN-1', [(1, 600, 10), (2, 300, 20)], battery=80) + encode('BIN-22', [])
+    decoded = decode(body)
+    assert [(f.bin_id, f.battery, f.readings) for f in decoded] == [
+        ('BIN-1', 80, [(1, 600, 10), (2, 300, 20)]),
+        ('BIN-22', None, []),
+    ]
+
+
+def test_frame_size():
+    # The documented size: 8 readings with a 6-character bin id
+    assert len(encode('BIN-01', [(i, 0, 0) for i in range(8)])) == 52
+
+
+def test_encode_wraps_sequence_and_caps_age():
+    (frame,) = decode(encode('B', [(70000, 100000, 5)]))
+    assert frame.readings == [(70000 % frames.SEQ_MODULUS, 0xFFFF, 5)]
+
+
+@pytest.mark.parametrize("body, message", [
+    (b'PB', "Truncated frame header"),
+    (b'XX\x01\x00\x01A\x00', "Bad frame magic"),
+    (b'PB\x02\x00\x01A\x00', "Unsupported frame version 2"),
+    (b'PB\x01\x00\x00\x00', "Truncated or empty bin id"),
+    (b'PB\x01\x00\x05AB', "Truncated or empty bin id"),
+    (b'PB\x01\x00\x01\xff\x00', "Bin id is not ASCII"),
+    (b'PB\x01\x00\x01A\x02' + struct.pack('<HHB', 1, 0, 5), "Truncated readings"),
+])
+def test_malformed_bodies_are_rejected(body, message):
+    with pytest.raises(FrameError, match=message):
+        decode(body)
+
+
+def test_trailing_garbage_after_a_valid_frame_is_rejected():
+    with pytest.raises(FrameError):
+        decode(encode('BIN-1', [(1, 0, 5)]) + b'P')
+
+
+def test_is_newer_without_history():
+    assert is_newer(0, None, 256)
+    assert is_newer(12345, None, 256)
+
+
+def test_is_newer_rejects_recent_retransmissions():
+    assert is_newer(101, 100, 256)
+    assert not is_newer(100, 100, 256)
+    assert not is_newer(99, 100, 256)
+    assert not is_newer((100 - 255) % frames.SEQ_MODULUS, 100, 256)
+
+
+def test_is_newer_across_the_wrap():
+    assert is_newer(0, 65535, 256)
+    assert is_newer(5, 65530, 256)
+    assert not is_newer(65535, 3, 256)
+    assert not is_newer(65530, 65535, 256)
+
+
+def test_is_newer_accepts_a_restart_far_behind():
+    # A rebooted unit restarts at a random number; only the window behind the last one is old
+    assert is_newer((100 - 256) % frames.SEQ_MODULUS, 100, 256)
+    assert is_newer(40000, 100, 256)
+
+
+def test_ingest_skips_retransmitted_readings(app, add_bin):
+    add_bin('FRAME-1')
+    client = app.test_client()
+    body = encode('FRAME-1', [(65534, 600, 10), (65535, 300, 50), (0, 0, 95)], battery=70)
+
+    first = client.post('/api/ingest', data=body, content_type='application/octet-stream').json
+    again = client.post('/api/ingest', data=body, content_type='application/octet-stream').json
+    assert first["results"][0]["status"] == "Critical"
+    assert sum(first["results"][0][k] for k in ("applied", "filtered", "rejected")) == 3
+    assert again["results"][0]["applied"] + again["results"][0]["filtered"] == 0
+
+    with app.app_context():
+        bin_obj = WasteBin.query.filter_by(bin_id='FRAME-1').one()
+        assert (bin_obj.fill_level, bin_obj.battery_level, bin_obj.last_seq) == (95, 70, 0)
+        assert BinHistory.query.filter_by(bin_id='FRAME-1', event_type='Critical Alert').count() == 1
+
+
+def test_ingest_counts_out_of_range_levels(app, add_bin):
+    add_bin('FRAME-2')
+    body = encode('FRAME-2', [(1, 0, 200)])
+    result = app.test_client().post('/api/ingest', data=body, content_type='application/octet-stream').json
+    assert result["results"] == [{"bin_id": "FRAME-2", "applied": 0, "filtered": 0, "rejected": 1,
+                                  "status": "Normal"}]
+
+
+def test_ingest_rejects_a_malformed_body(app):
+    response = app.test_client().post('/api/ingest', data=b'XX', content_type='application/octet-stream')
+    assert response.status_code == 400
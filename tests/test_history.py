@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, BinHistory
+from retention import downsample
+
+START = datetime(2026, 1, 1)
+
+
+def series(levels):
+    return [(START + timedelta(minutes=i), level, level, float(level), 1, 0) for i, level in enumerate(levels)]
+
+
+def test_downsample_keeps_the_endpoints_and_the_count():
+    points = series([i % 50 for i in range(1000)])
+    kept = downsample(points, 100)
+    assert len(kept) == 100
+    assert kept[0] is points[0] and kept[-1] is points[-1]
+    assert [p[0] for p in kept] == sorted(p[0] for p in kept)
+
+
+def test_downsample_keeps_a_spike():
+    levels = [40] * 1000
+    levels[537] = 100
+    assert max(p[3] for p in downsample(series(levels), 20)) == 100
+
+
+@pytest.mark.parametrize("threshold", [0, 2, 10, 11])
+def test_downsample_passes_short_series_through(threshold):
+    points = series(range(10))
+    assert downsample(points, threshold) == points
+
+
+def add_events(app, bin_id, timestamps):
+    with app.app_context():
+        db.session.add_all(BinHistory(bin_id=bin_id, event_type="Update", description="Sensor", fill_level=50,
+                                      timestamp=t) for t in timestamps)
+        db.session.commit()
+        ids = [row.id for row in BinHistory.query.filter_by(bin_id=bin_id)]
+        db.session.remove()
+    return ids
+
+
+def pages(client, bin_id, limit, on_page=None):
+    seen, before = [], ''
+    while True:
+        body = client.get(f'/api/history/{bin_id}?limit={limit}&before={before}').json
+        seen.extend(e["id"] for e in body["events"])
+        if on_page:
+            on_page()
+        if not body["next_before"]:
+            return seen
+        before = body["next_before"]
+
+
+def test_cursor_pages_through_equal_timestamps_once(app, add_bin, admin_client):
+    add_bin('HIST-1')
+    # Bursts of events sharing a timestamp straddle page boundaries
+    ids = add_events(app, 'HIST-1', [START + timedelta(minutes=i // 7) for i in range(120)])
+    with app.app_context():
+        expected = [row.id for row in BinHistory.query.filter_by(bin_id='HIST-1')
+                    .order_by(BinHistory.timestamp.desc(), BinHistory.id.desc())]
+    seen = pages(admin_client, 'HIST-1', 25)
+    assert seen == expected and sorted(seen) == sorted(ids)
+
+
+def test_cursor_is_stable_while_new_events_arrive(app, add_bin, admin_client):
+    add_bin('HIST-2')
+    ids = add_events(app, 'HIST-2', [START + timedelta(minutes=i) for i in range(60)])
+    newer = iter(range(10))
+    seen = pages(admin_client, 'HIST-2', 20,
+                 on_page=lambda: add_events(app, 'HIST-2', [START + timedelta(days=1, minutes=next(newer))]))
+    # Events written meanwhile are newer than the first page, so no later page shifts or repeats
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_bad_cursor_is_rejected(admin_client):
+    assert admin_client.get('/api/history/HIST-1?before=yesterday').status_code == 400
+
+
+def test_series_is_capped_without_and_beyond_points(app, add_bin, admin_client):
+    add_bin('HIST-3')
+    add_events(app, 'HIST-3', [START + timedelta(seconds=i) for i in range(2500)])
+    url = f'/api/history/HIST-3/series?from={START.isoformat()}&to={(START + timedelta(hours=1)).isoformat()}' \
+          '&resolution=raw'
+    cap = app.config['SERIES_MAX_POINTS']
+    assert len(admin_client.get(url).json["points"]) == cap
+    assert len(admin_client.get(url + '&points=100000').json["points"]) == cap
+    assert len(admin_client.get(url + '&points=50').json["points"]) == 50
+
+
+def test_series_accepts_utc_times_with_a_z_suffix(app, add_bin, admin_client):
+    add_bin('HIST-4')
+    add_events(app, 'HIST-4', [START + timedelta(minutes=i) for i in range(10)])
+    body = admin_client.get('/api/history/HIST-4/series?from=2026-01-01T00:00:00.000Z'
+                            '&to=2026-01-01T01:00:00.000Z&resolution=raw').json
+    assert body["from"] == START.isoformat()
+    assert len(body["points"]) == 10
@@ -0,0 +1,70 @@
+from live_state import LiveBinState, parse_version_token, version_token
+
+
+def test_version_tokens_round_trip_only_within_this_process():
+    assert parse_version_token(version_token(42)) == 42
+    assert parse_version_token('0-42') is None  # Issued before a restart
+    assert parse_version_token('garbage') is None
+    assert parse_version_token(None) is None
+
+
+def test_changes_since_returns_changed_and_removed_bins(app):
+    store = LiveBinState()
+    with app.app_context():
+        token, _ = store.snapshot()
+        store.put({"bin_id": 'LS-1', "fill_level": 10}, {"bin_id": 'LS-2', "fill_level": 20})
+        after_put = store.changes_since(token)
+        assert not after_put["full"]
+        assert sorted(b["bin_id"] for b in after_put["bins"]) == ['LS-1', 'LS-2'] and after_put["removed"] == []
+
+        store.put({"bin_id": 'LS-1', "fill_level": 30})
+        store.remove('LS-2')
+        delta = store.changes_since(after_put["version"])
+        assert delta["bins"] == [{"bin_id": 'LS-1', "fill_level": 30}]
+        assert delta["removed"] == ['LS-2']
+
+        assert store.changes_since(delta["version"]) == {"version": delta["version"], "full": False,
+                                                         "bins": [], "removed": []}
+
+
+def test_unknown_and_stale_tokens_get_a_full_resync(app):
+    store = LiveBinState()
+    with app.app_context():
+        early = store.put({"bin_id": 'LS-3'})  # Before the store is loaded
+        token, _ = store.snapshot()
+        for stale in (early, 'garbage', version_token(10 ** 9)):
+            delta = store.changes_since(stale)
+            assert delta["full"] and delta["version"] == token
+            assert len(delta["bins"]) == store.count()
+
+
+def test_polling_answers_304_until_a_bin_changes(app, add_bin):
+    add_bin('LS-4', fill_level=10)
+    client = app.test_client()
+    first = client.get('/api/get_all_bins')
+    etag = first.headers['ETag']
+    assert client.get('/api/get_all_bins', headers={'If-None-Match': etag}).status_code == 304
+
+    client.post('/api/update_bin', json={"bin_id": 'LS-4', "fill_level": 95})
+    changed = client.get('/api/get_all_bins', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert any(b["bin_id"] == 'LS-4' and b["fill_level"] == 95 for b in changed.json)
+
+
+def test_since_polling_reports_updates_and_deletions(app, admin_client):
+    # Through the admin route, so the live store hears of the new bins
+    for bin_id in ('LS-5', 'LS-6'):
+        admin_client.post('/add_bin', data={"bin_id": bin_id, "lat": '10.0', "lon": '76.3'})
+    client = app.test_client()
+    version = client.get('/api/get_all_bins?since=').json["version"]
+
+    client.post('/api/update_bin', json={"bin_id": 'LS-5', "fill_level": 95})
+    admin_client.post('/delete_bin/LS-6')
+    delta = client.get(f'/api/get_all_bins?since={version}').json
+    assert not delta["full"]
+    assert [b["bin_id"] for b in delta["bins"]] == ['LS-5']
+    assert delta["removed"] == ['LS-6']
+
+    unchanged = client.get(f'/api/get_all_bins?since={delta["version"]}',
+                           headers={'If-None-Match': f'"{delta["version"]}"'})
+    assert unchanged.status_code == 304
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from migrations import init_db
+from models import db, WasteBin, BinHistory
+
+# The two tables as the first release created them
+OLD_SCHEMA = """
+CREATE TABLE waste_bin (id INTEGER PRIMARY KEY, bin_id VARCHAR(50) NOT NULL UNIQUE, location_lat FLOAT NOT NULL,
+                        location_lon FLOAT NOT NULL, fill_level INTEGER, status VARCHAR(20), last_updated DATETIME);
+CREATE TABLE bin_history (id INTEGER PRIMARY KEY, bin_id VARCHAR(50) NOT NULL, event_type VARCHAR(50) NOT NULL,
+                          description VARCHAR(200), collector_name VARCHAR(50), timestamp DATETIME);
+INSERT INTO waste_bin VALUES (1, 'OLD-1', 10.0, 76.3, 100, 'Critical', '2025-01-01 12:00:00.000000');
+INSERT INTO waste_bin VALUES (2, 'OLD-2', 10.0, 76.3, 20, 'Normal', '2025-01-01 12:00:00.000000');
+INSERT INTO bin_history (bin_id, event_type, description, timestamp) VALUES
+    ('OLD-1', 'System', 'Bin initialized', '2025-01-01 08:00:00.000000'),
+    ('OLD-1', 'Update', 'Sensor: 45%', '2025-01-01 09:00:00.000000'),
+    ('OLD-1', 'Collection', 'Cleaned by collector', '2025-01-01 10:00:00.000000'),
+    ('OLD-1', 'Critical Alert', 'Sensor: 93%', '2025-01-01 11:00:00.000000'),
+    ('OLD-1', 'Critical Alert', 'Bin full', '2025-01-01 11:30:00.000000');
+"""
+
+
+@pytest.fixture
+def old_app(tmp_path):
+    path = tmp_path / 'old.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(OLD_SCHEMA)
+    # A bare app on the old database; the session app keeps its own engine
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}")
+    db.init_app(app)
+    with app.app_context():
+        init_db(os.path.join(tmp_path, 'schema.lock'))
+        yield app
+        db.session.remove()
+
+
+def test_upgrade_backfills_history_levels(old_app):
+    levels = [(h.event_type, h.fill_level) for h in BinHistory.query.filter_by(bin_id='OLD-1').order_by(BinHistory.id)]
+    # Parsed from the description; an alert without one means full; system events have no level
+    assert levels == [('System', None), ('Update', 45), ('Collection', 0), ('Critical Alert', 93),
+                      ('Critical Alert', 100)]
+
+
+def test_upgrade_backfills_bin_columns(old_app):
+    full = WasteBin.query.filter_by(bin_id='OLD-1').one()
+    assert full.critical_since == datetime(2025, 1, 1, 11, 30)  # The latest alert
+    assert full.overflow_since == datetime(2025, 1, 1, 11, 30)  # At 100 since then
+    assert full.last_collected == datetime(2025, 1, 1, 10, 0)
+    assert full.last_updated is None  # The forecast starts from the next reading
+    assert full.changed_at is not None
+
+    normal = WasteBin.query.filter_by(bin_id='OLD-2').one()
+    assert (normal.critical_since, normal.overflow_since, normal.last_collected) == (None, None, None)
+    assert normal.deadband is None and normal.last_seq is None
+
+
+def test_upgrade_is_idempotent(old_app):
+    init_db(os.path.join(old_app.instance_path, 'schema.lock'))
+    assert BinHistory.query.filter_by(bin_id='OLD-1', fill_level=45).count() == 1
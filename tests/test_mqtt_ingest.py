@@ -0,0 +1,96 @@
+import json
+
+from models import WasteBin
+from mqtt_ingest import IngestWorker, LocalBroker, parse_message, topic_matches
+
+
+def test_topic_matches_wildcards():
+    assert topic_matches('bins/+/level', 'bins/BIN-1/level')
+    assert not topic_matches('bins/+/level', 'bins/BIN-1/battery')
+    assert not topic_matches('bins/+/level', 'bins/BIN-1/level/extra')
+    assert topic_matches('bins/#', 'bins/BIN-1/level')
+    assert topic_matches('#', 'anything/at/all')
+
+
+def test_parse_message_accepts_numbers_and_objects():
+    assert parse_message('bins/BIN-1/level', b'42') == ('BIN-1', 42)
+    assert parse_message('bins/BIN-1/level', b'42.7') == ('BIN-1', 42)
+    assert parse_message('bins/BIN-1/level', json.dumps({"fill_level": 55}).encode()) == ('BIN-1', 55)
+
+
+def test_parse_message_rejects_malformed():
+    assert parse_message('bins/BIN-1/level', b'full') is None
+    assert parse_message('bins/BIN-1/level', b'true') is None
+    assert parse_message('bins/BIN-1/level', b'{"level": 5}') is None
+    assert parse_message('bins//level', b'5') is None
+    assert parse_message('sensors/BIN-1/level', b'5') is None
+
+
+def test_parse_message_rejects_non_finite_and_out_of_range_levels():
+    for payload in (b'NaN', b'Infinity', b'-Infinity', b'{"fill_level": NaN}', b'101', b'-1', b'1e400', b'1' + b'0' * 400):
+        assert parse_message('bins/BIN-1/level', payload) is None
+    assert parse_message('bins/BIN-1/level', b'100') == ('BIN-1', 100)
+    assert parse_message('bins/BIN-1/level', b'0') == ('BIN-1', 0)
+
+
+def test_local_broker_delivers_to_matching_subscribers():
+    broker = LocalBroker()
+    received = []
+    broker.subscribe('bins/+/level', lambda topic, payload: received.append((topic, payload)))
+    broker.subscribe('alerts/#', lambda topic, payload: received.append(('alerts', payload)))
+    broker.publish('bins/BIN-1/level', '40')
+    broker.publish('other/topic', '1')
+    assert received == [('bins/BIN-1/level', b'40')]
+
+    broker.close()
+    broker.publish('bins/BIN-1/level', '41')
+    assert len(received) == 1
+
+
+def test_ingest_worker_applies_a_batch(app, add_bin):
+    add_bin('MQTT-1')
+    add_bin('MQTT-2')
+    broker = LocalBroker()
+    worker = IngestWorker(app, broker, batch_size=10, linger=0.01)
+    broker.subscribe(worker.topic, worker._on_message)
+
+    broker.publish('bins/MQTT-1/level', '95')
+    broker.publish('bins/MQTT-2/level', '{"fill_level": 75}')
+    broker.publish('bins/NOPE/level', '10')
+    broker.publish('bins/MQTT-1/level', 'garbage')
+    assert worker.run_once(timeout=1) == 3
+
+    assert worker.stats["applied"] == 2
+    assert worker.stats["unknown_bin"] == 1
+    assert worker.stats["malformed"] == 1
+    assert worker.stats["batches"] == 1
+    with app.app_context():
+        levels = {b.bin_id: (b.fill_level, b.status) for b in WasteBin.query.filter(WasteBin.bin_id.like('MQTT-%'))}
+    assert levels == {'MQTT-1': (95, 'Critical'), 'MQTT-2': (75, 'Warning')}
+
+
+def test_ingest_worker_counts_filtered_readings(app, add_bin):
+    add_bin('MQTT-3')
+    broker = LocalBroker()
+    worker = IngestWorker(app, broker, batch_size=10, linger=0.01)
+    broker.subscribe(worker.topic, worker._on_message)
+
+    # A status change is always kept; one point of jitter right after it is not
+    broker.publish('bins/MQTT-3/level', '80')
+    worker.run_once(timeout=1)
+    broker.publish('bins/MQTT-3/level', '81')
+    worker.run_once(timeout=1)
+    assert (worker.stats["applied"], worker.stats["filtered"]) == (1, 1)
+
+
+def test_ingest_worker_start_and_stop_drain_the_queue(app, add_bin):
+    add_bin('MQTT-4')
+    broker = LocalBroker()
+    worker = IngestWorker(app, broker, batch_size=10, linger=0.01)
+    worker.start()
+    broker.publish('bins/MQTT-4/level', '92')
+    worker.stop()
+
+    assert worker.stats["applied"] == 1
+    with app.app_context():
+        assert WasteBin.query.filter_by(bin_id='MQTT-4').one().status == 'Critical'
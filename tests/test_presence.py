@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from models import db, Collector
+from presence import CollectorPresence
+
+
+def stored(app, username):
+    with app.app_context():
+        c = Collector.query.filter_by(username=username).one()
+        db.session.remove()
+        return c.lat, c.lon, c.last_active
+
+
+def test_ping_for_an_unknown_collector_returns_none(app):
+    store = CollectorPresence()
+    with app.app_context():
+        assert store.ping(username='nobody-here', lat=10.0, lon=76.0) is None
+        assert store.ping(name='Nobody Here') is None
+
+
+def test_flush_writes_the_latest_position_only(app, add_collector):
+    add_collector('walker', lat=10.0, lon=76.0)
+    store = CollectorPresence()
+    with app.app_context():
+        for step in range(5):
+            record = store.ping(username='walker', lat=10.0 + step * 0.001, lon=76.0)
+        assert record.lat == 10.004
+        # Pings only touch memory until the flush
+        assert stored(app, 'walker')[:2] == (10.0, 76.0)
+        store.flush()
+    lat, lon, last_active = stored(app, 'walker')
+    assert (lat, lon) == (10.004, 76.0)
+    assert last_active == record.last_active
+
+
+def test_heartbeat_without_a_position_keeps_the_last_one(app, add_collector):
+    add_collector('sitter', lat=10.0, lon=76.0)
+    store = CollectorPresence()
+    with app.app_context():
+        before = store.get('sitter').last_active
+        record = store.ping(username='sitter')
+        store.flush()
+    assert (record.lat, record.lon) == (10.0, 76.0)
+    assert record.last_active > before
+    assert stored(app, 'sitter')[:2] == (10.0, 76.0)
+
+
+def test_flush_picks_up_positions_other_workers_wrote(app, add_collector):
+    add_collector('roamer', lat=10.0, lon=76.0)
+    store = CollectorPresence()
+    with app.app_context():
+        store.ping(username='roamer')
+        store.flush()
+        # Another process flushes a newer position
+        c = Collector.query.filter_by(username='roamer').one()
+        c.lat, c.lon, c.last_active = 11.0, 77.0, datetime.utcnow() + timedelta(seconds=5)
+        db.session.commit()
+        store.flush()
+        record = store.get('roamer')
+    assert (record.lat, record.lon) == (11.0, 77.0)
+    assert 'roamer' in [r.username for r in store.all()]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from presence import presence
+from priority import PriorityEngine, WEIGHTS
+
+# Far from every other test's collectors, so proximity only comes from this module's
+LAT, LON = -30.0, 150.0
+
+
+def fleet(now):
+    def state(bin_id, fill_level, full_in=None, collected_ago=None, lat=LAT):
+        return {"bin_id": bin_id, "lat": lat, "lon": LON, "fill_level": fill_level, "status": 'Normal',
+                "predicted_full_at": (now + full_in).isoformat() if full_in else None,
+                "last_collected": (now - collected_ago).isoformat() if collected_ago else None}
+
+    return [
+        state('P-low', 10, collected_ago=timedelta(hours=1)),
+        state('P-soon', 80, full_in=timedelta(hours=24), collected_ago=timedelta(hours=168)),
+        state('P-full', 100),
+    ]
+
+
+def test_ranking_and_scores_on_a_fixed_fleet():
+    engine = PriorityEngine(weights=dict(WEIGHTS, proximity=0.0))
+    engine._nearest_collector_km = lambda: None  # Proximity is covered below
+    result = engine.queue(lambda: fleet(datetime.utcnow()))
+
+    assert [b["bin_id"] for b in result["bins"]] == ['P-full', 'P-soon', 'P-low']
+    assert [b["rank"] for b in result["bins"]] == [1, 2, 3]
+    full, soon, low = result["bins"]
+    # Full without a prediction: overflow ramps to 1; never collected counts as half a week
+    assert full["components"] == {"fill": 1.0, "overflow": 1.0, "age": 0.5, "proximity": 0.0}
+    assert full["score"] == pytest.approx(0.4 + 0.3 + 0.15 * 0.5, abs=1e-3)
+    # A day to full is exp(-1) overflow urgency; a week since the last collection maxes out age
+    assert soon["components"]["overflow"] == pytest.approx(0.3679, abs=1e-3)
+    assert soon["score"] == pytest.approx(0.4 * 0.8 + 0.3 * 0.3679 + 0.15, abs=1e-3)
+    assert low["score"] == pytest.approx(0.4 * 0.1 + 0.15 / 168, abs=1e-3)
+    assert result["total"] == 3
+
+
+def test_paging_and_patched_bins():
+    engine = PriorityEngine(weights=dict(WEIGHTS, proximity=0.0))
+    engine._nearest_collector_km = lambda: None
+    now = datetime.utcnow()
+    loader = lambda: fleet(now)  # noqa: E731
+    assert [b["bin_id"] for b in engine.queue(loader, offset=1, limit=1)["bins"]] == ['P-soon']
+
+    # P-low overflows: behind P-full only on age, as it was collected an hour ago
+    engine.bins_changed([dict(fleet(now)[0], fill_level=100)])
+    assert [b["bin_id"] for b in engine.ranked(loader)] == ['P-full', 'P-low', 'P-soon']
+
+
+def test_nearby_collectors_raise_proximity(app, add_collector):
+    add_collector('prio', lat=LAT, lon=LON)
+    engine = PriorityEngine(weights={"fill": 0.0, "overflow": 0.0, "age": 0.0, "proximity": 1.0})
+    now = datetime.utcnow()
+    bins = [dict(fleet(now)[0], bin_id='P-far', lat=LAT + 0.018), dict(fleet(now)[0], bin_id='P-here')]
+    with app.app_context():
+        presence.ping(username='prio', lat=LAT, lon=LON)
+        result = engine.queue(lambda: bins)
+    here, far = result["bins"]
+    assert here["bin_id"] == 'P-here' and here["score"] == pytest.approx(1.0, abs=1e-3)
+    # About 2 km away halves the term
+    assert far["score"] == pytest.approx(0.5, abs=0.01)
+
+
+def test_priority_api_ranks_for_an_admin(admin_client):
+    body = admin_client.get('/api/priority?limit=5').json
+    scores = [b["score"] for b in body["bins"]]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, BinHistory, BinHistoryHourly, BinHistoryDaily
+from retention import fill_series, rollup_raw, run_retention, start_scheduler
+
+# Long before anything the other tests write, so each rollup here only sees these events
+DAY = datetime(2024, 3, 1)
+
+
+def add_events(app, bin_id, events):
+    """events: (timestamp, fill_level, event_type) triples"""
+    with app.app_context():
+        db.session.add_all(BinHistory(bin_id=bin_id, event_type=event_type, description="Test", fill_level=level,
+                                      timestamp=when) for when, level, event_type in events)
+        db.session.commit()
+        db.session.remove()
+
+
+def rollups(app, model, bin_id):
+    with app.app_context():
+        rows = [(r.bucket, r.min_level, r.max_level, round(r.avg_level, 2), r.samples, r.collections)
+                for r in model.query.filter_by(bin_id=bin_id).order_by(model.bucket)]
+        db.session.remove()
+    return rows
+
+
+def raw_count(app, bin_id):
+    with app.app_context():
+        return BinHistory.query.filter_by(bin_id=bin_id).count()
+
+
+@pytest.fixture(scope='module')
+def rolled_up(app):
+    # Once for the module; the second test adds to what the first checked
+    add_events(app, 'RET-1', [
+        (DAY + timedelta(hours=10, minutes=5), 40, 'Update'),
+        (DAY + timedelta(hours=10, minutes=20), 60, 'Update'),
+        (DAY + timedelta(hours=10, minutes=40), 0, 'Collection'),
+        (DAY + timedelta(hours=10, minutes=50), None, 'System'),  # No level: expires without a sample
+        (DAY + timedelta(hours=11, minutes=10), 30, 'Update'),
+    ])
+    with app.app_context():
+        removed = rollup_raw(DAY + timedelta(days=1))
+        db.session.remove()
+    return removed
+
+
+def test_rollup_aggregates_each_hour_and_day(app, rolled_up):
+    assert rolled_up == 5
+    assert raw_count(app, 'RET-1') == 0
+    assert rollups(app, BinHistoryHourly, 'RET-1') == [
+        (DAY + timedelta(hours=10), 0, 60, 33.33, 3, 1),
+        (DAY + timedelta(hours=11), 30, 30, 30.0, 1, 0),
+    ]
+    assert rollups(app, BinHistoryDaily, 'RET-1') == [(DAY, 0, 60, 32.5, 4, 1)]
+
+
+def test_rollup_reruns_are_idempotent_and_merge_late_events(app, rolled_up):
+    hourly = rollups(app, BinHistoryHourly, 'RET-1')
+    with app.app_context():
+        assert rollup_raw(DAY + timedelta(days=1)) == 0
+    assert rollups(app, BinHistoryHourly, 'RET-1') == hourly
+
+    # A late event for an hour already rolled up is folded into the existing rows
+    add_events(app, 'RET-1', [(DAY + timedelta(hours=11, minutes=30), 90, 'Update')])
+    with app.app_context():
+        assert rollup_raw(DAY + timedelta(days=1)) == 1
+    assert rollups(app, BinHistoryHourly, 'RET-1')[1] == (DAY + timedelta(hours=11), 30, 90, 60.0, 2, 0)
+    assert rollups(app, BinHistoryDaily, 'RET-1') == [(DAY, 0, 90, 44.0, 5, 1)]
+
+
+def test_retention_cutoffs(app):
+    now = DAY + timedelta(days=400)
+    kept = now - timedelta(days=29)
+    rolled = now - timedelta(days=31)
+    pruned = now - timedelta(days=366)
+    add_events(app, 'RET-2', [(kept, 50, 'Update'), (rolled, 70, 'Update'), (pruned, 20, 'Update')])
+    with app.app_context():
+        stats = run_retention(raw_days=30, hourly_days=365, now=now)
+        db.session.remove()
+    assert stats["raw_rolled_up"] >= 2
+    assert raw_count(app, 'RET-2') == 1
+    # The hourly row of the old event is dropped, its daily row stays
+    assert [row[0] for row in rollups(app, BinHistoryHourly, 'RET-2')] == [rolled.replace(minute=0)]
+    assert [row[0] for row in rollups(app, BinHistoryDaily, 'RET-2')] == [pruned.replace(hour=0), rolled.replace(hour=0)]
+
+    with app.app_context():
+        series = fill_series('RET-2', pruned - timedelta(days=1), now, 'raw')
+        db.session.remove()
+    # Pruned days come from the daily rollup, then hourly rollups, then raw events
+    assert [(t, avg) for t, _, _, avg, _, _ in series] == [(pruned.replace(hour=0), 20.0),
+                                                           (rolled.replace(minute=0), 70.0), (kept, 50)]
+
+
+def test_scheduler_starts_once_per_process(app):
+    assert start_scheduler(app, 3600) is start_scheduler(app, 3600)
@@ -0,0 +1,62 @@
+import random
+import time
+from itertools import permutations
+
+import pytest
+
+from routing import URGENCY_FACTOR, plan_route, stop_weight
+from spatial import haversine_km
+
+START = (10.0, 76.3)
+
+
+def random_bins(n, seed):
+    rng = random.Random(seed)
+    bins = []
+    for i in range(n):
+        level = rng.randint(50, 100)
+        bins.append({"bin_id": f'R-{i}', "lat": 10.0 + rng.random() * 0.1, "lon": 76.3 + rng.random() * 0.1,
+                     "fill_level": level, "status": 'Critical' if level >= 90 else 'Warning' if level >= 70 else 'Normal'})
+    return bins
+
+
+def cost(stops):
+    """plan_route's objective: path length plus the urgency-weighted mean distance to each bin"""
+    travelled = weighted = 0.0
+    prev = START
+    for b in stops:
+        travelled += haversine_km(*prev, b["lat"], b["lon"])
+        weighted += stop_weight(b) * travelled
+        prev = (b["lat"], b["lon"])
+    return travelled + URGENCY_FACTOR * weighted / (sum(stop_weight(b) for b in stops) or 1.0)
+
+
+@pytest.mark.parametrize("n", [1, 2, 30, 400])
+def test_route_visits_every_stop_once(n):
+    bins = random_bins(n, n)
+    plan = plan_route(START, bins, 0.5)
+    assert sorted(s["bin_id"] for s in plan["stops"]) == sorted(b["bin_id"] for b in bins)
+    assert plan["distance_km"] == pytest.approx(plan["stops"][-1]["arrival_km"], abs=1e-3)
+
+
+def test_stops_without_a_position_are_left_out():
+    bins = random_bins(3, 1) + [{"bin_id": 'R-x', "lat": None, "lon": None, "fill_level": 95, "status": 'Critical'}]
+    assert sorted(s["bin_id"] for s in plan_route(START, bins)["stops"]) == ['R-0', 'R-1', 'R-2']
+    assert plan_route(START, [])["stops"] == []
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_small_routes_are_optimal(seed):
+    bins = random_bins(7, seed)
+    best = min(cost(order) for order in permutations(bins))
+    assert cost(plan_route(START, bins, 0.5)["stops"]) == pytest.approx(best, rel=1e-6)
+
+
+def test_large_routes_hold_the_time_budget():
+    bins = random_bins(5000, 7)
+    started = time.perf_counter()
+    plan = plan_route(START, bins, 0.5)
+    elapsed = time.perf_counter() - started
+    assert len(plan["stops"]) == 5000
+    # Setup counts against the budget; allow for building the response
+    assert elapsed < 0.8
@@ -0,0 +1,32 @@
+from models import WasteBin
+
+
+def level_of(app, bin_id):
+    with app.app_context():
+        return WasteBin.query.filter_by(bin_id=bin_id).one().fill_level
+
+
+def test_update_bins_reports_bad_entries_and_applies_the_rest(app, add_bin):
+    add_bin('SENS-1', fill_level=10)
+    results = app.test_client().post('/api/update_bins', json={"readings": [
+        {"bin_id": ["SENS-1"], "fill_level": 3},
+        {"bin_id": "SENS-1", "fill_level": -50},
+        {"bin_id": "SENS-1", "fill_level": 500},
+        {"bin_id": "SENS-1", "fill_level": "lots"},
+        {"bin_id": "SENS-1", "fill_level": 95},  # Crosses a threshold, so the ingestion filter keeps it
+    ]}).json["results"]
+    assert [r.get("error") for r in results] == [
+        "Invalid bin_id", "fill_level must be within 0..100", "fill_level must be within 0..100",
+        "Invalid fill_level", None]
+    assert results[0]["bin_id"] is None
+    assert level_of(app, 'SENS-1') == 95
+
+
+def test_update_bin_rejects_out_of_range_levels(app, add_bin):
+    add_bin('SENS-2', fill_level=10)
+    client = app.test_client()
+    for body in ({"bin_id": "SENS-2", "fill_level": 101}, {"bin_id": "SENS-2", "fill_level": -1},
+                 {"bin_id": 7, "fill_level": 50}, {"fill_level": 50}, [1, 2]):
+        assert client.post('/api/update_bin', json=body).status_code == 400
+    assert level_of(app, 'SENS-2') == 10
+    assert client.post('/api/update_bin', json={"bin_id": "SENS-2", "fill_level": 100}).json == {"status": "Critical"}
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from spatial import BinGridIndex, haversine_km, parse_position
+
+
+def grid_bins(n=400, seed=3):
+    rng = random.Random(seed)
+    return [{"bin_id": f'G-{i}', "lat": 10.0 + rng.random() * 0.2, "lon": 76.2 + rng.random() * 0.2}
+            for i in range(n)]
+
+
+def test_within_includes_the_box_edges():
+    bins = [{"bin_id": 'edge-sw', "lat": 10.0, "lon": 76.0}, {"bin_id": 'edge-ne', "lat": 10.05, "lon": 76.05},
+            {"bin_id": 'inside', "lat": 10.02, "lon": 76.03}, {"bin_id": 'outside', "lat": 10.0501, "lon": 76.0}]
+    index = BinGridIndex()
+    assert sorted(index.within(10.0, 76.0, 10.05, 76.05, lambda: bins)) == ['edge-ne', 'edge-sw', 'inside']
+
+
+@pytest.mark.parametrize("box", [(10.05, 76.25, 10.1, 76.3), (0.0, 0.0, 50.0, 100.0)])
+def test_within_matches_a_scan(box):
+    # The second box spans more cells than are occupied, which walks the occupied cells instead
+    bins = grid_bins()
+    south, west, north, east = box
+    expected = {b["bin_id"] for b in bins if south <= b["lat"] <= north and west <= b["lon"] <= east}
+    assert set(BinGridIndex().within(south, west, north, east, lambda: bins)) == expected
+    assert len(BinGridIndex().within(south, west, north, east, lambda: bins, limit=5)) == min(5, len(expected))
+
+
+def test_nearest_is_ordered_and_matches_a_scan():
+    bins = grid_bins()
+    found = BinGridIndex().nearest(10.1, 76.3, 10, lambda: bins)
+    expected = sorted((haversine_km(10.1, 76.3, b["lat"], b["lon"]), b["bin_id"]) for b in bins)[:10]
+    assert [bin_id for _, bin_id in found] == [bin_id for _, bin_id in expected]
+    assert [d for d, _ in found] == sorted(d for d, _ in found)
+
+
+def test_nearest_from_far_away_and_on_an_empty_index():
+    bins = grid_bins(20)
+    assert len(BinGridIndex().nearest(-40.0, 10.0, 50, lambda: bins)) == 20
+    assert BinGridIndex().nearest(10.0, 76.0, 5, list) == []
+
+
+def test_parse_position_rejects_non_finite_and_out_of_range():
+    assert parse_position("10.5", 76) == (10.5, 76.0)
+    for lat, lon in (("nan", 76), (10, "inf"), (91, 0), (0, -181), ("north", 0), (None, 0)):
+        with pytest.raises(ValueError):
+            parse_position(lat, lon)
+
+
+@pytest.mark.parametrize("query", ['/api/bins?bbox=nan,10,77,11', '/api/bins?bbox=76,10,inf,11',
+                                   '/api/bins/nearest?lat=nan&lon=76', '/api/bins/nearest?lat=10&lon=-inf'])
+def test_bin_queries_reject_non_finite_coordinates(app, query):
+    assert app.test_client().get(query).status_code == 400
+
+
+def test_index_follows_added_and_deleted_bins(admin_client):
+    # An island of its own, so the nearest bin is unambiguous
+    nearest = '/api/bins/nearest?lat=-45.0&lon=-120.0&k=1'
+    admin_client.post('/add_bin', data={"bin_id": 'SPAT-1', "lat": '-45.0', "lon": '-120.0'})
+    assert [b["bin_id"] for b in admin_client.get(nearest).json] == ['SPAT-1']
+    assert 'SPAT-1' in [b["bin_id"] for b in admin_client.get('/api/bins?bbox=-120.01,-45.01,-119.99,-44.99').json]
+
+    admin_client.post('/delete_bin/SPAT-1')
+    assert 'SPAT-1' not in [b["bin_id"] for b in admin_client.get(nearest).json]
+    assert admin_client.get('/api/bins?bbox=-120.01,-45.01,-119.99,-44.99').json == []
+
+
+def test_add_bin_refuses_a_non_finite_location(app, admin_client):
+    admin_client.post('/add_bin', data={"bin_id": 'SPAT-nan', "lat": 'nan', "lon": '76.0'})
+    assert admin_client.get('/api/bins?bbox=-180,-90,180,90').status_code == 200
+    assert 'SPAT-nan' not in [b["bin_id"] for b in admin_client.get('/api/bins?bbox=-180,-90,180,90').json]
@@ -0,0 +1,203 @@
+import math
+import struct
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from models import db, CollectorTrack
+from spatial import haversine_km
+
+CHUNK_SPAN = timedelta(minutes=15)
+CHUNK_POINTS = 512  # ~40 minutes of pings at one every 5 s
+TOLERANCE_M = 5.0
+MAX_PENDING = 10000  # sealed chunks kept while the database is unreachable
+METRES_PER_DEGREE = 111320.0
+
+# One packed trail point: milliseconds since the chunk start, lat, lon (float32 is ~1 m)
+POINT = struct.Struct('<Iff')
+
+
+def parse_time(value):
+    """ISO 8601 string to the naive UTC datetimes the models use"""
+    if value.endswith(('Z', 'z')):
+        # JavaScript's toISOString() form, which fromisoformat only accepts from Python 3.11
+        value = value[:-1] + '+00:00'
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def simplify(times, lats, lons, tolerance_m):
+    """Indices of the points Douglas-Peucker keeps at `tolerance_m` metres.
+
+    Distances are synchronized (measured to where the truck would be at that
+    moment on the simplified segment), so stops and speed changes survive,
+    not just corners. The first and last points are always kept.
+    """
+    n = len(times)
+    if n <= 2:
+        return list(range(n))
+    # Equirectangular projection around the first point; exact enough at city scale
+    scale = math.cos(math.radians(lats[0])) * METRES_PER_DEGREE
+    xs = [(lon - lons[0]) * scale for lon in lons]
+    ys = [(lat - lats[0]) * METRES_PER_DEGREE for lat in lats]
+
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        span = times[last] - times[first]
+        worst, worst_index = tolerance_m, None
+        for i in range(first + 1, last):
+            ratio = (times[i] - times[first]) / span if span else 0.0
+            x = xs[first] + ratio * (xs[last] - xs[first])
+            y = ys[first] + ratio * (ys[last] - ys[first])
+            distance = math.hypot(xs[i] - x, ys[i] - y)
+            if distance > worst:
+                worst, worst_index = distance, i
+        if worst_index is not None:
+            keep[worst_index] = 1
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    return [i for i in range(n) if keep[i]]
+
+
+def unpack(start, data):
+    """(timestamp, lat, lon) points of a packed chunk"""
+    return [(start + timedelta(milliseconds=offset), round(lat, 6), round(lon, 6))
+            for offset, lat, lon in POINT.iter_unpack(data)]
+
+
+class _OpenChunk:
+    """Raw pings of the chunk currently being recorded, in flat arrays"""
+
+    __slots__ = ("start", "offsets", "lats", "lons")
+
+    def __init__(self, start):
+        self.start = start
+        self.offsets = array('I')
+        self.lats = array('d')
+        self.lons = array('d')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, when, lat, lon):
+        self.offsets.append(int((when - self.start) / timedelta(milliseconds=1)))
+        self.lats.append(lat)
+        self.lons.append(lon)
+
+    @property
+    def end(self):
+        return self.start + timedelta(milliseconds=self.offsets[-1])
+
+    def points(self):
+        return [(self.start + timedelta(milliseconds=o), lat, lon)
+                for o, lat, lon in zip(self.offsets, self.lats, self.lons)]
+
+    def seal(self, username, tolerance_m):
+        """CollectorTrack row mapping holding the simplified chunk"""
+        keep = simplify(self.offsets, self.lats, self.lons, tolerance_m)
+        data = b"".join(POINT.pack(self.offsets[i], self.lats[i], self.lons[i]) for i in keep)
+        return {"username": username, "start": self.start, "end": self.end,
+                "points": len(keep), "data": data}
+
+
+class TrailStore:
+    """Append-only GPS trail per collector.
+
+    Pings are appended to a small in-memory chunk per collector. A chunk is
+    sealed once it spans `span` or holds `max_points` pings: it is simplified
+    (see simplify), packed into a blob and written as one CollectorTrack row
+    on the next flush. Memory therefore stays at one open chunk per truck, and
+    the database sees a handful of rows per shift rather than one per ping.
+    """
+
+    def __init__(self, span=CHUNK_SPAN, max_points=CHUNK_POINTS, tolerance_m=TOLERANCE_M):
+        self._lock = threading.Lock()
+        self._open = {}  # username -> _OpenChunk
+        self._sealed = []  # row mappings waiting for the next flush
+        self.span = span
+        self.max_points = max_points
+        self.tolerance_m = tolerance_m
+
+    def record(self, username, lat, lon, when=None):
+        when = when or datetime.utcnow()
+        with self._lock:
+            chunk = self._open.get(username)
+            if chunk is not None and (len(chunk) >= self.max_points or when - chunk.start >= self.span
+                                      or when < chunk.end):
+                self._seal(username)
+                chunk = None
+            if chunk is None:
+                chunk = self._open[username] = _OpenChunk(when)
+            chunk.append(when, lat, lon)
+
+    def _seal(self, username):
+        # Must be called with the lock held
+        self._sealed.append(self._open.pop(username).seal(username, self.tolerance_m))
+        if len(self._sealed) > MAX_PENDING:
+            del self._sealed[:-MAX_PENDING]
+
+    def flush(self, seal_all=False):
+        """Seals chunks that have run their span (or all of them) and writes sealed chunks in one batch.
+
+        Must be called inside an app context.
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            for username, chunk in list(self._open.items()):
+                if seal_all or now - chunk.start >= self.span:
+                    self._seal(username)
+            rows, self._sealed = self._sealed, []
+        if not rows:
+            return
+        try:
+            db.session.bulk_insert_mappings(CollectorTrack, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._sealed[:0] = rows
+            raise
+
+    def track(self, username, start, end, tolerance_m=None):
+        """(timestamp, lat, lon) points of a collector between two times, oldest first.
+
+        Combines stored chunks with this process's unflushed ones; the open
+        chunk is served raw. `tolerance_m` simplifies the result further for display.
+        """
+        # Memory first: a flush landing in between then shows up twice (and is
+        # de-duplicated) rather than not at all
+        with self._lock:
+            pending = [unpack(r["start"], r["data"]) for r in self._sealed if r["username"] == username]
+            chunk = self._open.get(username)
+            if chunk is not None:
+                pending.append(chunk.points())
+
+        rows = CollectorTrack.query.filter(CollectorTrack.username == username,
+                                           CollectorTrack.start <= end,
+                                           CollectorTrack.end >= start)\
+            .order_by(CollectorTrack.start).all()
+        by_time = {}
+        for points in [unpack(r.start, r.data) for r in rows] + pending:
+            for point in points:
+                if start <= point[0] <= end:
+                    by_time[point[0]] = point
+        points = [by_time[t] for t in sorted(by_time)]
+
+        if tolerance_m and len(points) > 2:
+            t0 = points[0][0]
+            keep = simplify([(p[0] - t0).total_seconds() for p in points],
+                            [p[1] for p in points], [p[2] for p in points], tolerance_m)
+            points = [points[i] for i in keep]
+        return points
+
+
+def track_distance_km(points):
+    return sum(haversine_km(a[1], a[2], b[1], b[2]) for a, b in zip(points, points[1:]))
+
+
+trails = TrailStore()
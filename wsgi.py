@@ -0,0 +1,33 @@
+"""Production entry point.
+
+Linux/macOS, several worker processes (settings in gunicorn.conf.py):
+    gunicorn wsgi:app
+
+Windows, or anywhere gunicorn is unavailable:
+    python wsgi.py
+
+Run `flask --app app init-db` first to create or upgrade the schema.
+
+Each open /api/stream (Server-Sent Events) connection holds one server thread
+until the browser disconnects. STREAM_MAX_SUBSCRIBERS caps them per process
+(default 4) so requests keep the remaining threads; size THREADS accordingly.
+"""
+import os
+
+from app import create_app
+from config import ProductionConfig
+
+app = create_app(ProductionConfig)
+
+application = app  # Name some WSGI hosts (PythonAnywhere, mod_wsgi) look for
+
+
+def serve():
+    """Serves the app with waitress: one process, a pool of threads"""
+    from waitress import serve as waitress_serve
+    waitress_serve(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 8000)),
+                   threads=int(os.environ.get('THREADS', 16)))
+
+
+if __name__ == '__main__':
+    serve()